@@ -29,6 +29,7 @@ import sys
 import gc
 import copy
 import time
+import re
 
 #self defined functions
 if __name__ == "__main__":
@@ -36,215 +37,21 @@ if __name__ == "__main__":
 else:
     from .functions import betweenness_calc as bt_calc
 
-if __name__ == "__main__":
-    # Do something if this file is invoked on its own
-    print("Invoking original")
-    parser=argparse.ArgumentParser(description="Loads the specified GB interaction network and calculates the corresponding flow betweenness network")
-    
-    parser.add_argument(
-        '-indir','--inputDirectory',default='.',dest='inDir',
-        help='Path to the directory containing the interaction network file. Defaults to currently active directory'
-    )
-    parser.add_argument(
-        '-i', '--interactionFileName',
-        help='Name of the GB interaction energy data file to load (required). This data file should contain a'+\
-             '\nsingle interaction network. If there are more networks / interactions present, you will need to'+\
-             '\nuse the "-selectionQueryStrings" argument to specify a pandas.DataFrame.query search query string'+\
-             '\nthat can select a single network from the data. If duplicate edges are present, the program'+\
-             '\nwill crash or give unpredictable results'
-    )
-    
-    parser.add_argument(
-        '-q','--selectionQueryStrings',nargs='*',
-        help='List of query strings to select entries from the interaction data that specify a single network'+\
-             '\nto be analyzed. If multiple strings are provided, the results are concatenated using pd.concat'
-    )
-    parser.add_argument(
-        '-c','--NodeColumns',default=['Resid_1','Resid_2'],dest='nodeColumns',nargs='*',
-        help='Names of the columns containing the names of the interacting nodes for each interaction entry'+\
-             '\nexactly two arguments should be given. If not only the first two entries will get used.'
-    )
-    parser.add_argument(
-        '-e','--energyColumn',default='TOTAL',
-        help='Name of the column containing the energy values of each interaction used to compute betweenness weights'
-    )
-    parser.add_argument(
-        '-s','--sourceNodeNames',nargs='+',dest='sourceNodeNames',
-        help='string to be fed to the pandas DataFrame.query function to collect a list of source node names'+\
-             '\nif multiple entries are given, each will be fed and the results aggregated into a list of'+\
-             '\nof unique node names'
-    )
-    parser.add_argument(
-        '-t','--targetNodeNames',nargs='+',dest='targetNodeNames',
-        help='string to be fed to the pandas DataFrame.query function to collect a list of target node names'+\
-             '\nif multiple entries are given, each will be fed and the results aggregated into a list of'+\
-             '\nof unique node names. Note: if there is any overlap. I.e. sourceNodes and targetNodes litst'+\
-             '\ncontain some of the same node(s) then a warning will be thrown and the common nodes will be put'+\
-             '\ninto the source node list.'
-    )
-    
-    parser.add_argument(
-        '-outdir','--outputFileDirectory',default='.',dest='outDir',
-        help='Path of the directory to write output files to'
-    )
-    parser.add_argument(
-        '-o','--outputFileNameBase',
-        help='Base of the filenames e.g. edge betweenness would be in "outputFileNameBase.EdgeBetweenness.csv" (required)'
-    )
-    parser.add_argument(
-        '-ft','--writeFullTable',nargs='?',default=False,const=True,
-        help='If this flag is set, the output table will contain all data from each row of the input dataframe'+\
-             'otherwise it will only contain the node columns and betweenness column'
-    )
-    parser.add_argument(
-        '-wnvec','--writeNodeVector',nargs='?',const=True,default=False,
-        help='If flag is given, node betweenness will also be computed written to "outputFileNameBase.NodeBetweenness.csv"'
-    )
-    
-    
-    parser.add_argument(
-        '-windmap','--writeMatrixIndexToNodeNameMap',nargs='?',const=True,default=False,
-        help='If this flag is given, a data frame containging the columns "MatInd" and "NodeName" is written to'+\
-             '\n"outputFileNameBase.IndToNameMap.csv"'
-    )
-    
-    parser.add_argument(
-        '-dryrun',nargs='?',const=True,default=False,
-        help='Dont run anything, jsut print out input argument namespace and end program'
-    )
-    
-    parser.add_argument(
-        '-v','--verbose',nargs='?',const=True,default=False,
-        help='controls printing of progress / information to stdout during run'
-    )
-    parser.add_argument(
-        '-vl','--verboseLevel',default=0,
-        help='when verbose flag is given, controls the amount of detail printed'
-    )
-    
-    args=parser.parse_args()
-     
-    if args.verbose or args.dryrun:
-        print('Input arguments:',args)
-    if not args.dryrun:
-        verbose=args.verbose
-        verboseLevel=int(args.verboseLevel)
-        outFileBase=args.outputFileNameBase
-        inputFile=args.inDir+'/'+args.interactionFileName
-        if verbose:
-            print('loading data',end='\n' if args.verboseLevel==0 else ",")
-        tempData=pd.read_csv(inputFile)
-        if (not (args.selectionQueryStrings is None)) and len(args.selectionQueryStrings) > 0:
-            if verbose and (verboseLevel > 0):
-                print('-filtering loaded data')
-            interactionData=pd.concat([
-                tempData.query(selectionQuery).copy() \
-                for selectionQuery in args.selectionQueryStrings
-            ])
-            tempData=[]
-        else:
-            interactionData=tempData.copy()
-            tempData=[]
-        
-        nodeColumn_1,nodeColumn_2=args.nodeColumns
-        if verbose and (verboseLevel > 0):
-            print('Building node name to index maps')
-        nodeNames=np.unique(np.sort(np.concatenate([
-                interactionData[nodeColumn_1].unique(),
-                interactionData[nodeColumn_2].unique()])))
-        nameToIndTable=pd.DataFrame({
-            'NodeNames':np.array(nodeNames,dtype=str),
-            'NodeInds':np.arange(len(nodeNames))
-        })
-        if args.writeMatrixIndexToNodeNameMap:
-            if verbose and (verboseLevel>0):
-                print('saving node name indexing map')
-            nameToIndTable.to_csv(
-                args.outDir+'/'+outFileBase+'.IndToNameMap.csv',
-                index=False
-            )
-        
-        if verbose and (verboseLevel > 1):
-            print(interactionData.head())
-            
-        if verbose and (verboseLevel>0):
-            print('building source node list')
-        sourceNodeNames=np.array(args.sourceNodeNames)
-        sourceNodes=np.array([
-            nameToIndTable.set_index('NodeNames')['NodeInds'].loc[sourceNodeName] \
-            for sourceNodeName in sourceNodeNames
-        ])
-        if verbose and (verboseLevel>1):
-            print('source nodes:')
-            print(pd.DataFrame({'NodeNames':sourceNodes,'MatrixIndices':sourceNodes}))
-        
-        if verbose and (verboseLevel>0):
-            print('building target node list')
-        targetNodeNames=np.array(args.targetNodeNames)
-        targetNodes=np.array([
-            nameToIndTable.set_index('NodeNames')['NodeInds'].loc[targetNodeName] \
-            for targetNodeName in targetNodeNames
-        ])
-        if verbose and (verboseLevel>1):
-            print('target nodes:')
-            print(pd.DataFrame({'NodeNames':targetNodeNames,'MatrixIndices':targetNodes}))
-                  
-        if verbose:
-            print('Constructing network matrix')
-        netMat=np.array(sp.sparse.coo_matrix(
-            (interactionData[args.energyColumn].abs(),
-             (nameToIndTable.set_index('NodeNames')['NodeInds'].loc[interactionData[nodeColumn_1].map(str)],
-              nameToIndTable.set_index('NodeNames')['NodeInds'].loc[interactionData[nodeColumn_2].map(str)])),
-            shape=(len(nameToIndTable),len(nameToIndTable))
-        ).todense())
-        
-        btwMat=np.array(bt_calc.getBtwMat(
-            mat=netMat,sources=sourceNodes,targets=targetNodes,
-            verbose=verbose,verboseLevel=verboseLevel,
-            useProgressBar=False,useLegacyAlgorithm=False
-        ))
-        
-        if verbose:
-            print('Compiling betweenness table')
-        btwTable=pd.DataFrame({
-            nodeColumn_1:interactionData[nodeColumn_1],
-            nodeColumn_2:interactionData[nodeColumn_2],
-            'Betweenness':btwMat[(
-                nameToIndTable.set_index('NodeNames')['NodeInds'].loc[
-                    interactionData[nodeColumn_1].map(str)],
-                nameToIndTable.set_index('NodeNames')['NodeInds'].loc[
-                    interactionData[nodeColumn_2].map(str)]
-            )]
-        })
-        
-        if args.writeFullTable:
-            if verbose:
-                print('Joining Betweenness data to interaction data')
-            btwTable=btwTable.set_index([nodeColumn_1,nodeColumn_2]).join(
-                other=interactionData.set_index([nodeColumn_1,nodeColumn_2]),
-                how='right')
-        
-        if verbose:
-            print('Saving betweenness data')
-        btwTable.to_csv(args.outDir+'/'+args.outputFileNameBase+'.EdgeBetweenness.csv',index=False)
-        
-        if args.writeNodeVector:
-            if verbose:
-                print('Computing node betweenness')
-            nodeBtw=np.sum(btwMat,axis=1)/2.
-            nodeTable=pd.DataFrame({
-                'NodeName':nameToIndTable['NodeNames'],
-                'Betweenness':nodeBtw[nameToIndTable['NodeInds']]
-            })
-            if verbose:
-                print('Saving node betweenness data')
-            nodeTable.to_csv(args.outDir+'/'+args.outputFileNameBase+'.NodeBetweenness.csv',index=False)
-
 
-def betweenness(inDir,outDir,interactionFileName,outputFileNameBase='NO_NAME',selectionQueryStrings=None,nodeColumns=['Resid_1','Resid_2'],energyColumn='TOTAL',sourceNodeNames=None,targetNodeNames=None,writeFullTable=False,writeNodeVector=True,writeMatrixIndexToNodeNameMap=True,dryrun=False,verbose=True,verboseLevel=0):
+def betweenness(inDir,outDir,interactionFileName,outputFileNameBase='NO_NAME',selectionQueryStrings=None,
+                nodeColumns=['Resid_1','Resid_2'],energyColumn='TOTAL',sourceNodeNames=None,targetNodeNames=None,
+                btwSpecs=None,writeFullTable=False,writeNodeVector=True,writeMatrixIndexToNodeNameMap=True,
+                solverBackend='pinv',nSymmetryBlocks=6,nSpectralModes=50,maxSpectralResidual=None,
+                useUnionColumns=False,memoryBudgetMB=None,
+                cacheDir=None,maxCacheMB=None,allPairs=False,groupFlow=False,reductionNodeNames=None,
+                deletionScan=False,gradientQuantity=None,sparsifyMethod=None,sparsifyMaxError=0.01,sparsifyCutoff=None,
+                writeResistances=False,writePairFlows=False,pairFlowTopK=None,pairFlowThreshold=None,
+                approxEpsilon=None,approxDelta=0.1,precision='float64',precisionCheckEdges=100,dryrun=False,
+                verbose=True,verboseLevel=0):
     """
     This function is the main function to call for the betweenness calculation.
-    NOTE: This function take a total of 15 variables, make sure to give them a check and see what each option does
+    NOTE: This function takes many options (listed below with their defaults), make sure to give them a check and
+    see what each option does. Running this file as a script exposes the same options on the command line.
     
     Default
     -------
@@ -255,11 +62,36 @@ def betweenness(inDir,outDir,interactionFileName,outputFileNameBase='NO_NAME',se
     selectionQueryStrings		None
     nodeColumns				['Resid_1','Resid_2']
     energyColumn			'TOTAL'
-    sourceNodeNames			None ### INPUT MUST BE SET
-    targetNodeNames			None ### INPUT MUST BE SET
+    sourceNodeNames			None ### INPUT MUST BE SET (unless allPairs)
+    targetNodeNames			None ### INPUT MUST BE SET (unless allPairs)
+    btwSpecs				None
     writeFullTable			False
     writeNodeVector			True
     writeMatrixIndexToNodeNameMap	True
+    solverBackend			'pinv'
+    nSymmetryBlocks			6
+    nSpectralModes			50
+    maxSpectralResidual			None
+    useUnionColumns			False
+    memoryBudgetMB			None
+    cacheDir				None
+    maxCacheMB				None
+    allPairs				False
+    groupFlow				False
+    reductionNodeNames			None
+    deletionScan			False
+    gradientQuantity			None
+    sparsifyMethod			None
+    sparsifyMaxError			0.01
+    sparsifyCutoff			None
+    writeResistances			False
+    writePairFlows			False
+    pairFlowTopK			None
+    pairFlowThreshold			None
+    approxEpsilon			None
+    approxDelta				0.1
+    precision				'float64'
+    precisionCheckEdges			100
     dryrun				False
     verbose				True
     verboseLevel			0
@@ -279,13 +111,129 @@ def betweenness(inDir,outDir,interactionFileName,outputFileNameBase='NO_NAME',se
  
     Other notes
     -----------
-    If there are multiple files to be run, this can be ran parallel following the example in Step1_Run_GB_Network_Betweenness.slurm.bash.
+    If there are multiple files to be run, this can be ran parallel following the example in
+    Step1_Run_GB_Network_Betweenness.slurm.bash.
 
     sourceNodeNames & targetNodeNames format is :
     ['#','#','#','#']
     keep in mind if following format is used it will produce "key error"
     [#,#,#,#]
 
+    btwSpecs evaluates several named source / target specifications in one run, e.g.
+    btwSpecs={'gate':(['14','240'],['47','273']),'pore':(['14'],['35','261'])}
+    (a list of (name,sourceNodeNames,targetNodeNames) tuples also works). The data is
+    loaded and the Laplacian inverted / factorized only once, potentials are solved once
+    for the union of all nodes, and each specification is written to its own
+    "outputFileNameBase.name.EdgeBetweenness.csv" / ".NodeBetweenness.csv" with a
+    "Specification" column. sourceNodeNames / targetNodeNames are ignored when given.
+
+    solverBackend can be 'pinv' (dense pseudo inverse) or 'sparse' (grounded sparse LU
+    factorization on the interaction edge list, see bt_calc.getBtwEdges). Use 'sparse'
+    for large assemblies; it never builds a dense n x n matrix and always solves
+    only for the unique source and target nodes. 'circulant' is meant for symmetrized or
+    frame averaged networks of homo-oligomers with nSymmetryBlocks chains (6 for the
+    connexin hexamers): the block circulant Laplacian is pseudo inverted as nSymmetryBlocks
+    independent chain sized problems (see bt_calc.getBlockCirculantPinv). Networks that are
+    not symmetric fall back to 'pinv' with a warning. 'spectral' is an approximate screening
+    mode: potentials come from the nSpectralModes smallest eigenpairs of the (symmetrized)
+    Laplacian plus a diagonal correction (see bt_calc.getSpectralBtwEdges) instead of an
+    O(n^3) pseudo inverse; the eigenpairs are shared by all btwSpecs. The largest relative
+    residual of the source / target potential columns is written to a "SpectralResidual"
+    column of the edge table. The residual tracks the error and converges slowly with
+    nSpectralModes: on the Test_Data WT frames (1356 nodes) the default 50 modes give a
+    residual of 0.35 and a max edge error of 26% of the largest betweenness, 400 modes a
+    residual of 0.11 and a max edge error of 6%. By default (maxSpectralResidual None) the
+    approximation is always kept, e.g. for a quick ranking of candidate edges, and the
+    residual is only reported. If maxSpectralResidual is set and the residual is above it,
+    a warning is printed and the betweenness is recomputed exactly with the 'sparse'
+    solver, which is flagged in a "SpectralExactFallback" column.
+    useUnionColumns=True computes potentials from s+t solves instead of s*t
+    (e.g. 12 instead of 36 for the six N14 sources and six K47 targets).
+    memoryBudgetMB bounds the memory used to accumulate betweenness over many
+    (source,target) pairs on the 'pinv' path, e.g. whole pockets against whole gates.
+    cacheDir keeps an on disk cache (.npy files, memory mapped on load) of the Laplacian
+    pseudo inverse ('pinv' / 'circulant') or of the potential columns ('sparse'), keyed by
+    a hash of the network, so rerunning a frame with new sourceNodeNames / targetNodeNames
+    skips the pseudo inverse or only solves for the new nodes. maxCacheMB bounds its size,
+    evicting the least recently used networks first (other files and folders in cacheDir
+    are never touched).
+    allPairs=True computes all pairs current flow betweenness (see
+    bt_calc.getAllPairsBtwEdges) and ignores sourceNodeNames / targetNodeNames.
+    groupFlow=True contracts the sources into one super-source and the targets into one
+    super-sink and drives a single unit of current between them (see
+    bt_calc.getGroupFlowBtwEdges), i.e. one solve for channel wide signaling instead of
+    one per source / target pair. The edge table gets a "FlowMode" column set to "group".
+    Sources and targets may not overlap.
+    reductionNodeNames restricts the calculation to a region of interest, e.g. the
+    transmembrane helices between the N14 and K47 rings: all other nodes are eliminated by
+    Kron reduction (see bt_calc.getKronReducedMat), which keeps the potentials, currents and
+    resistances between the remaining nodes exact. The reduced network (direct contacts plus
+    effective links through the eliminated residues) replaces the interaction data for all
+    further steps, so the edge / node tables list reduced network edges and kept nodes only
+    and "outputFileNameBase.IndToNameMap.csv" gives the matrix indices of the reduced network.
+    It is saved in the input format as "outputFileNameBase.ReducedNetwork.csv" and can be
+    passed back in as interactionFileName. It must include all source and target nodes.
+    deletionScan=True additionally computes, for every contact and every node, how much
+    the source to target current drops when it is deleted (see
+    bt_calc.getDeletionSensitivity, low rank updates of the factorization shared with the
+    'sparse' betweenness run or the other factorization based outputs) and writes
+    "outputFileNameBase.EdgeSensitivity.csv" and "outputFileNameBase.NodeSensitivity.csv".
+    gradientQuantity='current' (or 'resistance') adds the derivative of the mean source to
+    target current at unit potential difference (or of the mean effective resistance) with
+    respect to the weight of every contact to the edge table as "CurrentGradient" (or
+    "ResistanceGradient"), computed for all edges at once by the adjoint method (see
+    bt_calc.getEdgeWeightGradientEdges). This replaces perturbing edges by hand. It reuses the
+    factorization and source / target potentials of the 'sparse' betweenness run (float64) or
+    of the other factorization based outputs, so symmetric networks need no further solves.
+    sparsifyMethod prunes weak interactions before the betweenness calculation (see
+    bt_calc.getSparsifiedEdges): 'weight' ranks edges by interaction energy (an energy
+    cutoff), 'resistance' by leverage (energy times effective resistance). If sparsifyCutoff
+    is given, all edges scoring below it are dropped and only the pruned network is solved,
+    which is where the savings come from. Without sparsifyCutoff, the most edges are dropped
+    such that no edge betweenness changes by more than sparsifyMaxError times the largest one;
+    this search solves the full network once and the pruned network about log2(number of
+    edges) times, so it is a calibration step: run it on one frame, take the
+    "SparsificationCutoff" column of its edge table and pass it as sparsifyCutoff for the other
+    frames. The search assumes the error grows with the number of dropped edges, so the
+    pruning found always meets sparsifyMaxError but may not be the largest one that does.
+    Pruned edges are left out of all outputs and the realized error (NaN with sparsifyCutoff,
+    as the full network is not solved) is written to the "SparsificationError" column of the
+    edge table. The betweenness of the pruned network computed by the pruning is reused for the
+    edge table (float64 'pinv' / 'sparse' / 'circulant' runs).
+    writeResistances=True additionally writes the effective resistance of every source /
+    target pair ("outputFileNameBase.EffectiveResistance.csv") and the current flow closeness
+    (information centrality, (n-1) over the summed resistance to all other nodes of the same
+    component) of every node ("outputFileNameBase.NodeCloseness.csv"). On the 'pinv' /
+    'circulant' path both come from the pseudo inverse already computed for the betweenness
+    (see bt_calc.getResistanceDataFromLinv). On the 'sparse' path (float64) the pair resistances
+    come from the factorization and source / target potentials of the betweenness run and only
+    the closeness needs further solves (see bt_calc.getResistanceDataEdges); otherwise one
+    grounded factorization is made for them.
+    writePairFlows=True keeps the current through each edge for every source / target pair
+    separately (see bt_calc.getPairFlowsEdges), e.g. to see whether an edge carries same chain,
+    adjacent chain or opposite chain N14 -> K47 flow. To keep the output small, only the
+    pairFlowTopK largest currents and / or those above pairFlowThreshold times the largest
+    current of each pair are kept. The result is written to the compressed numpy archive
+    "outputFileNameBase.PairFlows.npz" holding the edge node names ("edgeNodes_1",
+    "edgeNodes_2", one entry per interaction row), the pair node names ("pairSources",
+    "pairTargets") and the sparse tensor entries ("pairIndex", "edgeIndex", signed float32
+    "current"); load it with numpy.load. The currents come from the potentials already solved
+    for the betweenness on the 'sparse' path (float64), otherwise from one factorization shared
+    with writeResistances, gradientQuantity and deletionScan.
+    approxEpsilon switches to sampled approximate betweenness (see
+    bt_calc.getApproxBtwEdges): pairs are sampled until the maximum absolute error is
+    below approxEpsilon with probability 1-approxDelta. The per edge error bound is
+    added to the edge table as "BetweennessErrorBound". Useful for screening runs.
+    precision='float32' halves memory and roughly doubles throughput; 'mixed' (sparse
+    backend only) refines single precision solves back to double precision. The edge table
+    always records the precision used in a "Precision" column ("float64" for allPairs,
+    approxEpsilon, groupFlow and spectral runs, which are always double precision). When not
+    'float64', precisionCheckEdges randomly chosen edges are checked against a float64
+    reference (see bt_calc.getPrecisionCheck, for every backend and specification) and the max
+    relative deviation is written to a "PrecisionMaxRelDeviation" column (the same value on
+    every row). Unsupported combinations (e.g. 'mixed' with 'pinv') raise a ValueError before
+    any output is written.
+
     
     """
     #####Default Settings of the Variables
@@ -295,15 +243,42 @@ def betweenness(inDir,outDir,interactionFileName,outputFileNameBase='NO_NAME',se
         outDir = '.'
     if interactionFileName == None:
         print('INPUT FILENAME MISSING')
-    if sourceNodeNames == None:
+    if (sourceNodeNames == None) and (not allPairs) and (btwSpecs == None):
         print('CANNOT BE BLANK: check sourceNodeNames input')
-    if targetNodeNames == None:
+    if (targetNodeNames == None) and (not allPairs) and (btwSpecs == None):
         print('CANNOT BE BLANK: check targetNodeNames input')
 
     ####################
     if verbose or dryrun:
-        print('Input arguments:',inDir,outDir,interactionFileName,outputFileNameBase,selectionQueryStrings,nodeColumns,energyColumn,sourceNodeNames,targetNodeNames,writeFullTable,writeNodeVector,writeMatrixIndexToNodeNameMap,dryrun,verbose,verboseLevel)
+        print('Input arguments:',inDir,outDir,interactionFileName,outputFileNameBase,selectionQueryStrings,nodeColumns,
+              energyColumn,sourceNodeNames,targetNodeNames,btwSpecs,writeFullTable,writeNodeVector,
+              writeMatrixIndexToNodeNameMap,solverBackend,nSymmetryBlocks,nSpectralModes,maxSpectralResidual,
+              useUnionColumns,memoryBudgetMB,cacheDir,maxCacheMB,allPairs,groupFlow,reductionNodeNames,deletionScan,
+              gradientQuantity,sparsifyMethod,sparsifyMaxError,sparsifyCutoff,writeResistances,writePairFlows,
+              pairFlowTopK,pairFlowThreshold,approxEpsilon,approxDelta,precision,precisionCheckEdges,dryrun,verbose,
+              verboseLevel)
     if not dryrun:
+        #check option combinations before anything is loaded or written
+        if (not (btwSpecs is None)) and \
+           (allPairs or groupFlow or (not (approxEpsilon is None))):
+            raise ValueError("btwSpecs can not be combined with allPairs, groupFlow or approxEpsilon")
+        if deletionScan and (allPairs or (not (btwSpecs is None))):
+            raise ValueError("deletionScan needs sourceNodeNames and targetNodeNames")
+        if writeResistances and (allPairs or (not (btwSpecs is None))):
+            raise ValueError("writeResistances needs sourceNodeNames and targetNodeNames")
+        if writePairFlows and (allPairs or (not (btwSpecs is None))):
+            raise ValueError("writePairFlows needs sourceNodeNames and targetNodeNames")
+        if (not (sparsifyMethod is None)) and (allPairs or (not (btwSpecs is None))):
+            raise ValueError("sparsifyMethod needs sourceNodeNames and targetNodeNames")
+        if (not (gradientQuantity is None)) and (allPairs or (not (btwSpecs is None))):
+            raise ValueError("gradientQuantity needs sourceNodeNames and targetNodeNames")
+        if not (precision in ['float64','float32','mixed']):
+            raise ValueError("unknown precision '%s', expected 'float64', 'float32' or 'mixed'"%precision)
+        if (precision=='mixed') and (solverBackend in ['pinv','circulant']) and \
+           (approxEpsilon is None) and (not allPairs) and (not groupFlow):
+            raise ValueError("the %s backend supports precision 'float64' or 'float32' only,"%solverBackend+
+                             " use solverBackend='sparse' for 'mixed' precision")
+        
         verbose=verbose
         verboseLevel=int(verboseLevel)
         outFileBase=outputFileNameBase
@@ -334,6 +309,48 @@ def betweenness(inDir,outDir,interactionFileName,outputFileNameBase='NO_NAME',se
             'NodeNames':np.array(nodeNames,dtype=str),
             'NodeInds':np.arange(len(nodeNames))
         })
+        if not (reductionNodeNames is None):
+            reductionNodeNames=np.array(reductionNodeNames,dtype=str)
+            if btwSpecs is None:
+                requiredNodeNames=[] if allPairs else \
+                    list(sourceNodeNames)+list(targetNodeNames)
+            else:
+                requiredNodeNames=[nodeName \
+                    for specName,specSourceNames,specTargetNames in bt_calc.getBtwSpecList(btwSpecs) \
+                    for nodeName in list(specSourceNames)+list(specTargetNames)]
+            if not np.all(np.isin(np.array(requiredNodeNames,dtype=str),reductionNodeNames)):
+                raise ValueError("reductionNodeNames must include all source and target nodes")
+            if verbose:
+                print('Kron reducing network onto %g nodes'%len(reductionNodeNames))
+            nameToInd=nameToIndTable.set_index('NodeNames')['NodeInds']
+            fullMat=sp.sparse.coo_matrix(
+                (interactionData[energyColumn].abs().values,
+                 (nameToInd.loc[interactionData[nodeColumn_1].map(str)].values,
+                  nameToInd.loc[interactionData[nodeColumn_2].map(str)].values)),
+                shape=(len(nameToIndTable),len(nameToIndTable))).tocsr()
+            keepInds=np.unique(nameToInd.loc[reductionNodeNames].values)
+            redMat=sp.sparse.coo_matrix(bt_calc.getKronReducedMat(
+                fullMat,keepInds,verbose=verbose))
+            nameToIndTable=pd.DataFrame({
+                'NodeNames':nameToIndTable['NodeNames'].values[keepInds],
+                'NodeInds':np.arange(len(keepInds))
+            })
+            #the reduced network replaces the interaction data, so all
+            #further steps (and outputs) refer to the reduced network
+            interactionData=pd.DataFrame({
+                nodeColumn_1:nameToIndTable['NodeNames'].values[redMat.row],
+                nodeColumn_2:nameToIndTable['NodeNames'].values[redMat.col],
+                energyColumn:redMat.data
+            })
+            if verbose and (verboseLevel>0):
+                print('saving reduced network')
+            interactionData.to_csv(
+                outDir+'/'+outFileBase+'.ReducedNetwork.csv',
+                index=False
+            )
+        
+        #written after any Kron reduction, so the indices are those of the
+        #network actually solved
         if writeMatrixIndexToNodeNameMap:
             if verbose and (verboseLevel>0):
                 print('saving node name indexing map')
@@ -345,77 +362,736 @@ def betweenness(inDir,outDir,interactionFileName,outputFileNameBase='NO_NAME',se
         if verbose and (verboseLevel > 1):
             print(interactionData.head())
             
-        if verbose and (verboseLevel>0):
-            print('building source node list')
-        sourceNodeNames=np.array(sourceNodeNames)
-        sourceNodes=np.array([
-            nameToIndTable.set_index('NodeNames')['NodeInds'].loc[sourceNodeName] \
-            for sourceNodeName in sourceNodeNames
-        ])
-        if verbose and (verboseLevel>1):
-            print('source nodes:')
-            print(pd.DataFrame({'NodeNames':sourceNodes,'MatrixIndices':sourceNodes}))
+        if allPairs:
+            if verbose and (verboseLevel>0):
+                print('using all node pairs as sources and targets')
+        elif not (btwSpecs is None):
+            if verbose and (verboseLevel>0):
+                print('building source / target node lists for %g specifications'%len(btwSpecs))
+            nameToInd=nameToIndTable.set_index('NodeNames')['NodeInds']
+            specNodes=[
+                (specName,
+                 np.array([nameToInd.loc[sourceNodeName] for sourceNodeName in specSourceNames]),
+                 np.array([nameToInd.loc[targetNodeName] for targetNodeName in specTargetNames])) \
+                for specName,specSourceNames,specTargetNames in bt_calc.getBtwSpecList(btwSpecs)
+            ]
+            if verbose and (verboseLevel>1):
+                for specName,specSources,specTargets in specNodes:
+                    print(specName,'sources:',specSources,'targets:',specTargets)
+        else:
+            if verbose and (verboseLevel>0):
+                print('building source node list')
+            sourceNodeNames=np.array(sourceNodeNames)
+            sourceNodes=np.array([
+                nameToIndTable.set_index('NodeNames')['NodeInds'].loc[sourceNodeName] \
+                for sourceNodeName in sourceNodeNames
+            ])
+            if verbose and (verboseLevel>1):
+                print('source nodes:')
+                print(pd.DataFrame({'NodeNames':sourceNodes,'MatrixIndices':sourceNodes}))
         
-        if verbose and (verboseLevel>0):
-            print('building target node list')
-        targetNodeNames=np.array(targetNodeNames)
-        targetNodes=np.array([
-            nameToIndTable.set_index('NodeNames')['NodeInds'].loc[targetNodeName] \
-            for targetNodeName in targetNodeNames
-        ])
-        if verbose and (verboseLevel>1):
-            print('target nodes:')
-            print(pd.DataFrame({'NodeNames':targetNodeNames,'MatrixIndices':targetNodes}))
+            if verbose and (verboseLevel>0):
+                print('building target node list')
+            targetNodeNames=np.array(targetNodeNames)
+            targetNodes=np.array([
+                nameToIndTable.set_index('NodeNames')['NodeInds'].loc[targetNodeName] \
+                for targetNodeName in targetNodeNames
+            ])
+            if verbose and (verboseLevel>1):
+                print('target nodes:')
+                print(pd.DataFrame({'NodeNames':targetNodeNames,'MatrixIndices':targetNodes}))
                   
         if verbose:
-            print('Constructing network matrix')
-        netMat=np.array(sp.sparse.coo_matrix(
-            (interactionData[energyColumn].abs(),
-             (nameToIndTable.set_index('NodeNames')['NodeInds'].loc[interactionData[nodeColumn_1].map(str)],
-              nameToIndTable.set_index('NodeNames')['NodeInds'].loc[interactionData[nodeColumn_2].map(str)])),
-            shape=(len(nameToIndTable),len(nameToIndTable))
-        ).todense())
+            print('Constructing network edge list')
+        edgeInds_1=nameToIndTable.set_index('NodeNames')['NodeInds'].loc[
+            interactionData[nodeColumn_1].map(str)].values
+        edgeInds_2=nameToIndTable.set_index('NodeNames')['NodeInds'].loc[
+            interactionData[nodeColumn_2].map(str)].values
+        edgeWeights=interactionData[energyColumn].abs().values
         
-        btwMat=np.array(bt_calc.getBtwMat(
-            mat=netMat,sources=sourceNodes,targets=targetNodes,
-            verbose=verbose,verboseLevel=verboseLevel,
-            useProgressBar=False,useLegacyAlgorithm=False
-        ))
+        sparsifyData=None
+        if not (sparsifyMethod is None):
+            if verbose:
+                print('Pruning weak edges')
+            sparsifyData=bt_calc.getSparsifiedEdges(
+                edgeInds_1,edgeInds_2,edgeWeights,
+                sources=sourceNodes,targets=targetNodes,
+                nNodes=len(nameToIndTable),method=sparsifyMethod,
+                maxBtwError=sparsifyMaxError,scoreCutoff=sparsifyCutoff,
+                verbose=verbose
+            )
+            keepEdges=sparsifyData['keepEdges']
+            interactionData=interactionData[keepEdges].reset_index(drop=True)
+            edgeInds_1=edgeInds_1[keepEdges]
+            edgeInds_2=edgeInds_2[keepEdges]
+            edgeWeights=edgeWeights[keepEdges]
         
-        if verbose:
-            print('Compiling betweenness table')
-        btwTable=pd.DataFrame({
-            nodeColumn_1:interactionData[nodeColumn_1],
-            nodeColumn_2:interactionData[nodeColumn_2],
-            'Betweenness':btwMat[(
-                nameToIndTable.set_index('NodeNames')['NodeInds'].loc[
-                    interactionData[nodeColumn_1].map(str)],
-                nameToIndTable.set_index('NodeNames')['NodeInds'].loc[
-                    interactionData[nodeColumn_2].map(str)]
-            )]
-        })
+        edgeErrorInfo=None
+        precisionInfo=None
+        specPrecisionInfos={}
+        #precision only applies to the exact source / target solvers
+        precisionApplies=(solverBackend!='spectral') and ((not (btwSpecs is None)) or \
+            ((approxEpsilon is None) and (not allPairs) and (not groupFlow)))
+        nCheckEdges=precisionCheckEdges if (precision!='float64') and precisionApplies else 0
+        resistanceData=None
+        spectralInfo=None
+        specEdgeBtws=None
+        #factorization and source / target potential columns shared by the
+        #outputs derived from them (see bt_calc.getBtwSolveData)
+        solveData=None
+        #the pruning already solved the pruned network exactly (float64), so
+        #its edge betweenness is reused wherever the same quantity is asked for
+        reuseSparsifiedBtw=(not (sparsifyData is None)) and (approxEpsilon is None) and \
+            (not groupFlow) and (solverBackend!='spectral') and (precision=='float64')
+        if not (btwSpecs is None):
+            if solverBackend=='sparse':
+                specEdgeBtws=list(bt_calc.getBtwEdgesMulti(
+                    edgeInds_1,edgeInds_2,edgeWeights,specNodes,
+                    nNodes=len(nameToIndTable),verbose=verbose,precision=precision,
+                    cacheDir=cacheDir,maxCacheMB=maxCacheMB
+                ).items())
+            else:
+                if verbose:
+                    print('Constructing network matrix')
+                netMat=np.array(sp.sparse.coo_matrix(
+                    (edgeWeights,(edgeInds_1,edgeInds_2)),
+                    shape=(len(nameToIndTable),len(nameToIndTable))
+                ).todense())
+                specBtwMats=bt_calc.getBtwMatMulti(
+                    netMat,specNodes,verbose=verbose,
+                    solverBackend=solverBackend,precision=precision,
+                    nSymmetryBlocks=nSymmetryBlocks,
+                    cacheDir=cacheDir,maxCacheMB=maxCacheMB,
+                    nSpectralModes=nSpectralModes,maxSpectralResidual=maxSpectralResidual
+                )
+                specEdgeBtws=[(specName,specBtwMats[specName][(edgeInds_1,edgeInds_2)]) \
+                              for specName in specBtwMats]
+            if nCheckEdges>0:
+                for specName,specSources,specTargets in specNodes:
+                    specPrecisionInfos[specName]=bt_calc.getPrecisionCheck(
+                        edgeInds_1,edgeInds_2,edgeWeights,dict(specEdgeBtws)[specName],
+                        specSources,specTargets,nNodes=len(nameToIndTable),
+                        precision=precision,nCheckEdges=nCheckEdges,verbose=verbose)
+        elif not (approxEpsilon is None):
+            edgeBtw,edgeErrorInfo=bt_calc.getApproxBtwEdges(
+                edgeInds_1,edgeInds_2,edgeWeights,
+                sources=None if allPairs else sourceNodes,
+                targets=None if allPairs else targetNodes,
+                nNodes=len(nameToIndTable),
+                epsilon=approxEpsilon,delta=approxDelta,verbose=verbose
+            )
+            if verbose:
+                print('approximate betweenness error bound:',edgeErrorInfo['errorBound'])
+        elif allPairs:
+            edgeBtw=bt_calc.getAllPairsBtwEdges(
+                edgeInds_1,edgeInds_2,edgeWeights,
+                nNodes=len(nameToIndTable),verbose=verbose
+            )
+        elif groupFlow:
+            edgeBtw=bt_calc.getGroupFlowBtwEdges(
+                edgeInds_1,edgeInds_2,edgeWeights,
+                sources=sourceNodes,targets=targetNodes,
+                nNodes=len(nameToIndTable),verbose=verbose
+            )
+        elif reuseSparsifiedBtw:
+            if verbose:
+                print('Reusing the betweenness of the pruned network')
+            edgeBtw=sparsifyData['edgeBtw'][sparsifyData['keepEdges']]
+        elif solverBackend=='spectral':
+            edgeBtw,spectralInfo=bt_calc.getSpectralBtwEdges(
+                edgeInds_1,edgeInds_2,edgeWeights,
+                sources=sourceNodes,targets=targetNodes,
+                nNodes=len(nameToIndTable),nModes=nSpectralModes,
+                maxResidual=maxSpectralResidual,verbose=verbose
+            )
+        elif solverBackend=='sparse':
+            edgeBtw,precisionInfo,sparseSolveData=bt_calc.getBtwEdges(
+                edgeInds_1,edgeInds_2,edgeWeights,
+                sources=sourceNodes,targets=targetNodes,
+                nNodes=len(nameToIndTable),verbose=verbose,
+                precision=precision,
+                nCheckEdges=nCheckEdges,
+                returnPrecisionInfo=True,
+                cacheDir=cacheDir,maxCacheMB=maxCacheMB,
+                returnSolveData=True
+            )
+            if precision=='float64':
+                solveData=sparseSolveData
+        else:
+            if verbose:
+                print('Constructing network matrix')
+            netMat=np.array(sp.sparse.coo_matrix(
+                (edgeWeights,(edgeInds_1,edgeInds_2)),
+                shape=(len(nameToIndTable),len(nameToIndTable))
+            ).todense())
+            
+            btwMat=bt_calc.getBtwMat(
+                mat=netMat,sources=sourceNodes,targets=targetNodes,
+                verbose=verbose,verboseLevel=verboseLevel,
+                useProgressBar=False,useLegacyAlgorithm=False,
+                solverBackend=solverBackend,useUnionColumns=useUnionColumns,
+                memoryBudgetMB=memoryBudgetMB,precision=precision,
+                nSymmetryBlocks=nSymmetryBlocks,
+                cacheDir=cacheDir,maxCacheMB=maxCacheMB,
+                returnResistanceData=writeResistances,
+                nCheckEdges=nCheckEdges,returnPrecisionInfo=True
+            )
+            if writeResistances:
+                btwMat,resistanceData,precisionInfo=btwMat
+            else:
+                btwMat,precisionInfo=btwMat
+            btwMat=np.array(btwMat)
+            edgeBtw=btwMat[(edgeInds_1,edgeInds_2)]
         
-        if writeFullTable:
+        edgeGradient=None
+        if not (gradientQuantity is None):
             if verbose:
-                print('Joining Betweenness data to interaction data')
-            btwTable=btwTable.set_index([nodeColumn_1,nodeColumn_2]).join(
-                other=interactionData.set_index([nodeColumn_1,nodeColumn_2]),
-                how='right')
+                print('Computing %s gradient with respect to the edge weights'%gradientQuantity)
+            if solveData is None:
+                solveData=bt_calc.getBtwSolveData(
+                    edgeInds_1,edgeInds_2,edgeWeights,
+                    sources=sourceNodes,targets=targetNodes,
+                    nNodes=len(nameToIndTable),verbose=verbose
+                )
+            edgeGradient=bt_calc.getEdgeWeightGradientEdges(
+                edgeInds_1,edgeInds_2,edgeWeights,
+                sources=sourceNodes,targets=targetNodes,
+                nNodes=len(nameToIndTable),quantity=gradientQuantity,verbose=verbose,
+                solveData=solveData
+            )
         
-        if verbose:
-            print('Saving betweenness data')
-        btwTable.to_csv(outDir+'/'+outputFileNameBase+'.EdgeBetweenness.csv',index=False)
+        if specEdgeBtws is None:
+            specEdgeBtws=[(None,edgeBtw)]
+        for specName,edgeBtw in specEdgeBtws:
+            if specName is None:
+                specFileBase=outputFileNameBase
+            else:
+                specFileBase=outputFileNameBase+'.'+specName
+            if verbose:
+                print('Compiling betweenness table')
+            btwTable=pd.DataFrame({
+                nodeColumn_1:interactionData[nodeColumn_1],
+                nodeColumn_2:interactionData[nodeColumn_2],
+                'Betweenness':edgeBtw
+            })
+            if not (specName is None):
+                btwTable['Specification']=specName
+            if not (edgeErrorInfo is None):
+                btwTable['BetweennessErrorBound']=edgeErrorInfo['edgeErrorBounds']
+            if not (spectralInfo is None):
+                btwTable['SpectralResidual']=spectralInfo['maxResidual']
+                btwTable['SpectralExactFallback']=spectralInfo['exactFallback']
+            if not (edgeGradient is None):
+                btwTable[gradientQuantity.capitalize()+'Gradient']=edgeGradient
+            btwTable['Precision']=precision if precisionApplies else 'float64'
+            if specName in specPrecisionInfos:
+                precisionInfo=specPrecisionInfos[specName]
+            if (not (precisionInfo is None)) and (precisionInfo['nCheckEdges']>0):
+                btwTable['PrecisionMaxRelDeviation']=precisionInfo['maxRelDeviation']
+            if groupFlow and (approxEpsilon is None) and (not allPairs):
+                btwTable['FlowMode']='group'
+            if not (sparsifyData is None):
+                btwTable['SparsificationError']=sparsifyData['btwError']
+                btwTable['SparsificationCutoff']=sparsifyData['scoreCutoff']
+        
+            if writeFullTable:
+                if verbose:
+                    print('Joining Betweenness data to interaction data')
+                btwTable=btwTable.set_index([nodeColumn_1,nodeColumn_2]).join(
+                    other=interactionData.set_index([nodeColumn_1,nodeColumn_2]),
+                    how='right')
         
-        if writeNodeVector:
             if verbose:
-                print('Computing node betweenness')
-            nodeBtw=np.sum(btwMat,axis=1)/2.
-            nodeTable=pd.DataFrame({
+                print('Saving betweenness data')
+            btwTable.to_csv(outDir+'/'+specFileBase+'.EdgeBetweenness.csv',index=False)
+        
+            if writeNodeVector:
+                if verbose:
+                    print('Computing node betweenness')
+                if allPairs or groupFlow or (solverBackend in ['sparse','spectral']) or \
+                   (not (approxEpsilon is None)) or (not (specName is None)) or reuseSparsifiedBtw:
+                    nodeBtw=bt_calc.getNodeBtwFromEdges(
+                        edgeInds_1,edgeBtw,nNodes=len(nameToIndTable))
+                else:
+                    nodeBtw=np.sum(btwMat,axis=1)/2.
+                nodeTable=pd.DataFrame({
+                    'NodeName':nameToIndTable['NodeNames'],
+                    'Betweenness':nodeBtw[nameToIndTable['NodeInds']]
+                })
+                if verbose:
+                    print('Saving node betweenness data')
+                nodeTable.to_csv(outDir+'/'+specFileBase+'.NodeBetweenness.csv',index=False)
+        
+        if deletionScan:
+            if verbose:
+                print('Scanning contact and node deletions')
+            if solveData is None:
+                solveData=bt_calc.getBtwSolveData(
+                    edgeInds_1,edgeInds_2,edgeWeights,
+                    sources=sourceNodes,targets=targetNodes,
+                    nNodes=len(nameToIndTable),verbose=verbose
+                )
+            sensData=bt_calc.getDeletionSensitivity(
+                edgeInds_1,edgeInds_2,edgeWeights,
+                sources=sourceNodes,targets=targetNodes,
+                nNodes=len(nameToIndTable),verbose=verbose,
+                solveData=solveData
+            )
+            indToName=nameToIndTable.set_index('NodeInds')['NodeNames']
+            edgeSensTable=sensData['edgeTable']
+            edgeSensTable.insert(0,nodeColumn_1,indToName.loc[edgeSensTable['Node_1']].values)
+            edgeSensTable.insert(1,nodeColumn_2,indToName.loc[edgeSensTable['Node_2']].values)
+            edgeSensTable=edgeSensTable.drop(columns=['Node_1','Node_2'])
+            nodeSensTable=sensData['nodeTable']
+            nodeSensTable.insert(0,'NodeName',indToName.loc[nodeSensTable['Node']].values)
+            nodeSensTable=nodeSensTable.drop(columns=['Node'])
+            if verbose:
+                print('Saving deletion sensitivity data')
+            edgeSensTable.to_csv(outDir+'/'+outputFileNameBase+'.EdgeSensitivity.csv',index=False)
+            nodeSensTable.to_csv(outDir+'/'+outputFileNameBase+'.NodeSensitivity.csv',index=False)
+        
+        if writeResistances:
+            if resistanceData is None:
+                if verbose:
+                    print('Computing effective resistances and current flow closeness')
+                if solveData is None:
+                    solveData=bt_calc.getBtwSolveData(
+                        edgeInds_1,edgeInds_2,edgeWeights,
+                        sources=sourceNodes,targets=targetNodes,
+                        nNodes=len(nameToIndTable),verbose=verbose
+                    )
+                resistanceData=bt_calc.getResistanceDataEdges(
+                    edgeInds_1,edgeInds_2,edgeWeights,
+                    sources=sourceNodes,targets=targetNodes,
+                    nNodes=len(nameToIndTable),verbose=verbose,
+                    solveData=solveData
+                )
+            indToName=nameToIndTable.set_index('NodeInds')['NodeNames']
+            resistanceTable=pd.DataFrame({
+                'SourceNode':indToName.loc[resistanceData['pairSources']].values,
+                'TargetNode':indToName.loc[resistanceData['pairTargets']].values,
+                'EffectiveResistance':resistanceData['pairResistances']
+            })
+            closenessTable=pd.DataFrame({
                 'NodeName':nameToIndTable['NodeNames'],
-                'Betweenness':nodeBtw[nameToIndTable['NodeInds']]
+                'Closeness':resistanceData['closeness'][nameToIndTable['NodeInds']]
             })
             if verbose:
-                print('Saving node betweenness data')
-            nodeTable.to_csv(outDir+'/'+outputFileNameBase+'.NodeBetweenness.csv',index=False)
+                print('Saving effective resistance and closeness data')
+            resistanceTable.to_csv(outDir+'/'+outputFileNameBase+'.EffectiveResistance.csv',index=False)
+            closenessTable.to_csv(outDir+'/'+outputFileNameBase+'.NodeCloseness.csv',index=False)
+        
+        if writePairFlows:
+            if verbose:
+                print('Computing pair resolved edge currents')
+            if solveData is None:
+                solveData=bt_calc.getBtwSolveData(
+                    edgeInds_1,edgeInds_2,edgeWeights,
+                    sources=sourceNodes,targets=targetNodes,
+                    nNodes=len(nameToIndTable),verbose=verbose
+                )
+            pairFlowData=bt_calc.getPairFlowsEdges(
+                edgeInds_1,edgeInds_2,edgeWeights,
+                sources=sourceNodes,targets=targetNodes,
+                nNodes=len(nameToIndTable),
+                topK=pairFlowTopK,relThreshold=pairFlowThreshold,verbose=verbose,
+                solveData=solveData
+            )
+            indToName=nameToIndTable.set_index('NodeInds')['NodeNames']
+            if verbose:
+                print('Saving pair flow data')
+            np.savez_compressed(
+                outDir+'/'+outputFileNameBase+'.PairFlows.npz',
+                edgeNodes_1=np.array(interactionData[nodeColumn_1].map(str).values,dtype=str),
+                edgeNodes_2=np.array(interactionData[nodeColumn_2].map(str).values,dtype=str),
+                pairSources=np.array(indToName.loc[pairFlowData['pairSources']].values,dtype=str),
+                pairTargets=np.array(indToName.loc[pairFlowData['pairTargets']].values,dtype=str),
+                pairIndex=pairFlowData['pairIndex'],
+                edgeIndex=pairFlowData['edgeIndex'],
+                current=pairFlowData['current']
+            )
+
+
+
+
+def betweennessEnsemble(inDir,outDir,interactionFileNames,outputFileNameBase='NO_NAME',
+                        nodeColumns=['Resid_1','Resid_2'],energyColumn='TOTAL',sourceNodeNames=None,
+                        targetNodeNames=None,solverBackend='sparse',frameBlockSize=8,
+                        quantiles=[0.05,0.25,0.5,0.75,0.95],writeNodeStats=True,verbose=True):
+    """
+    Streaming ensemble statistics of edge / node betweenness over many frames.
+    Frames are solved frameBlockSize at a time with bt_calc.getBtwFrames and fed
+    straight into online aggregators (bt_calc.initBtwStats / updateBtwStats:
+    Welford mean and variance plus P^2 quantile sketches), so no per frame
+    output is written or kept in memory.
+    inDir, outDir, interactionFileNames, sourceNodeNames and targetNodeNames
+    are required, all other arguments have defaults.
+    
+    Default
+    -------
+    inDir				INPUT SHOULD BE GIVEN
+    outDir				INPUT SHOULD BE GIVEN
+    interactionFileNames		INPUT MUST BE GIVEN (list of frame files)
+    outputFileNameBase			'NO_NAME'
+    nodeColumns				['Resid_1','Resid_2']
+    energyColumn			'TOTAL'
+    sourceNodeNames			None ### INPUT MUST BE SET
+    targetNodeNames			None ### INPUT MUST BE SET
+    solverBackend			'sparse'
+    frameBlockSize			8
+    quantiles				[0.05,0.25,0.5,0.75,0.95]
+    writeNodeStats			True
+    verbose				True
+     
+    Example
+    -------    
+    current_flow_allostery.betweennessEnsemble(\
+    '{1}',\
+    '{2}',\
+    [fileName for fileName in os.listdir('{1}') if 'System__n14y2_acetyl' in fileName],\
+    'n14y2_acetyl',\
+    sourceNodeNames=['14','240','466','692','918','1144'],\
+    targetNodeNames=['47','273','499','725','951','1177']\
+    )   
+ 
+    Other notes
+    -----------
+    Files are grouped by the system and replica in their names
+    (e.g. "EnergyData_Network.System__n14y2_acetyl.Replica__rep1.Frame__000.csv")
+    and processed in sorted (trajectory) order within each group. Edges missing
+    from a frame count as zero betweenness for that frame.
+    Writes "outputFileNameBase.EdgeBetweennessStats.csv" and (if writeNodeStats)
+    "outputFileNameBase.NodeBetweennessStats.csv" with the columns system, rep,
+    the node column(s), Count, Mean, Variance, Std, Min, Max and one column per
+    quantile (e.g. Q50 for the median). solverBackend is passed to
+    bt_calc.getBtwFrames ('sparse', 'dense', 'incremental' or 'iterative').
+    Count, Mean, Variance, Std, Min and Max are exact. The quantile columns are
+    P^2 estimates (exact only for groups of at most five frames) and can be
+    off by a few percent for tail quantiles, about 2.5% has been seen at Q95
+    (see bt_calc.getBtwStatsQuantiles).
+    
+    """
+    nodeColumn_1=nodeColumns[0]
+    nodeColumn_2=nodeColumns[1]
+    fileGroups={}
+    for fileName in np.sort(interactionFileNames):
+        nameMatch=re.search(r'System__([^.]+)\.Replica__([^.]+)',fileName)
+        groupKey=nameMatch.groups() if not (nameMatch is None) else ('NONE','NONE')
+        fileGroups.setdefault(groupKey,[]).append(fileName)
+    edgeStatTables=[]
+    nodeStatTables=[]
+    for (system,rep),fileNames in fileGroups.items():
+        if verbose:
+            print('system %s, replica %s: %g frames'%(system,rep,len(fileNames)))
+            print('collecting nodes and edges of all frames')
+        edgeIndex=pd.concat([
+            pd.read_csv(inDir+'/'+fileName,usecols=[nodeColumn_1,nodeColumn_2]).astype(str) \
+            for fileName in fileNames
+        ]).drop_duplicates()
+        edgeIndex=pd.MultiIndex.from_frame(edgeIndex)
+        nodeNames=np.unique(np.concatenate([
+            edgeIndex.get_level_values(0).values,edgeIndex.get_level_values(1).values]))
+        nameToInd=pd.Series(np.arange(len(nodeNames)),index=nodeNames)
+        edgeInds_1=nameToInd.loc[edgeIndex.get_level_values(0)].values
+        edgeInds_2=nameToInd.loc[edgeIndex.get_level_values(1)].values
+        sourceNodes=nameToInd.loc[np.array(sourceNodeNames,dtype=str)].values
+        targetNodes=nameToInd.loc[np.array(targetNodeNames,dtype=str)].values
+        edgeStats=bt_calc.initBtwStats(len(edgeIndex),quantiles=quantiles)
+        nodeStats=bt_calc.initBtwStats(len(nodeNames),quantiles=quantiles)
+        orderingCache={}
+        for iStart in np.arange(0,len(fileNames),frameBlockSize):
+            blockFileNames=fileNames[iStart:(iStart+frameBlockSize)]
+            weightMat=np.zeros((len(blockFileNames),len(edgeIndex)))
+            for bInd,fileName in enumerate(blockFileNames):
+                frameData=pd.read_csv(inDir+'/'+fileName)
+                frameData[nodeColumn_1]=frameData[nodeColumn_1].map(str)
+                frameData[nodeColumn_2]=frameData[nodeColumn_2].map(str)
+                weightMat[bInd]=frameData.set_index([nodeColumn_1,nodeColumn_2])[
+                    energyColumn].abs().reindex(edgeIndex).fillna(0).values
+            btwFrames=bt_calc.getBtwFrames(
+                edgeInds_1,edgeInds_2,weightMat,sourceNodes,targetNodes,
+                nNodes=len(nodeNames),solverBackend=solverBackend,
+                frameBlockSize=frameBlockSize,orderingCache=orderingCache)
+            bt_calc.updateBtwStats(edgeStats,btwFrames)
+            if writeNodeStats:
+                bt_calc.updateBtwStats(nodeStats,np.array([
+                    bt_calc.getNodeBtwFromEdges(edgeInds_1,frameBtw,nNodes=len(nodeNames)) \
+                    for frameBtw in btwFrames]))
+            if verbose:
+                print('finished frame %g of %g'%(iStart+len(blockFileNames),len(fileNames)))
+        edgeStatTable=bt_calc.getBtwStatsTable(edgeStats)
+        edgeStatTable.insert(0,'system',system)
+        edgeStatTable.insert(1,'rep',rep)
+        edgeStatTable.insert(2,nodeColumn_1,edgeIndex.get_level_values(0).values)
+        edgeStatTable.insert(3,nodeColumn_2,edgeIndex.get_level_values(1).values)
+        edgeStatTables.append(edgeStatTable)
+        if writeNodeStats:
+            nodeStatTable=bt_calc.getBtwStatsTable(nodeStats)
+            nodeStatTable.insert(0,'system',system)
+            nodeStatTable.insert(1,'rep',rep)
+            nodeStatTable.insert(2,'NodeName',nodeNames)
+            nodeStatTables.append(nodeStatTable)
+    if verbose:
+        print('Saving betweenness statistics')
+    pd.concat(edgeStatTables).to_csv(outDir+'/'+outputFileNameBase+'.EdgeBetweennessStats.csv',index=False)
+    if writeNodeStats:
+        pd.concat(nodeStatTables).to_csv(outDir+'/'+outputFileNameBase+'.NodeBetweennessStats.csv',index=False)
 
 
+if __name__ == "__main__":
+    # Do something if this file is invoked on its own
+    print("Invoking original")
+    parser=argparse.ArgumentParser(
+        description="Loads the specified GB interaction network and calculates the corresponding flow"+\
+                    " betweenness network")
+    
+    parser.add_argument(
+        '-indir','--inputDirectory',default='.',dest='inDir',
+        help='Path to the directory containing the interaction network file. Defaults to currently active directory'
+    )
+    parser.add_argument(
+        '-i', '--interactionFileName',
+        help='Name of the GB interaction energy data file to load (required). This data file should contain a'+\
+             '\nsingle interaction network. If there are more networks / interactions present, you will need to'+\
+             '\nuse the "-selectionQueryStrings" argument to specify a pandas.DataFrame.query search query string'+\
+             '\nthat can select a single network from the data. If duplicate edges are present, the program'+\
+             '\nwill crash or give unpredictable results'
+    )
+    
+    parser.add_argument(
+        '-q','--selectionQueryStrings',nargs='*',
+        help='List of query strings to select entries from the interaction data that specify a single network'+\
+             '\nto be analyzed. If multiple strings are provided, the results are concatenated using pd.concat'
+    )
+    parser.add_argument(
+        '-c','--NodeColumns',default=['Resid_1','Resid_2'],dest='nodeColumns',nargs='*',
+        help='Names of the columns containing the names of the interacting nodes for each interaction entry'+\
+             '\nexactly two arguments should be given. If not only the first two entries will get used.'
+    )
+    parser.add_argument(
+        '-e','--energyColumn',default='TOTAL',
+        help='Name of the column containing the energy values of each interaction used to compute betweenness weights'
+    )
+    parser.add_argument(
+        '-s','--sourceNodeNames',nargs='+',dest='sourceNodeNames',
+        help='string to be fed to the pandas DataFrame.query function to collect a list of source node names'+\
+             '\nif multiple entries are given, each will be fed and the results aggregated into a list of'+\
+             '\nof unique node names'
+    )
+    parser.add_argument(
+        '-t','--targetNodeNames',nargs='+',dest='targetNodeNames',
+        help='string to be fed to the pandas DataFrame.query function to collect a list of target node names'+\
+             '\nif multiple entries are given, each will be fed and the results aggregated into a list of'+\
+             '\nof unique node names. Note: if there is any overlap. I.e. sourceNodes and targetNodes litst'+\
+             '\ncontain some of the same node(s) then a warning will be thrown and the common nodes will be put'+\
+             '\ninto the source node list.'
+    )
+    
+    parser.add_argument(
+        '-spec','--btwSpecs',nargs=3,action='append',default=None,
+        metavar=('NAME','SOURCES','TARGETS'),
+        help='Named source / target specification, e.g. "-spec gate 14,240 47,273" (comma separated node names).'+\
+             '\nMay be given multiple times; all specifications are computed from a single inversion /'+\
+             '\nfactorization and written to "outputFileNameBase.NAME.EdgeBetweenness.csv" (etc.) with a'+\
+             '\n"Specification" column. When given, --sourceNodeNames / --targetNodeNames are ignored'
+    )
+    
+    parser.add_argument(
+        '-outdir','--outputFileDirectory',default='.',dest='outDir',
+        help='Path of the directory to write output files to'
+    )
+    parser.add_argument(
+        '-o','--outputFileNameBase',
+        help='Base of the filenames e.g. edge betweenness would be in'+\
+             '\n"outputFileNameBase.EdgeBetweenness.csv" (required)'
+    )
+    parser.add_argument(
+        '-ft','--writeFullTable',nargs='?',default=False,const=True,
+        help='If this flag is set, the output table will contain all data from each row of the input dataframe'+\
+             'otherwise it will only contain the node columns and betweenness column'
+    )
+    parser.add_argument(
+        '-wnvec','--writeNodeVector',nargs='?',const=True,default=False,
+        help='If flag is given, node betweenness will also be computed written to'+\
+             '\n"outputFileNameBase.NodeBetweenness.csv"'
+    )
+    
+    
+    parser.add_argument(
+        '-windmap','--writeMatrixIndexToNodeNameMap',nargs='?',const=True,default=False,
+        help='If this flag is given, a data frame containging the columns "MatInd" and "NodeName" is written to'+\
+             '\n"outputFileNameBase.IndToNameMap.csv"'
+    )
+    
+    parser.add_argument(
+        '-sb','--solverBackend',default='pinv',
+        help='Linear algebra backend used to compute node potentials. "pinv" (default) uses the dense'+\
+             '\nmoore-penrose inverse. "sparse" grounds one node per connected component and uses a sparse'+\
+             '\nLU factorization on the interaction edge list (no dense matrices are built), which is much'+\
+             '\nfaster and needs far less memory for large networks. "circulant" is "pinv" for symmetric'+\
+             '\nhomo-oligomers (e.g. averaged networks): if the Laplacian is block circulant over the'+\
+             '\n--nSymmetryBlocks chains it is inverted chain mode by chain mode, otherwise "pinv" is used.'+\
+             '\n"spectral" approximates the potentials from the --nSpectralModes smallest Laplacian eigenpairs'+\
+             '\n(for screening); the column residual is written to the "SpectralResidual" column and the'+\
+             '\nbetweenness is recomputed exactly when it is above --maxSpectralResidual (if given)'
+    )
+    parser.add_argument(
+        '-nsym','--nSymmetryBlocks',default=6,type=int,
+        help='Number of identical chains (numbered chain by chain) used by the "circulant" backend (default 6)'
+    )
+    parser.add_argument(
+        '-nmodes','--nSpectralModes',default=50,type=int,
+        help='Number of Laplacian eigenpairs used by the "spectral" backend (default 50). On the Test_Data'+\
+             '\nframes 50 modes give a column residual of 0.35 and a max edge error of 26%% of the largest'+\
+             '\nbetweenness, 400 modes 0.11 and 6%%'
+    )
+    parser.add_argument(
+        '-maxres','--maxSpectralResidual',default=None,type=float,
+        help='Column residual above which the "spectral" backend warns and recomputes the betweenness'+\
+             '\nexactly. By default the approximation is always kept and the residual only reported'
+    )
+    
+    parser.add_argument(
+        '-uc','--useUnionColumns',nargs='?',const=True,default=False,
+        help='If this flag is given, potentials are computed only for the unique source and target nodes'+\
+             '\n(s+t solves) instead of for every source / target pair (s*t solves)'
+    )
+    
+    parser.add_argument(
+        '-mem','--memoryBudgetMB',default=None,type=float,
+        help='If given, (source,target) pairs are processed in blocks sized to keep the betweenness'+\
+             '\naccumulation temporaries below this many megabytes (useful for large source / target sets)'
+    )
+    
+    parser.add_argument(
+        '-cache','--cacheDirectory',default=None,dest='cacheDir',
+        help='If given, Laplacian pseudo inverses ("pinv" / "circulant") or potential columns ("sparse")'+\
+             '\nare cached in this directory, keyed by network content, so reruns on the same network with'+\
+             '\nnew source / target nodes skip (most of) the solve'
+    )
+    parser.add_argument(
+        '-cachemb','--maxCacheMB',default=None,type=float,
+        help='If given, least recently used cache entries are evicted to keep the cache below this many megabytes'
+    )
+    
+    parser.add_argument(
+        '-ap','--allPairs',nargs='?',const=True,default=False,
+        help='If this flag is given, betweenness is averaged over all node pairs (all pairs current flow'+\
+             '\nbetweenness) and the source / target node names are ignored'
+    )
+    
+    parser.add_argument(
+        '-gf','--groupFlow',nargs='?',const=True,default=False,
+        help='If this flag is given, all source nodes are contracted into one super-source and all target'+\
+             '\nnodes into one super-sink and a single unit of current is driven between the two groups'+\
+             '\n(one solve instead of one per source / target pair). The edge table gets a "FlowMode" column'
+    )
+    
+    parser.add_argument(
+        '-spm','--sparsifyMethod',default=None,
+        help='If given, weak edges are pruned before the betweenness calculation. "weight" ranks edges by'+\
+             '\ninteraction energy, "resistance" by their leverage (weight times effective resistance). The'+\
+             '\nrealized change of the edge betweenness is written to the "SparsificationError" column and'+\
+             '\nthe score cutoff found to the "SparsificationCutoff" column'
+    )
+    parser.add_argument(
+        '-sperr','--sparsifyMaxError',default=0.01,type=float,
+        help='Largest allowed change of any edge betweenness, relative to the largest edge betweenness,'+\
+             '\nwhen pruning edges with sparsifyMethod (default 0.01). Finding the pruning costs several'+\
+             '\nbetweenness solves (assuming the error grows with the number of dropped edges), so use it'+\
+             '\nto calibrate sparsifyCutoff on one frame and pass that cutoff for the other frames'
+    )
+    parser.add_argument(
+        '-spcut','--sparsifyCutoff',default=None,type=float,
+        help='If given, edges scoring below this value are pruned instead of searching for the largest'+\
+             '\npruning within sparsifyMaxError, and only the pruned network is solved (e.g. the'+\
+             '\n"SparsificationCutoff" of a calibration run on another frame)'
+    )
+    
+    parser.add_argument(
+        '-kron','--reductionNodeNames',nargs='+',default=None,
+        help='If given, all nodes not in this list are eliminated by Kron reduction (Schur complement of the'+\
+             '\nLaplacian) and betweenness is computed on the exact equivalent reduced network, which is written'+\
+             '\nto "outputFileNameBase.ReducedNetwork.csv". Must include all source and target nodes'
+    )
+    
+    parser.add_argument(
+        '-dscan','--deletionScan',nargs='?',const=True,default=False,
+        help='If this flag is given, the change of the source to target current when each contact or node is'+\
+             '\ndeleted is computed from low rank updates of one factorization and written to'+\
+             '\n"outputFileNameBase.EdgeSensitivity.csv" and "outputFileNameBase.NodeSensitivity.csv"'
+    )
+    
+    parser.add_argument(
+        '-grad','--gradientQuantity',default=None,
+        help='If given ("current" or "resistance"), the derivative of the mean source to target current (at unit'+\
+             '\npotential difference) or effective resistance with respect to each contact weight is computed by'+\
+             '\nthe adjoint method and written to a "CurrentGradient" / "ResistanceGradient" column'
+    )
+    
+    parser.add_argument(
+        '-wres','--writeResistances',nargs='?',const=True,default=False,
+        help='If this flag is given, the effective resistance of each source / target pair and the current flow'+\
+             '\ncloseness of each node are computed from the same pseudo inverse / factorization and written to'+\
+             '\n"outputFileNameBase.EffectiveResistance.csv" and "outputFileNameBase.NodeCloseness.csv"'
+    )
+    
+    parser.add_argument(
+        '-wpf','--writePairFlows',nargs='?',const=True,default=False,
+        help='If this flag is given, the current through each edge is also kept for each source / target pair'+\
+             '\nseparately and written to the compressed numpy archive "outputFileNameBase.PairFlows.npz"'
+    )
+    parser.add_argument(
+        '-pftopk','--pairFlowTopK',default=None,type=int,
+        help='If given, only the pairFlowTopK edges with the largest current are kept for each pair'
+    )
+    parser.add_argument(
+        '-pfthr','--pairFlowThreshold',default=None,type=float,
+        help='If given, only edges whose current is at least this fraction of the largest current of the pair'+\
+             '\nare kept for each pair'
+    )
+    
+    parser.add_argument(
+        '-aeps','--approxEpsilon',default=None,type=float,
+        help='If given, betweenness is estimated by sampling source / target pairs until the maximum absolute'+\
+             '\nerror is below this value with probability 1-approxDelta. The per edge error bound is written'+\
+             '\nto the "BetweennessErrorBound" column of the edge table'
+    )
+    parser.add_argument(
+        '-adelta','--approxDelta',default=0.1,type=float,
+        help='Failure probability used with --approxEpsilon (default 0.1)'
+    )
+    
+    parser.add_argument(
+        '-prec','--precision',default='float64',
+        help='Floating point precision of the betweenness solve: "float64" (default), "float32" or "mixed"'+\
+             '\n(single precision factorization refined to double precision, sparse backend only). The'+\
+             '\nprecision used is written to the "Precision" column of the edge table. When not float64, a'+\
+             '\ndouble precision check is run on --precisionCheckEdges randomly chosen edges and its max'+\
+             '\nrelative deviation is written to a "PrecisionMaxRelDeviation" column'
+    )
+    parser.add_argument(
+        '-pcheck','--precisionCheckEdges',default=100,type=int,
+        help='Number of edges used to check reduced precision results against double precision (default 100)'
+    )
+    
+    parser.add_argument(
+        '-dryrun',nargs='?',const=True,default=False,
+        help='Dont run anything, jsut print out input argument namespace and end program'
+    )
+    
+    parser.add_argument(
+        '-v','--verbose',nargs='?',const=True,default=False,
+        help='controls printing of progress / information to stdout during run'
+    )
+    parser.add_argument(
+        '-vl','--verboseLevel',default=0,
+        help='when verbose flag is given, controls the amount of detail printed'
+    )
+    
+    args=parser.parse_args()
+    if not (args.btwSpecs is None):
+        args.btwSpecs=[(specName,sourceNames.split(','),targetNames.split(',')) \
+                       for specName,sourceNames,targetNames in args.btwSpecs]
+    
+    betweenness(**vars(args))
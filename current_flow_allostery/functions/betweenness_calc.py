@@ -2,12 +2,23 @@
 functions for generating current flow betweenness data from network matrices
 """
 import copy
+import collections
 import numpy as np
 import scipy as sp
 import pandas as pd
 import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.sparse.linalg
 import time
 import gc
+import os
+import shutil
+import hashlib
+try:
+    import pyamg
+except ImportError:
+    #only needed for the 'amg' preconditioner of the iterative solver
+    pyamg=None
 
 def matLap(mat):
     if mat.shape[0]>mat.shape[1]:
@@ -33,41 +44,973 @@ def matAdj(mat):
     if mat.shape[0]>mat.shape[1]:
         Amat=Amat.T
     return Amat
+
+def matAdjSparse(mat):
+    """
+    Sparse counterpart of matAdj. Accepts either a dense or a scipy.sparse
+    network matrix and returns the weighted adjacency matrix (diagonal removed)
+    in csr format. No dense n x n copy is ever made.
+    """
+    Amat=sp.sparse.csr_matrix(mat,dtype=float,copy=True)
+    Amat=(Amat-sp.sparse.diags(Amat.diagonal())).tocsr()
+    Amat.eliminate_zeros()
+    return Amat
+
+def matLapSparse(mat):
+    """
+    Sparse counterpart of matLap. Uses the same convention (row sums of the
+    adjacency matrix on the diagonal) and returns the Laplacian in csc format.
+    """
+    Amat=matAdjSparse(mat)
+    return (sp.sparse.diags(np.asarray(Amat.sum(axis=1)).ravel())-Amat).tocsc()
+
+def getPairRhsMat(nNodes,sources,targets):
+    """
+    Build the n x (s*t) right hand side block with one column per
+    (source,target) pair: +1 at the source node and -1 at the target node.
+    """
+    bVecMat=np.zeros((nNodes,len(sources)*len(targets)))
+    smat,tmat=np.meshgrid(sources,targets)
+    bVecMat[
+        smat.flatten(),np.arange(len(smat.flatten()))
+    ]=1
+    bVecMat[
+        tmat.flatten(),np.arange(len(tmat.flatten()))
+    ]=-1
+    return bVecMat
+
+def getLaplacianGrounding(Lmat,groundNodes=None):
+    """
+    Connected components of the network with (sparse) Laplacian Lmat and the
+    node grounded in each of them (the one with the largest weighted degree,
+    unless groundNodes, one node per component, is given).
+    Returns (nComponents,componentLabels,groundNodes,freeNodes).
+    """
+    nNodes=Lmat.shape[0]
+    nComponents,componentLabels=sp.sparse.csgraph.connected_components(
+        Lmat,directed=False)
+    if groundNodes is None:
+        degOrder=np.lexsort((-Lmat.diagonal(),componentLabels))
+        groundNodes=degOrder[np.unique(componentLabels[degOrder],return_index=True)[1]]
+    else:
+        groundNodes=np.asarray(groundNodes)
+        if len(np.unique(componentLabels[groundNodes]))!=nComponents or \
+           len(groundNodes)!=nComponents:
+            raise ValueError("groundNodes must contain exactly one node per connected component")
+    freeMask=np.ones(nNodes,dtype=bool)
+    freeMask[groundNodes]=False
+    freeNodes=np.arange(nNodes)[freeMask]
+    return nComponents,componentLabels,groundNodes,freeNodes
+
+def isSymmetricLaplacian(Lmat):
+    """
+    Whether the (sparse) Laplacian Lmat is symmetric to round off.
+    """
+    return abs(Lmat-Lmat.T).max()<=1e-12*max(abs(Lmat).max(),np.finfo(float).tiny)
+
+def getLeftNullVector(Lmat,groundNodes,freeNodes,solveTransposed):
+    """
+    Helper for the grounded solvers. Left null vector v (v^T L=0) of a
+    Laplacian with zero row sums, one block per connected component, scaled
+    to one at the grounded nodes: v_f solves L_ff^T v_f=-L_gf^T, where
+    solveTransposed applies the grounded inverse of L^T to a vector. Returns
+    None if L is symmetric (v is then constant on each component).
+    """
+    if isSymmetricLaplacian(Lmat):
+        return None
+    rhsVec=np.zeros(Lmat.shape[0])
+    rhsVec[freeNodes]=-np.asarray(Lmat[groundNodes,:][:,freeNodes].sum(axis=0)).ravel()
+    nullVec=np.asarray(solveTransposed(rhsVec),dtype=float)
+    nullVec[groundNodes]=1.
+    return nullVec
+
+def getNullSpaceMat(nullVec,nodeLabels):
+    """
+    Helper for the grounded solvers. Split a left null vector (see
+    getLeftNullVector) into its connected components: returns the sparse
+    n x nComponents matrix with column c holding nullVec on the nodes of
+    component c, and the squared norm of each column.
+    """
+    nullMat=sp.sparse.csr_matrix(
+        (nullVec,(np.arange(len(nullVec)),nodeLabels)),shape=(len(nullVec),np.max(nodeLabels)+1))
+    return nullMat,np.asarray(nullMat.multiply(nullMat).sum(axis=0)).ravel()
+
+def projectRange(bMat,nullVec,nodeLabels):
+    """
+    Helper for the grounded solvers. Project the columns of bMat onto the
+    range of a Laplacian with left null vector nullVec (see
+    getLeftNullVector), b-v*(v^T b)/(v^T v) in each connected component.
+    Returns bMat unchanged if nullVec is None.
+    """
+    if nullVec is None:
+        return bMat
+    nullMat,nullNorms=getNullSpaceMat(nullVec,nodeLabels)
+    coefs=nullMat.T.dot(bMat)/nullNorms.reshape((-1,)+(1,)*(np.ndim(bMat)-1))
+    return bMat-nullMat.dot(coefs)
+
+def getLaplacianOrdering(Lred):
+    """
+    Fill reducing (minimum degree on A^T+A) symmetric ordering of a reduced
+    Laplacian. The ordering only depends on the sparsity pattern, so it can be
+    computed once and passed as ordering to getGroundedLaplacianFactorization
+    for every matrix with the same (or a sub-) pattern, e.g. all frames of a
+    replica or several weight transforms of one frame.
+    """
+    lu=sp.sparse.linalg.splu(sp.sparse.csc_matrix(Lred),permc_spec='MMD_AT_PLUS_A',
+                             diag_pivot_thresh=0,options=dict(SymmetricMode=True))
+    return np.argsort(lu.perm_c)
+
+def getGroundedLaplacianFactorization(Lmat,verbose=False,precision='float64',
+                                      groundNodes=None,ordering=None):
+    """
+    Factorize a (sparse) matrix Laplacian by grounding one node per connected
+    component and computing a sparse LU decomposition of the remaining,
+    non-singular, reduced Laplacian.
+    The grounded node of each component is the one with the largest weighted
+    degree. Potentials obtained from the factorization differ from those given
+    by the moore-penrose inverse only by a constant shift within each component,
+    so potential differences (and hence flow betweenness) are identical. For
+    non symmetric networks this relies on projecting the right hand sides onto
+    the range of the Laplacian, see solveGroundedLaplacian; the left null
+    vector needed for that costs one extra (transposed) solve.
+    precision controls the floating point type of the LU factors:
+       'float64': (default) double precision
+       'float32': single precision factors, about half the memory
+       'mixed': single precision factors, solves are refined iteratively
+               against the double precision Laplacian (see
+               solveGroundedLaplacian) to recover double precision accuracy
+    groundNodes (one node per component) overrides the choice of grounded
+    nodes. If ordering (see getLaplacianOrdering, computed for the same
+    grounding) is given, the reduced Laplacian is permuted by it and factorized
+    in that order without pivoting (the reduced Laplacian is diagonally
+    dominant), which skips the minimum degree ordering step. SuperLU has no
+    interface for keeping a symbolic factorization, so its symbolic analysis
+    of the permuted matrix is still redone on every call.
+    Returns a dictionary with entries:
+       nNodes: number of nodes in the network
+       nComponents: number of connected components
+       componentLabels: component index of each node
+       groundNodes: index of the grounded node of each component
+       freeNodes: indices of all non-grounded nodes
+       lu: scipy.sparse.linalg.splu factorization of the reduced Laplacian
+           (None if every node is grounded)
+       Lred: the reduced Laplacian in double precision (csc format)
+       precision: the precision used for the LU factors
+       ordering: the ordering the factors were computed in (or None)
+       leftNullVector: left null vector of the Laplacian, one at the grounded
+           nodes (None for symmetric networks)
+    """
+    if not (precision in ['float64','float32','mixed']):
+        raise ValueError("unknown precision '%s', expected 'float64', 'float32' or 'mixed'"%precision)
+    Lmat=sp.sparse.csc_matrix(Lmat,dtype=float)
+    nNodes=Lmat.shape[0]
+    nComponents,componentLabels,groundNodes,freeNodes=getLaplacianGrounding(
+        Lmat,groundNodes=groundNodes)
+    if verbose:
+        print("grounding %g nodes (one per connected component)"%nComponents)
+    Lred=Lmat[freeNodes,:][:,freeNodes].tocsc()
+    luType=float if precision=='float64' else np.float32
+    if len(freeNodes)==0:
+        lu=None
+    elif ordering is None:
+        lu=sp.sparse.linalg.splu(Lred.astype(luType))
+    else:
+        ordering=np.asarray(ordering)
+        lu=sp.sparse.linalg.splu(Lred[ordering,:][:,ordering].tocsc().astype(luType),
+                                 permc_spec='NATURAL',diag_pivot_thresh=0,
+                                 options=dict(SymmetricMode=True))
+    factorData=collections.OrderedDict({
+        'nNodes':nNodes,
+        'nComponents':nComponents,
+        'componentLabels':componentLabels,
+        'groundNodes':groundNodes,
+        'freeNodes':freeNodes,
+        'lu':lu,
+        'Lred':Lred,
+        'precision':precision,
+        'ordering':ordering})
+    factorData['leftNullVector']=getLeftNullVector(
+        Lmat,groundNodes,freeNodes,
+        lambda bVec:solveGroundedLaplacian(factorData,bVec,transpose=True,project=False,
+                                           refinementSteps=0 if precision=='float64' else 10))
+    return factorData
+
+def solveGroundedLaplacian(factorData,bMat,refinementSteps=None,transpose=False,project=True):
+    """
+    Solve L*x=b for each column of bMat using a factorization from
+    getGroundedLaplacianFactorization. Grounded nodes are held at zero potential.
+    If transpose is set, the transposed system L^T*x=b is solved instead (the
+    same factors are used; this only matters for non symmetric networks).
+    For non symmetric networks L*x=b only has a solution if b is orthogonal to
+    the left null vector v of L, otherwise the grounded solution would depend
+    on the choice of grounded nodes. If project is set (default), b is
+    therefore first projected onto the range of L, b-v*(v^T b)/(v^T v) in
+    each component, which gives the potential differences of the moore-penrose
+    pseudo inverse (as used by the 'pinv' backend). Transposed solves apply the
+    transpose of the same operator, i.e. the projection follows the solve.
+    project=False applies the plain grounded inverse (as needed for low rank
+    updates of the factorization). Symmetric networks are not affected.
+    refinementSteps iterative refinement steps (residual computed against the
+    double precision Laplacian, correction solved with the LU factors) are
+    applied after the initial solve. By default 3 steps are used for 'mixed'
+    precision factorizations and none otherwise. Unrefined 'float32' solves
+    return single precision potentials.
+    """
+    precision=factorData['precision']
+    if refinementSteps is None:
+        refinementSteps=3 if precision=='mixed' else 0
+    luType=float if precision=='float64' else np.float32
+    outType=np.float32 if (precision=='float32' and refinementSteps==0) else float
+    ordering=factorData.get('ordering')
+    trans='T' if transpose else 'N'
+    def luSolve(rhs):
+        if ordering is None:
+            return factorData['lu'].solve(np.ascontiguousarray(rhs.astype(luType)),trans=trans)
+        sol=np.zeros(rhs.shape,dtype=luType)
+        sol[ordering]=factorData['lu'].solve(
+            np.ascontiguousarray(rhs[ordering].astype(luType)),trans=trans)
+        return sol
+    bMat=np.asarray(bMat,dtype=float)
+    nullVec=factorData.get('leftNullVector') if project else None
+    if not transpose:
+        bMat=projectRange(bMat,nullVec,factorData['componentLabels'])
+    potMat=np.zeros(bMat.shape,dtype=outType)
+    if factorData['lu'] is not None:
+        bFree=np.ascontiguousarray(bMat[factorData['freeNodes']])
+        xFree=luSolve(bFree).astype(outType)
+        for iStep in np.arange(refinementSteps):
+            if transpose:
+                rFree=bFree-factorData['Lred'].T.dot(xFree)
+            else:
+                rFree=bFree-factorData['Lred'].dot(xFree)
+            xFree=xFree+luSolve(rFree)
+        potMat[factorData['freeNodes']]=xFree
+    if transpose:
+        potMat=projectRange(potMat,nullVec,factorData['componentLabels']).astype(outType)
+    return potMat
+
+def getGroundedLaplacianSystem(Lmat,preconditioner='jacobi',groundNodes=None,verbose=False):
+    """
+    Iterative counterpart of getGroundedLaplacianFactorization: ground one node
+    per connected component (or the given groundNodes, one per component, e.g.
+    to keep the grounding fixed over the frames of a trajectory) and set up a
+    preconditioner for the reduced Laplacian instead of factorizing it.
+    preconditioner can be:
+       'jacobi': (default) inverse diagonal, O(n) to build and apply
+       'ilu': incomplete LU factorization (scipy.sparse.linalg.spilu). scipy
+              has no incomplete Cholesky, for symmetric networks the ILU
+              factors play the same role
+       'amg': smoothed aggregation algebraic multigrid V cycle (needs pyamg)
+       'none': no preconditioning
+    Returns a dictionary with the entries nNodes, nComponents, componentLabels,
+    groundNodes, freeNodes and Lred of getGroundedLaplacianFactorization, plus
+       preconditioner: the preconditioner name
+       preconditionerOp: scipy.sparse.linalg.LinearOperator applying it (or None)
+       isSymmetric: whether the reduced Laplacian is symmetric (conjugate
+           gradients are used if so, BiCGSTAB otherwise)
+       leftNullVector: left null vector of the Laplacian as in
+           getGroundedLaplacianFactorization (None for symmetric networks),
+           from a Jacobi preconditioned BiCGSTAB solve of the transposed
+           system (sparse LU if that does not converge)
+    """
+    Lmat=sp.sparse.csc_matrix(Lmat,dtype=float)
+    nNodes=Lmat.shape[0]
+    nComponents,componentLabels,groundNodes,freeNodes=getLaplacianGrounding(
+        Lmat,groundNodes=groundNodes)
+    Lred=Lmat[freeNodes,:][:,freeNodes].tocsr()
+    isSymmetric=abs(Lred-Lred.T).max()<=1e-12*max(abs(Lred).max(),np.finfo(float).tiny)
+    if verbose:
+        print("grounding %g nodes, using %s preconditioner"%(nComponents,preconditioner))
+    if len(freeNodes)==0 or preconditioner=='none':
+        preconditionerOp=None
+    elif preconditioner=='jacobi':
+        preconditionerOp=sp.sparse.linalg.aslinearoperator(
+            sp.sparse.diags(1./Lred.diagonal()))
+    elif preconditioner=='ilu':
+        iluData=sp.sparse.linalg.spilu(Lred.tocsc(),drop_tol=1e-4,fill_factor=10)
+        preconditionerOp=sp.sparse.linalg.LinearOperator(
+            Lred.shape,matvec=iluData.solve,dtype=float)
+    elif preconditioner=='amg':
+        if pyamg is None:
+            raise ImportError("require pyamg for the 'amg' preconditioner")
+        preconditionerOp=pyamg.smoothed_aggregation_solver(Lred).aspreconditioner(cycle='V')
+    else:
+        raise ValueError("unknown preconditioner '%s', expected 'jacobi', 'ilu', 'amg' or 'none'"%preconditioner)
+    
+    def solveTransposed(bVec):
+        LredT=Lred.T.tocsr()
+        jacobiOp=sp.sparse.linalg.aslinearoperator(sp.sparse.diags(1./Lred.diagonal()))
+        try:
+            xFree,info=sp.sparse.linalg.bicgstab(LredT,bVec[freeNodes],rtol=1e-10,atol=0.,M=jacobiOp)
+        except TypeError:
+            xFree,info=sp.sparse.linalg.bicgstab(LredT,bVec[freeNodes],tol=1e-10,atol=0.,M=jacobiOp)
+        if info!=0:
+            xFree=sp.sparse.linalg.spsolve(LredT.tocsc(),bVec[freeNodes])
+        xVec=np.zeros(nNodes)
+        xVec[freeNodes]=xFree
+        return xVec
+    leftNullVector=None if isSymmetric or len(freeNodes)==0 else \
+        getLeftNullVector(Lmat,groundNodes,freeNodes,solveTransposed)
+    return(collections.OrderedDict({
+        'nNodes':nNodes,
+        'nComponents':nComponents,
+        'componentLabels':componentLabels,
+        'groundNodes':groundNodes,
+        'freeNodes':freeNodes,
+        'Lred':Lred,
+        'preconditioner':preconditioner,
+        'preconditionerOp':preconditionerOp,
+        'isSymmetric':isSymmetric,
+        'leftNullVector':leftNullVector}))
+
+def solveGroundedLaplacianIterative(systemData,bMat,x0=None,rtol=1e-8,maxiter=None):
+    """
+    Solve L*x=b for each column of bMat with preconditioned conjugate
+    gradients (BiCGSTAB for non symmetric networks) using a system from
+    getGroundedLaplacianSystem. Grounded nodes are held at zero potential.
+    x0 (same shape as bMat), e.g. the potentials of the previous trajectory
+    frame, is used as the starting guess (warm start), so nearly unchanged
+    systems converge in a few iterations. For non symmetric networks b is
+    first projected onto the range of L, as in solveGroundedLaplacian.
+    Returns (potMat,nIterations,converged) with the largest number of
+    iterations over all columns and whether every column reached rtol.
+    """
+    bMat=projectRange(np.asarray(bMat,dtype=float),systemData.get('leftNullVector'),
+                       systemData['componentLabels'])
+    potMat=np.zeros(bMat.shape)
+    freeNodes=systemData['freeNodes']
+    if len(freeNodes)==0:
+        return potMat,0,True
+    iterSolver=sp.sparse.linalg.cg if systemData['isSymmetric'] else sp.sparse.linalg.bicgstab
+    iterCount=[0]
+    def countIteration(xk):
+        iterCount[0]+=1
+    nIterations=0
+    converged=True
+    for iCol in np.arange(bMat.shape[1]):
+        bFree=bMat[freeNodes,iCol]
+        xFree=None if x0 is None else np.asarray(x0,dtype=float)[freeNodes,iCol]
+        iterCount[0]=0
+        try:
+            xFree,info=iterSolver(systemData['Lred'],bFree,x0=xFree,rtol=rtol,atol=0.,
+                                  maxiter=maxiter,M=systemData['preconditionerOp'],
+                                  callback=countIteration)
+        except TypeError:
+            #older scipy versions call the relative tolerance tol
+            xFree,info=iterSolver(systemData['Lred'],bFree,x0=xFree,tol=rtol,atol=0.,
+                                  maxiter=maxiter,M=systemData['preconditionerOp'],
+                                  callback=countIteration)
+        potMat[freeNodes,iCol]=xFree
+        nIterations=max(nIterations,iterCount[0])
+        converged=converged and (info==0)
+    return potMat,nIterations,converged
+
+def getEdgeArrays(Amat):
+    """
+    Return the (row indices, column indices, weights) of the non-zero entries
+    of a dense or scipy.sparse adjacency matrix.
+    """
+    if sp.sparse.issparse(Amat):
+        Acoo=Amat.tocoo()
+        return (Acoo.row,Acoo.col,Acoo.data)
+    else:
+        nzInds=np.nonzero(Amat)
+        return (nzInds[0],nzInds[1],Amat[nzInds])
+
+def getUnionNodes(sources,targets):
+    """
+    Sorted array of the unique nodes appearing in either sources or targets.
+    """
+    return np.unique(np.concatenate([np.asarray(sources),np.asarray(targets)]))
+
+def getUnitRhsMat(nNodes,nodes):
+    """
+    Build the n x len(nodes) right hand side block of unit injections at nodes.
+    """
+    bVecMat=np.zeros((nNodes,len(nodes)))
+    bVecMat[np.asarray(nodes),np.arange(len(nodes))]=1
+    return bVecMat
+
+def e_btw_from_potVecMat(potVecMat,Amat,nPairs):
+    """
+    Compute edge flow betweenness given a matrix of node potentials with one
+    column per (source,target) pair. Amat may be dense or scipy.sparse.
+    Returns a scipy.sparse.coo_matrix with the same shape as Amat.
+    """
+    Ei,Ej,edgeWeights=getEdgeArrays(Amat)
+    nzInds=(Ei,Ej)
+    return sp.sparse.coo_matrix(
+        (edgeWeights*np.sum(
+            np.abs(potVecMat[nzInds[1],:]-potVecMat[nzInds[0],:])/nPairs,
+            axis=1
+        ),
+         nzInds),
+        shape=Amat.shape
+    )
+
+def getPairBlockSize(nNodes,nEdges,nPairs,pairBlockSize=None,memoryBudgetMB=None):
+    """
+    Number of (source,target) pairs to process at a time when accumulating
+    edge betweenness. An explicit pairBlockSize takes precedence; otherwise it
+    is chosen so that the per block temporaries fit in memoryBudgetMB. The
+    peak per pair (see e_btw_from_pairBlocks) is three n-length float64
+    columns while the potentials are computed (right hand side, its copy in
+    the solver's dtype and the potentials) plus two m-length edge columns
+    while the potential differences are formed, i.e. 8*(3n+2m) bytes.
+    With neither given all pairs are processed in a single block.
+    """
+    if pairBlockSize is None:
+        if memoryBudgetMB is None:
+            return nPairs
+        pairBlockSize=int(memoryBudgetMB*2**20/(8.*(3*nNodes+2*nEdges)))
+    return int(max(1,min(nPairs,pairBlockSize)))
+
+def e_btw_from_pairBlocks(potFunc,Amat,sources,targets,blockSize,verbose=False):
+    """
+    Memory bounded edge betweenness accumulation. The (source,target) pairs are
+    processed blockSize at a time: potFunc maps an n x blockSize right hand
+    side block to the corresponding node potentials, and each block's
+    contribution is added to a single m-length edge vector. The absolute
+    potential differences are formed in place, so only two m x blockSize
+    temporaries exist at a time.
+    Returns a scipy.sparse.coo_matrix with the same shape as Amat.
+    """
+    Ei,Ej,edgeWeights=getEdgeArrays(Amat)
+    nNodes=Amat.shape[1]
+    smat,tmat=np.meshgrid(sources,targets)
+    srcPairs=smat.flatten()
+    trgPairs=tmat.flatten()
+    nPairs=len(srcPairs)
+    edgeBtw=np.zeros(len(Ei))
+    for iStart in np.arange(0,nPairs,blockSize):
+        iEnd=min(iStart+blockSize,nPairs)
+        bVecMat=np.zeros((nNodes,iEnd-iStart))
+        bVecMat[srcPairs[iStart:iEnd],np.arange(iEnd-iStart)]=1
+        bVecMat[trgPairs[iStart:iEnd],np.arange(iEnd-iStart)]=-1
+        potVecMat=np.asarray(potFunc(bVecMat))
+        bVecMat=None
+        diffMat=np.take(potVecMat,Ej,axis=0)
+        np.subtract(diffMat,np.take(potVecMat,Ei,axis=0),out=diffMat)
+        np.abs(diffMat,out=diffMat)
+        potVecMat=None
+        edgeBtw+=np.sum(diffMat,axis=1)
+        diffMat=None
+        if verbose:
+            print("accumulated pairs %g to %g of %g"%(iStart+1,iEnd,nPairs))
+    return sp.sparse.coo_matrix(
+        (edgeWeights*edgeBtw/nPairs,(Ei,Ej)),
+        shape=Amat.shape
+    )
+
+def e_btw_from_nodeColumns(colMat,colNodes,Amat,sources,targets,nodeLabels=None):
+    """
+    Compute edge flow betweenness from the potentials of unit injections at
+    each node in colNodes (i.e. the columns colNodes of the Laplacian inverse,
+    one column of colMat per entry of colNodes).
+    The potential of the (src,trg) pair is colMat[:,src]-colMat[:,trg], so only
+    len(colNodes) columns are ever needed. Pair potential differences across each
+    edge are built one source at a time, so no n x (s*t) or m x (s*t) block is
+    materialized.
+    If nodeLabels (connected component of each node) is given, pairs in
+    different components are skipped (they carry no current).
+    Returns a scipy.sparse.coo_matrix with the same shape as Amat.
+    """
+    Ei,Ej,edgeWeights=getEdgeArrays(Amat)
+    edgeBtw=pairAbsPotDiffSum(colMat,colNodes,Ei,Ej,sources,targets,
+                              nodeLabels=nodeLabels)
+    return sp.sparse.coo_matrix(
+        (edgeWeights*edgeBtw/(len(sources)*len(targets)),(Ei,Ej)),
+        shape=Amat.shape
+    )
+
+def pairAbsPotDiffSum(colMat,colNodes,Ei,Ej,sources,targets,nodeLabels=None):
+    """
+    For each edge (Ei,Ej) return the sum over all (src,trg) pairs of the
+    absolute pair potential difference across the edge, given unit injection
+    potentials colMat for the nodes colNodes.
+    colMat may carry leading (e.g. frame) axes: shape (...,n,len(colNodes)),
+    in which case the result has shape (...,m).
+    If nodeLabels (connected component of each node) is given, pairs whose
+    source and target lie in different components contribute nothing. This is
+    needed for grounded solves, where such a pair would otherwise appear to
+    drain into the grounded nodes.
+    """
+    colNodes=np.asarray(colNodes)
+    srcCols=np.searchsorted(colNodes,sources)
+    trgCols=np.searchsorted(colNodes,targets)
+    dPotMat=colMat[...,Ej,:]-colMat[...,Ei,:]
+    dTrgMat=dPotMat[...,trgCols]
+    edgeBtw=np.zeros(dPotMat.shape[:-1])
+    if nodeLabels is not None:
+        srcLabels=np.asarray(nodeLabels)[np.asarray(sources)]
+        trgLabels=np.asarray(nodeLabels)[np.asarray(targets)]
+    for iSrc,srcCol in enumerate(srcCols):
+        if nodeLabels is None:
+            edgeBtw+=np.sum(np.abs(dPotMat[...,[srcCol]]-dTrgMat),axis=-1)
+        else:
+            sameComp=trgLabels==srcLabels[iSrc]
+            edgeBtw+=np.sum(np.abs(dPotMat[...,[srcCol]]-dTrgMat[...,sameComp]),axis=-1)
+    return edgeBtw
+
+def countCrossComponentPairs(nodeLabels,sources,targets):
+    """
+    Number of (source,target) pairs whose nodes lie in different connected
+    components (nodeLabels gives the component of each node).
+    """
+    srcLabels=np.asarray(nodeLabels)[np.asarray(sources)]
+    trgLabels=np.asarray(nodeLabels)[np.asarray(targets)]
+    return int(np.sum(srcLabels[:,None]!=trgLabels[None,:]))
+
+def getPairResistances(Cmat,sources,targets,nodeLabels=None):
+    """
+    Effective resistance (potential difference of a unit current injection)
+    of every (source,target) pair, ordered source major (as
+    np.repeat(sources,t),np.tile(targets,s)), from a Laplacian inverse or
+    grounded inverse Cmat (any array supporting fancy indexing whose rows and
+    columns include all sources and targets).
+    Pairs in different components (per nodeLabels) get np.inf.
+    """
+    pairSources=np.repeat(np.asarray(sources),len(targets))
+    pairTargets=np.tile(np.asarray(targets),len(sources))
+    pairRes=np.array(Cmat[pairSources,pairSources]-Cmat[pairSources,pairTargets]-\
+                     Cmat[pairTargets,pairSources]+Cmat[pairTargets,pairTargets],dtype=float)
+    if not (nodeLabels is None):
+        pairRes[nodeLabels[pairSources]!=nodeLabels[pairTargets]]=np.inf
+    return pairRes
+
+def closeness_from_inverseSums(diagC,rowSums,colSums,nodeLabels):
+    """
+    Helper for getClosenessFromLinv / getClosenessFromFactorization.
+    Given the diagonal of a Laplacian inverse or grounded inverse C and, for
+    each node v, the sums of row v and column v over the nodes in its own
+    component, return the current flow closeness (information centrality)
+        c(v) = (n_c-1) / sum_t R(v,t)
+    where the sum runs over the n_c nodes in the component of v and
+    R(v,t)=C_vv+C_tt-C_vt-C_tv, so that
+        sum_t R(v,t) = n_c*C_vv + trace_c(C) - rowSum_v - colSum_v.
+    Isolated nodes get zero.
+    """
+    diagC=np.asarray(diagC,dtype=float)
+    compSizes=np.bincount(nodeLabels)[nodeLabels]
+    compTraces=np.bincount(nodeLabels,weights=diagC)[nodeLabels]
+    resSums=compSizes*diagC+compTraces-np.asarray(rowSums)-np.asarray(colSums)
+    closeness=np.zeros(len(diagC))
+    hasNeighbors=compSizes>1
+    closeness[hasNeighbors]=(compSizes[hasNeighbors]-1)/resSums[hasNeighbors]
+    return closeness
+
+def getComponentIndicatorMat(nodeLabels):
+    """
+    n x nComponents matrix with a one in column nodeLabels[v] of each row v.
+    """
+    nNodes=len(nodeLabels)
+    return sp.sparse.coo_matrix(
+        (np.ones(nNodes),(np.arange(nNodes),nodeLabels)),
+        shape=(nNodes,np.max(nodeLabels)+1)).toarray()
+
+def getClosenessFromLinv(Linv,nodeLabels=None):
+    """
+    Current flow closeness of every node (see closeness_from_inverseSums)
+    from a dense Laplacian pseudo inverse Linv, e.g. the one already computed
+    for the betweenness. nodeLabels gives the connected components; by default
+    the network is taken to be connected. Costs one n x nComponents product.
+    """
+    Linv=np.asarray(Linv)
+    if nodeLabels is None:
+        nodeLabels=np.zeros(Linv.shape[0],dtype=int)
+    nodeLabels=np.asarray(nodeLabels)
+    indMat=getComponentIndicatorMat(nodeLabels)
+    nodeInds=np.arange(len(nodeLabels))
+    rowSums=Linv.dot(indMat)[nodeInds,nodeLabels]
+    colSums=Linv.T.dot(indMat)[nodeInds,nodeLabels]
+    return closeness_from_inverseSums(np.diag(Linv),rowSums,colSums,nodeLabels)
+
+def getClosenessFromFactorization(factorData,nodeBlockSize=256,verbose=False):
+    """
+    Current flow closeness of every node (see closeness_from_inverseSums)
+    from a grounded Laplacian factorization. The row and column sums of the
+    grounded inverse take one (transposed) solve per component, its diagonal
+    one solve per node, done in blocks of nodeBlockSize columns so memory stays
+    at O(n*nodeBlockSize). This is n solves against the existing factors, i.e.
+    no further factorization or dense inverse.
+    """
+    if verbose:
+        t1=time.time()
+    nNodes=factorData['nNodes']
+    nodeLabels=factorData['componentLabels']
+    nodeInds=np.arange(nNodes)
+    indMat=getComponentIndicatorMat(nodeLabels)
+    rowSums=solveGroundedLaplacian(factorData,indMat)[nodeInds,nodeLabels]
+    colSums=solveGroundedLaplacian(factorData,indMat,transpose=True)[nodeInds,nodeLabels]
+    diagC=np.zeros(nNodes)
+    for blockStart in np.arange(0,nNodes,nodeBlockSize):
+        blockNodes=nodeInds[blockStart:blockStart+nodeBlockSize]
+        blockMat=solveGroundedLaplacian(factorData,getUnitRhsMat(nNodes,blockNodes))
+        diagC[blockNodes]=blockMat[blockNodes,np.arange(len(blockNodes))]
+    if verbose:
+        print("current flow closeness time:",time.time()-t1)
+    return closeness_from_inverseSums(diagC,rowSums,colSums,nodeLabels)
+
+def getResistanceDataFromLinv(Linv,sources,targets,nodeLabels=None):
+    """
+    Effective resistance of every (source,target) pair and current flow
+    closeness of every node from a dense Laplacian pseudo inverse.
+    Returns an OrderedDict with 'pairSources', 'pairTargets' (source major
+    pair order, see getPairResistances), 'pairResistances' and 'closeness'.
+    """
+    return(collections.OrderedDict([
+        ('pairSources',np.repeat(np.asarray(sources),len(targets))),
+        ('pairTargets',np.tile(np.asarray(targets),len(sources))),
+        ('pairResistances',getPairResistances(Linv,sources,targets,nodeLabels=nodeLabels)),
+        ('closeness',getClosenessFromLinv(Linv,nodeLabels=nodeLabels))
+    ]))
+
+def getResistanceDataFromFactorization(factorData,sources,targets,nodeBlockSize=256,verbose=False,
+                                       colMat=None):
+    """
+    Grounded factorization version of getResistanceDataFromLinv. Pair
+    resistances take s+t solves (for the unique source and target nodes),
+    unless colMat, the unit injection potentials of getUnionNodes(sources,targets)
+    (e.g. those already solved for the betweenness), is given. Closeness takes
+    n solves, see getClosenessFromFactorization.
+    """
+    sources=np.asarray(sources)
+    targets=np.asarray(targets)
+    colNodes=getUnionNodes(sources,targets)
+    if colMat is None:
+        colMat=solveGroundedLaplacian(factorData,getUnitRhsMat(factorData['nNodes'],colNodes))
+    colMat=colMat[colNodes]
+    return(collections.OrderedDict([
+        ('pairSources',np.repeat(sources,len(targets))),
+        ('pairTargets',np.tile(targets,len(sources))),
+        ('pairResistances',getPairResistances(
+            colMat,np.searchsorted(colNodes,sources),np.searchsorted(colNodes,targets),
+            nodeLabels=factorData['componentLabels'][colNodes])),
+        ('closeness',getClosenessFromFactorization(
+            factorData,nodeBlockSize=nodeBlockSize,verbose=verbose))
+    ]))
+
+def getResistanceDataEdges(Ei,Ej,weights,sources,targets,nNodes=None,
+                           nodeBlockSize=256,verbose=False,solveData=None):
+    """
+    Edge list version of getResistanceDataFromFactorization: factorize the
+    grounded Laplacian of the network given by Ei, Ej and weights (as in
+    getBtwEdges) and return the (source,target) effective resistances and
+    node current flow closeness.
+    solveData (see getBtwSolveData, or returnSolveData of getBtwEdges) reuses
+    the factorization and source / target columns of a betweenness run on the
+    same network, sources and targets: the pair resistances then need no
+    solves at all and only the closeness diagonal is solved for.
+    """
+    if solveData is None:
+        solveData=getBtwSolveData(Ei,Ej,weights,sources,targets,nNodes=nNodes,verbose=verbose)
+    return getResistanceDataFromFactorization(getSolveDataFactorization(solveData,verbose=verbose),
+                                              sources,targets,nodeBlockSize=nodeBlockSize,
+                                              verbose=verbose,colMat=solveData['colMat'])
+
+def getEdgeResistances(factorData,Ei,Ej,nodeBlockSize=256,verbose=False):
+    """
+    Exact effective resistance R(i,j)=C_ii+C_jj-C_ij-C_ji of every edge (Ei,Ej)
+    from a grounded Laplacian factorization, using n solves done in blocks of
+    nodeBlockSize unit injection columns (as in getClosenessFromFactorization).
+    """
+    if verbose:
+        t1=time.time()
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    nNodes=factorData['nNodes']
+    nodeInds=np.arange(nNodes)
+    edgeRes=np.zeros(len(Ei))
+    for blockStart in np.arange(0,nNodes,nodeBlockSize):
+        blockNodes=nodeInds[blockStart:blockStart+nodeBlockSize]
+        blockMat=solveGroundedLaplacian(factorData,getUnitRhsMat(nNodes,blockNodes))
+        inBlock_i=(Ei>=blockNodes[0])&(Ei<=blockNodes[-1])
+        inBlock_j=(Ej>=blockNodes[0])&(Ej<=blockNodes[-1])
+        edgeRes[inBlock_i]+=blockMat[Ei[inBlock_i],Ei[inBlock_i]-blockStart]-\
+            blockMat[Ej[inBlock_i],Ei[inBlock_i]-blockStart]
+        edgeRes[inBlock_j]+=blockMat[Ej[inBlock_j],Ej[inBlock_j]-blockStart]-\
+            blockMat[Ei[inBlock_j],Ej[inBlock_j]-blockStart]
+    if verbose:
+        print("edge resistance time:",time.time()-t1)
+    return edgeRes
+
+def getResistanceSketchEdges(Ei,Ej,weights,nNodes=None,epsilon=0.3,nProjections=None,
+                             edgeBlockSize=4096,randomSeed=None,verbose=False):
+    """
+    Johnson-Lindenstrauss sketch of all pairs effective resistances
+    (Spielman and Srivastava). With B the (undirected) edge incidence matrix,
+    W the edge weights and Q a random k x m matrix of +-1/sqrt(k) entries,
+    the rows of Z=Q W^1/2 B L^+ embed the nodes such that
+        (1-epsilon) R(u,v) <= ||Z[:,u]-Z[:,v]||^2 <= (1+epsilon) R(u,v)
+    for all pairs with high probability, once k exceeds
+    4 ln(n)/(epsilon^2/2-epsilon^3/3) (used when nProjections is not given).
+    Z takes k solves against one grounded factorization; the right hand sides
+    W^1/2 B^T Q^T are accumulated edgeBlockSize edges at a time so Q is never
+    stored. The network is symmetrized, (A+A^T)/2, as effective resistance is
+    only defined for undirected networks.
+    Returns an OrderedDict with entries:
+       embedding: n x k node embedding (rows of Z^T), query resistances with
+           getSketchResistances / getSketchResistanceMat in O(k) per pair
+       componentLabels: connected component of each node (pairs in different
+           components have infinite resistance)
+       epsilon, nProjections: the requested accuracy and the k used
+    """
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    weights=np.asarray(weights,dtype=float)
+    if nNodes is None:
+        nNodes=int(np.max([np.max(Ei),np.max(Ej)]))+1
+    if verbose:
+        t1=time.time()
+    if nProjections is None:
+        nProjections=int(np.ceil(4*np.log(nNodes)/(epsilon**2/2.-epsilon**3/3.)))
+    offDiag=Ei!=Ej
+    Amat=sp.sparse.coo_matrix(
+        (weights[offDiag],(Ei[offDiag],Ej[offDiag])),shape=(nNodes,nNodes)).tocsr()
+    Amat=((Amat+Amat.T)/2.).tocsr()
+    upperMat=sp.sparse.triu(Amat,k=1).tocoo()
+    nEdges=len(upperMat.data)
+    rng=np.random.default_rng(randomSeed)
+    rhsMat=np.zeros((nNodes,nProjections))
+    for blockStart in np.arange(0,nEdges,edgeBlockSize):
+        blockEdges=np.arange(blockStart,min(blockStart+edgeBlockSize,nEdges))
+        projMat=np.sqrt(upperMat.data[blockEdges])[:,None]*\
+            rng.choice([-1.,1.],size=(len(blockEdges),nProjections))/np.sqrt(nProjections)
+        incidenceMat=sp.sparse.coo_matrix(
+            (np.concatenate([np.ones(len(blockEdges)),-np.ones(len(blockEdges))]),
+             (np.concatenate([upperMat.row[blockEdges],upperMat.col[blockEdges]]),
+              np.concatenate([np.arange(len(blockEdges)),np.arange(len(blockEdges))]))),
+            shape=(nNodes,len(blockEdges))).tocsr()
+        rhsMat+=incidenceMat.dot(projMat)
+    factorData=getGroundedLaplacianFactorization(matLapSparse(Amat),verbose=verbose)
+    embedding=solveGroundedLaplacian(factorData,rhsMat)
+    if verbose:
+        print("resistance sketch with %g projections for %g nodes and %g edges"%(
+            nProjections,nNodes,nEdges))
+        print("resistance sketch time:",time.time()-t1)
+    return(collections.OrderedDict([
+        ('embedding',embedding),
+        ('componentLabels',factorData['componentLabels']),
+        ('epsilon',epsilon),
+        ('nProjections',nProjections)
+    ]))
+
+def getResistanceSketch(mat,epsilon=0.3,nProjections=None,randomSeed=None,verbose=False):
+    """
+    Matrix version of getResistanceSketchEdges.
+    """
+    Ei,Ej,edgeWeights=getEdgeArrays(matAdjSparse(mat))
+    return getResistanceSketchEdges(Ei,Ej,edgeWeights,nNodes=mat.shape[0],epsilon=epsilon,
+                                    nProjections=nProjections,randomSeed=randomSeed,
+                                    verbose=verbose)
+
+def getSketchResistances(sketchData,nodes_1,nodes_2):
+    """
+    Approximate effective resistance of each node pair (nodes_1[i],nodes_2[i])
+    from a resistance sketch (see getResistanceSketchEdges), O(k) per pair.
+    """
+    nodes_1=np.asarray(nodes_1)
+    nodes_2=np.asarray(nodes_2)
+    embedding=sketchData['embedding']
+    pairRes=np.sum((embedding[nodes_1]-embedding[nodes_2])**2,axis=-1)
+    nodeLabels=sketchData['componentLabels']
+    pairRes[nodeLabels[nodes_1]!=nodeLabels[nodes_2]]=np.inf
+    return pairRes
+
+def getSketchResistanceMat(sketchData):
+    """
+    Dense n x n matrix of approximate effective resistances between all node
+    pairs from a resistance sketch (see getResistanceSketchEdges), e.g. as a
+    communication distance for clustering. Costs O(n^2 k).
+    """
+    embedding=sketchData['embedding']
+    sqNorms=np.sum(embedding**2,axis=1)
+    resMat=np.maximum(sqNorms[:,None]+sqNorms[None,:]-2*embedding.dot(embedding.T),0)
+    resMat[np.arange(len(sqNorms)),np.arange(len(sqNorms))]=0
+    nodeLabels=sketchData['componentLabels']
+    resMat[nodeLabels[:,None]!=nodeLabels[None,:]]=np.inf
+    return resMat
+
+def pair_flows_from_nodeColumns(colMat,colNodes,Ei,Ej,weights,sources,targets,
+                                topK=None,relThreshold=None,nodeLabels=None):
+    """
+    Helper for getPairFlowsEdges: per (source,target) pair edge currents
+    weights*(p_i-p_j) from unit injection potential columns (as in
+    e_btw_from_nodeColumns), processed one source at a time. For each pair only
+    the edges with non zero current are kept, further restricted to those whose
+    absolute current is at least relThreshold times the largest one of that
+    pair and / or to the topK largest ones.
+    Pairs in different components (per nodeLabels) carry no current.
+    Returns (pairIndex,edgeIndex,current) arrays, sorted by pair then edge,
+    where pairIndex counts pairs in source major order.
+    """
+    sCols=np.searchsorted(colNodes,sources)
+    tCols=np.searchsorted(colNodes,targets)
+    pairInds=[]
+    edgeInds=[]
+    currents=[]
+    for iSource,sCol in enumerate(sCols):
+        potMat=colMat[:,[sCol]]-colMat[:,tCols]
+        curMat=weights[:,None]*(potMat[Ei]-potMat[Ej])
+        if not (nodeLabels is None):
+            curMat[:,nodeLabels[sources[iSource]]!=nodeLabels[targets]]=0
+        absMat=np.abs(curMat)
+        keepMat=absMat>0
+        if not (relThreshold is None):
+            keepMat&=absMat>=relThreshold*np.max(absMat,axis=0)
+        if (not (topK is None)) and (topK<len(Ei)):
+            topMat=np.zeros(absMat.shape,dtype=bool)
+            np.put_along_axis(topMat,np.argpartition(-absMat,topK-1,axis=0)[:topK],True,axis=0)
+            keepMat&=topMat
+        keepTargets,keepEdges=np.nonzero(keepMat.T)
+        pairInds.append(iSource*len(targets)+keepTargets)
+        edgeInds.append(keepEdges)
+        currents.append(curMat[keepEdges,keepTargets])
+    return(np.concatenate(pairInds).astype(np.int32),
+           np.concatenate(edgeInds).astype(np.int32),
+           np.concatenate(currents).astype(np.float32))
+
+def getPairFlowsEdges(Ei,Ej,weights,sources,targets,nNodes=None,
+                      topK=None,relThreshold=None,verbose=False,solveData=None):
+    """
+    Pair resolved flow tensor: the current through each edge for each
+    (source,target) pair separately instead of summed over pairs, e.g. to tell
+    same chain, adjacent chain and opposite chain pairs apart. Potentials come
+    from s+t solves against one grounded factorization (as in getBtwEdges), so
+    the cost is about that of a single betweenness run.
+    The tensor is stored sparsely (see pair_flows_from_nodeColumns): per pair,
+    only edges above relThreshold times that pair's largest current and / or
+    the topK largest are kept. With neither, all edges with non zero current
+    are kept (up to m*s*t entries).
+    Currents are signed, positive from Ei to Ej; their absolute value summed
+    over all pairs and divided by s*t is the edge betweenness.
+    The pair flows are the unsummed betweenness columns, so solveData (see
+    getBtwSolveData, or returnSolveData of getBtwEdges) of a betweenness run on
+    the same network, sources and targets is reused without any solve.
+    Returns an OrderedDict with 'pairSources' / 'pairTargets' (the nodes of each
+    pair, source major order), 'pairIndex', 'edgeIndex' (row of the input edge
+    list) and 'current' (float32).
+    """
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    weights=np.asarray(weights,dtype=float)
+    sources=np.asarray(sources)
+    targets=np.asarray(targets)
+    if nNodes is None:
+        nNodes=int(np.max([np.max(Ei),np.max(Ej)]))+1
+    if verbose:
+        t1=time.time()
+    if solveData is None:
+        solveData=getBtwSolveData(Ei,Ej,weights,sources,targets,nNodes=nNodes,verbose=verbose)
+    pairIndex,edgeIndex,current=pair_flows_from_nodeColumns(
+        solveData['colMat'],solveData['colNodes'],Ei,Ej,weights,sources,targets,
+        topK=topK,relThreshold=relThreshold,nodeLabels=solveData['nodeLabels'])
+    if verbose:
+        print("kept %g of %g edge / pair currents"%(len(current),len(Ei)*len(sources)*len(targets)))
+        print("pair flow calculation time:",time.time()-t1)
+    return(collections.OrderedDict([
+        ('pairSources',np.repeat(sources,len(targets))),
+        ('pairTargets',np.tile(targets,len(sources))),
+        ('pairIndex',pairIndex),
+        ('edgeIndex',edgeIndex),
+        ('current',current)
+    ]))
+
+def e_btw_from_factorization(factorData,Amat,sources,targets,verbose=False,
+                             useUnionColumns=False,pairBlockSize=None,
+                             memoryBudgetMB=None):
+    """
+    Sparse analogue of e_btw_from_Linv. Node potentials are obtained by solving
+    against a grounded Laplacian factorization instead of multiplying by a dense
+    pseudo inverse. Returns the edge betweenness as a scipy.sparse.csr_matrix.
+    If useUnionColumns is set, only s+t unit injection systems are solved
+    instead of one system per (source,target) pair (see e_btw_from_nodeColumns).
+    Otherwise, if pairBlockSize or memoryBudgetMB is given, pairs are solved and
+    accumulated in blocks (see e_btw_from_pairBlocks).
+    """
+    if verbose:
+        t1=time.time()
+    nEdges=Amat.nnz if sp.sparse.issparse(Amat) else np.count_nonzero(Amat)
+    blockSize=getPairBlockSize(factorData['nNodes'],nEdges,
+                               len(sources)*len(targets),
+                               pairBlockSize=pairBlockSize,
+                               memoryBudgetMB=memoryBudgetMB)
+    if useUnionColumns:
+        colNodes=getUnionNodes(sources,targets)
+        colMat=solveGroundedLaplacian(
+            factorData,getUnitRhsMat(factorData['nNodes'],colNodes))
+        btw2=e_btw_from_nodeColumns(colMat,colNodes,Amat,sources,targets,
+                                    nodeLabels=factorData['componentLabels']).tocsr()
+    elif blockSize<len(sources)*len(targets):
+        btw2=e_btw_from_pairBlocks(
+            lambda bVecMat:solveGroundedLaplacian(factorData,bVecMat),
+            Amat,sources,targets,blockSize,
+            verbose=verbose).tocsr()
+    else:
+        potVecMat=solveGroundedLaplacian(
+            factorData,getPairRhsMat(factorData['nNodes'],sources,targets))
+        btw2=e_btw_from_potVecMat(potVecMat,Amat,len(sources)*len(targets)).tocsr()
+    if verbose:
+        t2=time.time()
+        print('total betweenness calculation time:',t2-t1)
+    return(btw2)
     
 def e_btw_from_Linv(Linv,Amat,sources,targets,verbose=False,verboseLevel=0,
-                    useLegacyAlgorithm=False,useProgressBar=False):
+                    useLegacyAlgorithm=False,useProgressBar=False,
+                    useUnionColumns=False,pairBlockSize=None,memoryBudgetMB=None):
+    """
+    Compute edge flow betweenness from the (pseudo) inverse of the matrix
+    Laplacian (Linv) and the weighted adjacency matrix (Amat).
+    The default vectorized algorithm evaluates all s*t pair potentials at once,
+    which needs an m x (s*t) temporary. If pairBlockSize or memoryBudgetMB (in
+    MB) is given, pairs are instead processed in blocks and accumulated into a
+    single edge vector so that memory stays bounded for large source / target
+    sets (see getPairBlockSize and e_btw_from_pairBlocks).
+    useUnionColumns uses the s+t columns of Linv directly
+    (see e_btw_from_nodeColumns).
+    """
     if useLegacyAlgorithm:
         return(e_btw_from_Linv_legacy(Linv,Amat,sources,targets,verbose=False,verboseLevel=0,
                     useProgressBar=True))
+    elif useUnionColumns:
+        if verbose:
+            t1=time.time()
+        colNodes=getUnionNodes(sources,targets)
+        btw2=np.array(e_btw_from_nodeColumns(
+            np.asarray(Linv)[:,colNodes],colNodes,Amat,sources,targets).todense())
+        if verbose:
+            t2=time.time()
+            print('total betweenness calculation time:',t2-t1)
+        return(btw2)
+    elif (pairBlockSize is not None) or (memoryBudgetMB is not None):
+        if verbose:
+            t1=time.time()
+        blockSize=getPairBlockSize(Amat.shape[1],np.count_nonzero(Amat),
+                                   len(sources)*len(targets),
+                                   pairBlockSize=pairBlockSize,
+                                   memoryBudgetMB=memoryBudgetMB)
+        if verbose:
+            print('accumulating betweenness in blocks of %g pairs'%blockSize)
+        btw2=np.array(e_btw_from_pairBlocks(
+            lambda bVecMat:np.matmul(Linv,bVecMat.astype(Linv.dtype)),
+            Amat,sources,targets,blockSize,
+            verbose=(verbose and (verboseLevel>0))).todense())
+        if verbose:
+            t2=time.time()
+            print('total betweenness calculation time:',t2-t1)
+        return(btw2)
     else:
         
         if verbose:
             t1=time.time()
-        bVecMat=np.zeros((Amat.shape[1],len(sources)*len(targets)))
-        smat,tmat=np.meshgrid(sources,targets)
-        bVecMat[
-            smat.flatten(),np.arange(len(smat.flatten()))
-        ]=1
-        bVecMat[
-            tmat.flatten(),np.arange(len(tmat.flatten()))
-        ]=-1
-        smat=[]
-        tmat=[]
-        gc.collect()
+        bVecMat=getPairRhsMat(Amat.shape[1],sources,targets).astype(Linv.dtype)
         
         potVecMat=np.array(np.matmul(Linv,bVecMat))
         bVecMat=[]
         gc.collect()
         
-        nzInds=np.nonzero(Amat)
-        btw2=np.array(sp.sparse.coo_matrix(
-            (Amat[nzInds]*np.sum(
-                np.abs(potVecMat[nzInds[1],:]-potVecMat[nzInds[0],:])/(len(sources)*len(targets)),
-                axis=1
-            ),
-             nzInds),
-            shape=Amat.shape
-        ).todense())
+        btw2=np.array(e_btw_from_potVecMat(
+            potVecMat,Amat,len(sources)*len(targets)).todense())
         if verbose:
             t2=time.time()
             print('total betweenness calculation time:',t2-t1)
@@ -161,9 +1104,575 @@ def calcCorrDissipation(corrMat,btwMat):
     return np.sum(np.abs(np.array(btwMat))*\
                   np.abs(np.array(btwMat))/np.abs(np.array(corrMat)))
 
+def getBtwMat_by_component(mat,sources,targets,nodeLabels,verbose=False,Linv=None,**kwargs):
+    """
+    Helper for getBtwMat: compute flow betweenness separately on each connected
+    component (given by nodeLabels) that contains at least one source and one
+    target, and assemble the results. All other edges get zero. kwargs are
+    passed on to getBtwMat.
+    If Linv, the pseudo inverse of the whole network's Laplacian, is given
+    (e.g. a block circulant one, whose structure is lost when the network is
+    split), each component uses its diagonal block of Linv, which is the
+    pseudo inverse of the component's Laplacian, instead of solving again.
+    If returnResistanceData is set in kwargs, the per component resistance data
+    is assembled as well: pairs in different components get an infinite
+    resistance and nodes in components without sources and targets (which are
+    not solved) get a closeness of np.nan.
+    """
+    sources=np.asarray(sources)
+    targets=np.asarray(targets)
+    nPairs=len(sources)*len(targets)
+    nCrossPairs=countCrossComponentPairs(nodeLabels,sources,targets)
+    if nCrossPairs>0:
+        print("WARNING! %g of %g source / target pairs lie in different connected components"%(
+            nCrossPairs,nPairs),"and carry no current")
+    activeComps=np.intersect1d(nodeLabels[sources],nodeLabels[targets])
+    if verbose:
+        print("network has %g connected components, %g contain both sources and targets"%(
+            np.max(nodeLabels)+1,len(activeComps)))
+    isSparse=sp.sparse.issparse(mat) or (kwargs.get('solverBackend','pinv')=='sparse')
+    if sp.sparse.issparse(mat):
+        mat=sp.sparse.csr_matrix(mat)
+    returnResistanceData=kwargs.get('returnResistanceData',False)
+    if returnResistanceData:
+        resistanceData=collections.OrderedDict([
+            ('pairSources',np.repeat(sources,len(targets))),
+            ('pairTargets',np.tile(targets,len(sources))),
+            ('pairResistances',np.full(nPairs,np.inf)),
+            ('closeness',np.full(mat.shape[0],np.nan))
+        ])
+    rows=[]
+    cols=[]
+    vals=[]
+    btwMat=None if isSparse else np.zeros(mat.shape)
+    for iComp in activeComps:
+        compNodes=np.nonzero(nodeLabels==iComp)[0]
+        compSources=np.searchsorted(compNodes,sources[nodeLabels[sources]==iComp])
+        compTargets=np.searchsorted(compNodes,targets[nodeLabels[targets]==iComp])
+        if sp.sparse.issparse(mat):
+            compMat=mat[compNodes,:][:,compNodes]
+        else:
+            compMat=np.asarray(mat)[np.ix_(compNodes,compNodes)]
+        if Linv is None:
+            compBtw=getBtwMat(compMat,compSources,compTargets,verbose=verbose,
+                              splitComponents=False,**kwargs)
+        else:
+            compLinv=np.asarray(Linv)[np.ix_(compNodes,compNodes)]
+            compBtw=e_btw_from_Linv(compLinv,matAdj(copy.deepcopy(compMat)),compSources,compTargets,
+                                    verbose=verbose,verboseLevel=kwargs.get('verboseLevel',0),
+                                    useLegacyAlgorithm=kwargs.get('useLegacyAlgorithm',False),
+                                    useProgressBar=kwargs.get('useProgressBar',False),
+                                    useUnionColumns=kwargs.get('useUnionColumns',False),
+                                    pairBlockSize=kwargs.get('pairBlockSize'),
+                                    memoryBudgetMB=kwargs.get('memoryBudgetMB'))
+            if returnResistanceData:
+                compBtw=(compBtw,getResistanceDataFromLinv(compLinv,compSources,compTargets))
+        if returnResistanceData:
+            compBtw,compResData=compBtw
+            compPairs=(np.nonzero(nodeLabels[sources]==iComp)[0][:,None]*len(targets)+\
+                       np.nonzero(nodeLabels[targets]==iComp)[0][None,:]).ravel()
+            resistanceData['pairResistances'][compPairs]=compResData['pairResistances']
+            resistanceData['closeness'][compNodes]=compResData['closeness']
+        #rescale from the per component pair average to the average over all pairs
+        compScale=len(compSources)*len(compTargets)/float(nPairs)
+        if isSparse:
+            compBtw=sp.sparse.coo_matrix(compBtw)
+            rows.append(compNodes[compBtw.row])
+            cols.append(compNodes[compBtw.col])
+            vals.append(compBtw.data*compScale)
+        else:
+            btwMat[np.ix_(compNodes,compNodes)]=np.asarray(compBtw)*compScale
+    if isSparse:
+        if len(vals)==0:
+            btwMat=sp.sparse.csr_matrix(mat.shape)
+        else:
+            btwMat=sp.sparse.coo_matrix(
+                (np.concatenate(vals),(np.concatenate(rows),np.concatenate(cols))),
+                shape=mat.shape).tocsr()
+    if returnResistanceData:
+        return btwMat,resistanceData
+    return btwMat
+
+def getBtwCacheKey(*arrays):
+    """
+    Hash (sha1 hex digest) of the contents, shapes and dtypes of the given
+    arrays / values, used to key the on disk betweenness cache by network
+    content (e.g. edge list and weights) and solver settings.
+    """
+    hasher=hashlib.sha1()
+    for arr in arrays:
+        arr=np.ascontiguousarray(arr)
+        hasher.update(('%s%s'%(arr.dtype.str,arr.shape)).encode())
+        hasher.update(arr.tobytes())
+    return hasher.hexdigest()
+
+def makeCacheEntry(entryDir):
+    #the marker file tells pruneBtwCache that the directory belongs to the cache
+    os.makedirs(entryDir,exist_ok=True)
+    open(os.path.join(entryDir,'.btw_cache_entry'),'a').close()
+
+def isCacheEntry(cacheDir,cacheKey):
+    #only directories carrying the marker file written by makeCacheEntry
+    return os.path.exists(os.path.join(cacheDir,cacheKey,'.btw_cache_entry'))
+
+def pruneBtwCache(cacheDir,maxCacheMB,keepKeys=[]):
+    """
+    Least recently used eviction for the on disk betweenness cache: entries
+    (subdirectories of cacheDir) are removed, oldest access first, until the
+    total cache size is at most maxCacheMB megabytes. Entries in keepKeys are
+    never removed. Only directories made by the cache (holding the marker
+    file written by getCachedArray / getCachedNodeColumns) are counted and
+    evicted, anything else in cacheDir is left alone. Entries that can not be
+    removed (e.g. because another process still has their arrays memory
+    mapped, which blocks deletion on Windows) are kept and skipped.
+    Returns the list of evicted keys.
+    """
+    entries=[]
+    for cacheKey in os.listdir(cacheDir):
+        entryDir=os.path.join(cacheDir,cacheKey)
+        if not isCacheEntry(cacheDir,cacheKey):
+            continue
+        entrySize=np.sum([os.path.getsize(os.path.join(entryDir,fileName)) \
+                          for fileName in os.listdir(entryDir)])
+        entries.append((os.path.getmtime(entryDir),cacheKey,entrySize))
+    entries.sort()
+    totalMB=np.sum([entry[2] for entry in entries])/2.**20
+    evicted=[]
+    for entryTime,cacheKey,entrySize in entries:
+        if totalMB<=maxCacheMB:
+            break
+        if cacheKey in keepKeys:
+            continue
+        try:
+            shutil.rmtree(os.path.join(cacheDir,cacheKey))
+        except OSError:
+            continue
+        totalMB-=entrySize/2.**20
+        evicted.append(cacheKey)
+    return evicted
+
+def saveCacheArray(entryDir,fileName,arr):
+    #write to a temporary file first so readers never see partial files
+    tmpFile=os.path.join(entryDir,'tmp.'+fileName)
+    np.save(tmpFile,arr)
+    os.replace(tmpFile,os.path.join(entryDir,fileName))
+
+def getCachedArray(cacheDir,cacheKey,fileName,computeFunc,maxCacheMB=None,verbose=False):
+    """
+    Return the array stored as cacheDir/cacheKey/fileName (.npy, memory mapped
+    read only) or compute it with computeFunc(), store it and return it.
+    Accessed entries are marked as recently used; if maxCacheMB is given, the
+    cache is pruned afterwards (see pruneBtwCache).
+    """
+    entryDir=os.path.join(cacheDir,cacheKey)
+    arrFile=os.path.join(entryDir,fileName)
+    if os.path.exists(arrFile):
+        if verbose:
+            print("loading cached %s for %s"%(fileName,cacheKey))
+        arr=np.load(arrFile,mmap_mode='r')
+    else:
+        arr=computeFunc()
+        makeCacheEntry(entryDir)
+        saveCacheArray(entryDir,fileName,arr)
+    os.utime(entryDir)
+    if not (maxCacheMB is None):
+        pruneBtwCache(cacheDir,maxCacheMB,keepKeys=[cacheKey])
+    return arr
+
+def getCachedNodeColumns(cacheDir,cacheKey,nodes,solveFunc,maxCacheMB=None,verbose=False):
+    """
+    Unit injection potential columns for the given nodes, backed by the on
+    disk cache entry cacheDir/cacheKey, which holds
+       columns.npy: n x k potential columns
+       nodes.npy: the k (sorted) nodes the columns belong to
+       labels.npy: connected component label of each network node
+    Only columns not yet in the cache are computed, using
+    solveFunc(missingNodes) -> (colMat,nodeLabels), and are added to the entry.
+    The columns are memory mapped if all requested nodes are cached and read
+    into memory if the entry has to be rewritten. nodes.npy is written last,
+    so an interrupted update leaves columns.npy and nodes.npy with mismatched
+    sizes, in which case the entry is ignored and rebuilt.
+    Returns (colMat,nodeLabels) with colMat columns ordered as nodes.
+    """
+    entryDir=os.path.join(cacheDir,cacheKey)
+    nodes=np.asarray(nodes)
+    cachedNodes=np.zeros(0,dtype=int)
+    cachedCols=None
+    nodeLabels=None
+    if os.path.exists(os.path.join(entryDir,'nodes.npy')):
+        storedNodes=np.load(os.path.join(entryDir,'nodes.npy'))
+        storedCols=np.load(os.path.join(entryDir,'columns.npy'),mmap_mode='r')
+        if storedCols.shape[1]==len(storedNodes):
+            cachedNodes=storedNodes
+            cachedCols=storedCols
+            nodeLabels=np.load(os.path.join(entryDir,'labels.npy'))
+        elif verbose:
+            print("cache entry %s is incomplete, rebuilding it"%cacheKey)
+        del storedCols
+    missingNodes=np.setdiff1d(nodes,cachedNodes)
+    if verbose:
+        print("%g of %g potential columns found in cache"%(
+            len(np.unique(nodes))-len(missingNodes),len(np.unique(nodes))))
+    if len(missingNodes)>0:
+        if not (cachedCols is None):
+            #read the columns into memory and drop the memory map before
+            #columns.npy is replaced (not possible on Windows while mapped)
+            cachedCols=np.array(cachedCols)
+        newCols,nodeLabels=solveFunc(missingNodes)
+        allNodes=np.union1d(cachedNodes,missingNodes)
+        allCols=np.zeros((newCols.shape[0],len(allNodes)),dtype=newCols.dtype)
+        allCols[:,np.searchsorted(allNodes,missingNodes)]=newCols
+        if len(cachedNodes)>0:
+            allCols[:,np.searchsorted(allNodes,cachedNodes)]=cachedCols
+        makeCacheEntry(entryDir)
+        saveCacheArray(entryDir,'labels.npy',nodeLabels)
+        saveCacheArray(entryDir,'columns.npy',allCols)
+        saveCacheArray(entryDir,'nodes.npy',allNodes)
+        cachedNodes=allNodes
+        cachedCols=allCols
+    colMat=np.array(cachedCols[:,np.searchsorted(cachedNodes,nodes)])
+    del cachedCols
+    os.utime(entryDir)
+    if not (maxCacheMB is None):
+        pruneBtwCache(cacheDir,maxCacheMB,keepKeys=[cacheKey])
+    return colMat,nodeLabels
+
+def getBlockCirculantBlocks(mat,nBlocks,tolerance=1e-6):
+    """
+    Check whether the dense n x n matrix mat is block circulant with nBlocks
+    blocks per row, i.e. block (a,b) only depends on (b-a) mod nBlocks, as is
+    the case for networks of symmetrized (or frame averaged) homo-oligomers
+    whose nodes are numbered chain by chain (e.g. Resid=Seqid+226*(Chain-1)).
+    Returns the first block row as an array of shape (nBlocks,n/nBlocks,n/nBlocks)
+    or None if mat is not block circulant to within tolerance (relative to
+    the largest matrix entry).
+    """
+    mat=np.asarray(mat)
+    if (mat.shape[0]!=mat.shape[1]) or (mat.shape[0]%nBlocks!=0):
+        return None
+    blockSize=mat.shape[0]//nBlocks
+    blockMat=mat.reshape(nBlocks,blockSize,nBlocks,blockSize).transpose(0,2,1,3)
+    circBlocks=blockMat[0]
+    matScale=np.max(np.abs(mat))
+    for iBlock in np.arange(1,nBlocks):
+        if np.max(np.abs(blockMat[iBlock]-np.roll(circBlocks,iBlock,axis=0)))>tolerance*matScale:
+            return None
+    return np.array(circBlocks)
+
+def getBlockCirculantPinv(Lmat,nBlocks,tolerance=1e-6,precision='float64'):
+    """
+    Moore-penrose inverse of a block circulant Laplacian (see
+    getBlockCirculantBlocks). A discrete Fourier transform over the block
+    (chain) index splits the problem into nBlocks independent problems of size
+    n/nBlocks:
+        L_q = sum_d C_d exp(2*pi*i*q*d/nBlocks)
+    each of which is pseudo inverted on its own before transforming back. For
+    a C6 hexamer this replaces one 1356 node pseudo inverse with six 226 node
+    ones. Returns None if Lmat is not block circulant within tolerance.
+    """
+    circBlocks=getBlockCirculantBlocks(Lmat,nBlocks,tolerance=tolerance)
+    if circBlocks is None:
+        return None
+    nNodes=Lmat.shape[0]
+    modeMats=nBlocks*np.fft.ifft(circBlocks,axis=0)
+    if precision=='float32':
+        modeInvs=np.linalg.pinv(modeMats.astype(np.complex64),
+                                rcond=10*np.finfo(np.float32).eps)
+    else:
+        modeInvs=np.linalg.pinv(modeMats)
+    invBlocks=np.real(np.fft.fft(modeInvs,axis=0))/nBlocks
+    blockInds=np.mod(np.arange(nBlocks)[None,:]-np.arange(nBlocks)[:,None],nBlocks)
+    return invBlocks[blockInds].transpose(0,2,1,3).reshape(nNodes,nNodes)
+
+def getLaplacianPinv(mat,solverBackend='pinv',precision='float64',
+                     nSymmetryBlocks=6,symmetryTolerance=1e-6,
+                     cacheDir=None,maxCacheMB=None,verbose=False):
+    """
+    Dense moore-penrose inverse of the Laplacian of mat as used by the 'pinv'
+    and 'circulant' backends of getBtwMat (see there for the options).
+    """
+    if verbose:
+        print("computing matrix Laplacian")
+    Lmat=matLap(copy.deepcopy(mat))
+    if precision=='float32':
+        Lmat=np.asarray(Lmat,dtype=np.float32)
+    def computeLinv():
+        Linv=None
+        if solverBackend=='circulant':
+            if verbose:
+                print("computing block circulant moore-penrose inverse over %g blocks"%nSymmetryBlocks)
+            Linv=getBlockCirculantPinv(Lmat,nSymmetryBlocks,tolerance=symmetryTolerance,
+                                       precision=precision)
+            if Linv is None:
+                print("WARNING! matrix Laplacian is not block circulant over %g blocks,"%nSymmetryBlocks,
+                      "falling back to pinv")
+        if Linv is None:
+            if verbose:
+                print("computing moore-penrose inverse of matrix Laplacian")
+            if precision=='float32':
+                #the default cutoff scales with the matrix size and would discard
+                #genuine small eigenvalues of the Laplacian in single precision
+                Linv=np.linalg.pinv(Lmat,rcond=10*np.finfo(np.float32).eps)
+            else:
+                Linv=np.linalg.pinv(Lmat)
+        return Linv
+    if cacheDir is None:
+        Linv=computeLinv()
+    else:
+        cacheKey=getBtwCacheKey(np.asarray(mat,dtype=float),
+                                np.array([solverBackend,precision,str(nSymmetryBlocks)]))
+        Linv=getCachedArray(cacheDir,cacheKey,'Linv.npy',computeLinv,
+                            maxCacheMB=maxCacheMB,verbose=verbose)
+    return Linv
+
+def getLaplacianSpectrum(mat,nModes=50,verbose=False):
+    """
+    Compute the nModes smallest non trivial eigenpairs of the network Laplacian
+    for a truncated spectral approximation of its pseudo inverse (see
+    getSpectralLinvColumns). The Laplacian is symmetrized, (L+L^T)/2, since GB
+    networks are only nearly symmetric. The eigenpairs are found with ARPACK
+    (scipy.sparse.linalg.eigsh) in shift invert mode around a small negative
+    shift, i.e. one sparse factorization followed by O(nModes*m) work per
+    Lanczos iteration; plain Lanczos converges far too slowly at the low end of
+    a Laplacian spectrum. Small networks fall back to a dense eigensolver.
+    The null space (one constant vector per connected component) is dropped.
+    The spectrum does not depend on the sources and targets, and a uniform
+    conductance scaling only scales the eigenvalues, so the result can be
+    reused for every source / target set and scaling of the same network.
+    Returns an OrderedDict with entries:
+       eigenvalues: the nModes smallest non zero eigenvalues
+       eigenvectors: n x nModes matrix of the corresponding eigenvectors
+       diagCorrection: estimate of the truncated tail of the pseudo inverse
+           diagonal, (1-1/n_c-sum_k v_k(i)^2)/degree(i), i.e. the missing
+           (high frequency, hence local) modes approximated by the inverse
+           degree
+       componentLabels: connected component of each node
+       Lmat: the symmetrized sparse Laplacian (used for residuals)
+    """
+    if verbose:
+        t1=time.time()
+    Amat=matAdjSparse(mat)
+    Amat=((Amat+Amat.T)/2.).tocsr()
+    Lmat=matLapSparse(Amat)
+    nNodes=Amat.shape[0]
+    nComponents,nodeLabels=sp.sparse.csgraph.connected_components(Amat,directed=False)
+    degrees=np.asarray(Amat.sum(axis=1)).ravel()
+    nEig=min(nModes+nComponents,nNodes)
+    if nEig>=nNodes-1:
+        eigVals,eigVecs=np.linalg.eigh(Lmat.toarray())
+    else:
+        eigVals,eigVecs=sp.sparse.linalg.eigsh(Lmat,k=nEig,sigma=-1e-6*np.max(degrees),
+                                               which='LM')
+    eigOrder=np.argsort(eigVals)[nComponents:nEig]
+    eigVals=eigVals[eigOrder]
+    eigVecs=eigVecs[:,eigOrder]
+    compSizes=np.bincount(nodeLabels)[nodeLabels]
+    diagCorrection=np.zeros(nNodes)
+    hasEdges=degrees>0
+    diagCorrection[hasEdges]=np.maximum(
+        1.-1./compSizes[hasEdges]-np.sum(eigVecs[hasEdges]**2,axis=1),0)/degrees[hasEdges]
+    if verbose:
+        print("computed %g Laplacian eigenpairs, eigenvalue range %g - %g"%(
+            len(eigVals),np.min(eigVals),np.max(eigVals)))
+        print("spectrum calculation time:",time.time()-t1)
+    return(collections.OrderedDict([
+        ('eigenvalues',eigVals),
+        ('eigenvectors',eigVecs),
+        ('diagCorrection',diagCorrection),
+        ('componentLabels',nodeLabels),
+        ('Lmat',Lmat)
+    ]))
+
+def getSpectralLinvColumns(spectrumData,nodes,conductanceScale=1.,nSmoothingSteps=0):
+    """
+    Approximate the columns nodes of the Laplacian pseudo inverse from a
+    truncated spectrum (see getLaplacianSpectrum) as low rank plus diagonal
+    correction:
+        Linv[:,j] ~ V diag(1/lambda) V[j,:]^T + diagCorrection[j] e_j
+    For a network whose conductances are conductanceScale times those the
+    spectrum was computed for, the columns are divided by conductanceScale.
+    nSmoothingSteps Jacobi steps x <- x + D^-1 (b - L x) (D the degrees,
+    b the right hand side of getSpectralResiduals) can be applied afterwards to
+    recover part of the local, high frequency response the truncated spectrum
+    misses, at O(m) per step and column.
+    """
+    nodes=np.asarray(nodes)
+    eigVecs=spectrumData['eigenvectors']
+    colMat=(eigVecs/spectrumData['eigenvalues']).dot(eigVecs[nodes].T)
+    colMat[nodes,np.arange(len(nodes))]+=spectrumData['diagCorrection'][nodes]
+    if nSmoothingSteps>0:
+        Lmat=spectrumData['Lmat']
+        degrees=Lmat.diagonal()
+        invDegrees=np.zeros(len(degrees))
+        invDegrees[degrees>0]=1./degrees[degrees>0]
+        rhsMat=getSpectralRhsMat(spectrumData['componentLabels'],nodes)
+        for iStep in np.arange(nSmoothingSteps):
+            colMat=colMat+invDegrees[:,None]*(rhsMat-Lmat.dot(colMat))
+    return colMat/conductanceScale
+
+def getSpectralRhsMat(nodeLabels,nodes):
+    """
+    Right hand sides e_j - 1_c/n_c whose Laplacian solutions are the pseudo
+    inverse columns j in nodes (1_c/n_c spreads the withdrawn unit current
+    over the component of node j).
+    """
+    compSizes=np.bincount(nodeLabels)
+    rhsMat=-(nodeLabels[:,None]==nodeLabels[nodes][None,:]).astype(float)/\
+        compSizes[nodeLabels[nodes]]
+    rhsMat[nodes,np.arange(len(nodes))]+=1
+    return rhsMat
+
+def getSpectralResiduals(spectrumData,nodes,colMat,conductanceScale=1.):
+    """
+    Relative residual ||L x_j - b_j|| / ||b_j|| of each approximate pseudo
+    inverse column x_j (see getSpectralLinvColumns and getSpectralRhsMat).
+    """
+    rhsMat=getSpectralRhsMat(spectrumData['componentLabels'],np.asarray(nodes))
+    residMat=conductanceScale*spectrumData['Lmat'].dot(colMat)-rhsMat
+    return np.linalg.norm(residMat,axis=0)/np.linalg.norm(rhsMat,axis=0)
+
+def getSpectralBtwEdges(Ei,Ej,weights,sources,targets,nNodes=None,nModes=50,
+                        spectrumData=None,conductanceScale=1.,nSmoothingSteps=2,
+                        maxResidual=None,verbose=False):
+    """
+    Approximate flow betweenness for screening, with node potentials from a
+    truncated spectral approximation of the Laplacian pseudo inverse (see
+    getLaplacianSpectrum and getSpectralLinvColumns) instead of a dense pinv.
+    Only the s+t source and target columns are formed, followed by
+    nSmoothingSteps Jacobi smoothing steps. Edge currents are local, so the
+    truncation error is largest near the sources and targets; the reported
+    residual shows how far the columns are from the exact ones.
+    spectrumData from an earlier call (returned in spectralInfo) can be passed
+    to skip the eigensolver, e.g. for other sources and targets, or for the
+    same network with all conductances scaled by conductanceScale (weights
+    should then be the scaled conductances).
+    The residual tracks the betweenness error: on the Test_Data WT frames
+    (1356 nodes) 50 modes give a max residual of 0.35 and a max edge error of
+    26% of the largest betweenness, 400 modes 0.11 and 6%. Adding modes
+    converges slowly, so by default (maxResidual None) the approximation is
+    always kept and the residual only reported. If maxResidual is given and
+    the largest residual exceeds it a warning is printed and the betweenness
+    is recomputed exactly with getBtwEdges.
+    Returns (edgeBtw,spectralInfo). edgeBtw is aligned with the input edges and
+    spectralInfo is an OrderedDict with entries:
+       nModes: number of eigenpairs used
+       columnResiduals: relative residual of each source / target column, see
+           getSpectralResiduals (ordered as getUnionNodes(sources,targets))
+       maxResidual: the largest of these
+       exactFallback: True if edgeBtw was recomputed exactly
+       spectrumData: the spectrum, for reuse
+    """
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    weights=np.asarray(weights,dtype=float)
+    if nNodes is None:
+        nNodes=int(np.max([np.max(Ei),np.max(Ej)]))+1
+    if verbose:
+        t1=time.time()
+    offDiag=Ei!=Ej
+    if spectrumData is None:
+        Amat=sp.sparse.coo_matrix(
+            (weights[offDiag],(Ei[offDiag],Ej[offDiag])),shape=(nNodes,nNodes)).tocsr()
+        spectrumData=getLaplacianSpectrum(Amat,nModes=nModes,verbose=verbose)
+        conductanceScale=1.
+    colNodes=getUnionNodes(sources,targets)
+    colMat=getSpectralLinvColumns(spectrumData,colNodes,conductanceScale=conductanceScale,
+                                  nSmoothingSteps=nSmoothingSteps)
+    colResiduals=getSpectralResiduals(spectrumData,colNodes,colMat,
+                                      conductanceScale=conductanceScale)
+    nodeLabels=spectrumData['componentLabels']
+    nPairs=len(sources)*len(targets)
+    nCrossPairs=countCrossComponentPairs(nodeLabels,sources,targets)
+    if nCrossPairs>0:
+        print("WARNING! %g of %g source / target pairs lie in different connected components"%(
+            nCrossPairs,nPairs),"and carry no current")
+    edgeBtw=weights*pairAbsPotDiffSum(colMat,colNodes,Ei,Ej,sources,targets,
+                                      nodeLabels=nodeLabels)/nPairs
+    edgeBtw[~offDiag]=0
+    if verbose:
+        print("spectral approximation with %g modes, max relative column residual %.3e"%(
+            len(spectrumData['eigenvalues']),np.max(colResiduals)))
+    exactFallback=(not (maxResidual is None)) and (np.max(colResiduals)>maxResidual)
+    if exactFallback:
+        print("WARNING! spectral column residual %.3e above maxResidual %.3e,"%(
+            np.max(colResiduals),maxResidual),"recomputing the betweenness exactly")
+        edgeBtw=getBtwEdges(Ei,Ej,weights,sources,targets,nNodes=nNodes,verbose=verbose)
+    if verbose:
+        t2=time.time()
+        print('total betweenness calculation time:',t2-t1)
+    return(edgeBtw,collections.OrderedDict([
+        ('nModes',len(spectrumData['eigenvalues'])),
+        ('columnResiduals',colResiduals),
+        ('maxResidual',np.max(colResiduals)),
+        ('exactFallback',exactFallback),
+        ('spectrumData',spectrumData)
+    ]))
+
+def getKronReducedMat(mat,keepNodes,dropTolerance=0.,nodeBlockSize=256,verbose=False):
+    """
+    Kron reduction of a network onto a region of interest: all nodes not in
+    keepNodes are eliminated through the Schur complement of the Laplacian
+        L_red = L_kk - L_ke * L_ee^-1 * L_ek
+    which is the exact equivalent network on the kept nodes, i.e. any current
+    injected and withdrawn at kept nodes produces the same kept node
+    potentials (and hence the same betweenness between kept nodes, the same
+    effective resistances, ...) as in the full network. For non symmetric
+    networks this holds for the grounded potentials, the pseudo inverse
+    potentials of the other backends (see solveGroundedLaplacian) also depend
+    on the left null vector over the eliminated nodes and are only
+    approximated. Eliminated nodes in components without any kept node are
+    simply dropped.
+    L_ee is factorized once with a sparse LU decomposition and solved against
+    L_ek in blocks of nodeBlockSize columns. The reduced network is generally
+    dense; reduced conductances below dropTolerance times the largest one are
+    set to zero.
+    Returns the reduced weighted adjacency matrix, indexed in the order of
+    np.unique(keepNodes), as a scipy.sparse.csr_matrix for scipy.sparse input
+    and a dense matrix otherwise.
+    """
+    if verbose:
+        t1=time.time()
+    Amat=matAdjSparse(mat)
+    Lmat=matLapSparse(Amat).tocsr()
+    keepNodes=np.unique(keepNodes)
+    nComponents,nodeLabels=sp.sparse.csgraph.connected_components(Amat,directed=False)
+    elimNodes=np.setdiff1d(
+        np.nonzero(np.isin(nodeLabels,nodeLabels[keepNodes]))[0],keepNodes)
+    if verbose:
+        print("eliminating %g of %g nodes onto %g kept nodes"%(
+            len(elimNodes),Amat.shape[0],len(keepNodes)))
+    Lred=Lmat[keepNodes,:][:,keepNodes].toarray()
+    if len(elimNodes)>0:
+        Lee=Lmat[elimNodes,:][:,elimNodes].tocsc()
+        Lek=Lmat[elimNodes,:][:,keepNodes].tocsc()
+        Lke=Lmat[keepNodes,:][:,elimNodes].tocsr()
+        lu=sp.sparse.linalg.splu(Lee)
+        for blockStart in np.arange(0,len(keepNodes),nodeBlockSize):
+            blockCols=np.arange(blockStart,min(blockStart+nodeBlockSize,len(keepNodes)))
+            Lred[:,blockCols]-=Lke.dot(lu.solve(Lek[:,blockCols].toarray()))
+    Ared=-Lred
+    Ared[np.arange(len(keepNodes)),np.arange(len(keepNodes))]=0
+    #the Schur complement of a Laplacian is a Laplacian, negative
+    #conductances can only come from round off
+    Ared[Ared<0]=0
+    if dropTolerance>0:
+        Ared[Ared<dropTolerance*np.max(Ared)]=0
+    if verbose:
+        print("Kron reduction time:",time.time()-t1)
+    if sp.sparse.issparse(mat):
+        return sp.sparse.csr_matrix(Ared)
+    return Ared
+
 def getBtwMat(mat,sources,targets,
               verbose=False,verboseLevel=0,
-              useProgressBar=False,useLegacyAlgorithm=False):
+              useProgressBar=False,useLegacyAlgorithm=False,
+              solverBackend='pinv',useUnionColumns=False,
+              pairBlockSize=None,memoryBudgetMB=None,precision='float64',
+              splitComponents=True,nSymmetryBlocks=6,symmetryTolerance=1e-6,
+              cacheDir=None,maxCacheMB=None,returnResistanceData=False,
+              reductionNodes=None,nSpectralModes=50,spectrumData=None,
+              maxSpectralResidual=None,nCheckEdges=0,randomSeed=None,
+              returnPrecisionInfo=False):
     """
     Given a (possibly weighted) network in matrix format (mat)
     and a set of source and target nodes (sources and targets)
@@ -176,20 +1685,1882 @@ def getBtwMat(mat,sources,targets,
     At worst case, this could yield O(n^4) for an n-node matrix!
     Also, the sources and targets must be disjoint sets or the results
     will be incorrect.
+    
+    solverBackend selects how node potentials are computed:
+       'pinv': (default) dense moore-penrose pseudo inverse of the full
+               Laplacian. Returns a dense matrix.
+       'sparse': mat may be given as a scipy.sparse matrix (dense input is
+               converted). One node per connected component is grounded and
+               the reduced Laplacian is factorized once with a sparse LU
+               decomposition. Memory scales with the number of edges rather
+               than n^2, so much larger networks can be handled.
+               Returns a scipy.sparse.csr_matrix.
+       'circulant': as 'pinv', but for networks of symmetric homo-oligomers
+               with nSymmetryBlocks identical chains numbered chain by chain.
+               If the Laplacian is block circulant (to within
+               symmetryTolerance), the pseudo inverse is computed blockwise
+               in the Fourier basis of the chain index, see
+               getBlockCirculantPinv. Otherwise a warning is printed and the
+               general 'pinv' path is used. Returns a dense matrix.
+       'spectral': approximate, for screening. The pseudo inverse columns of
+               the sources and targets are approximated from the
+               nSpectralModes smallest Laplacian eigenpairs (low rank plus
+               diagonal correction, see getSpectralBtwEdges) instead of a
+               dense pinv. spectrumData from getLaplacianSpectrum can be
+               passed to reuse the eigenpairs for other sources / targets.
+               The max column residual is printed when verbose. By default
+               (maxSpectralResidual None) the approximation is always kept;
+               if maxSpectralResidual is given and the residual is above it
+               the betweenness is recomputed exactly with a warning (see
+               getSpectralBtwEdges for the expected error). Returns the
+               type of mat (dense or scipy.sparse.csr_matrix).
+    The exact backends give the same betweenness to numerical precision, also
+    for networks that are not exactly symmetric: the grounded solves then
+    project the unit injections onto the range of the Laplacian, which
+    reproduces the potential differences of the pseudo inverse (see
+    solveGroundedLaplacian).
+    
+    If useUnionColumns is set, potentials are only computed for unit injections
+    at the s+t unique source and target nodes, and per pair potential
+    differences are assembled one source at a time. This replaces the s*t
+    column right hand side block and cuts the solve / matrix product cost by
+    roughly s*t/(s+t).
+    
+    pairBlockSize / memoryBudgetMB bound the memory used when accumulating
+    betweenness over many (source,target) pairs: pairs are processed in blocks
+    of pairBlockSize, or of the largest size whose temporaries fit in
+    memoryBudgetMB megabytes.
+    
+    precision='float32' computes the Laplacian inverse (or factorization) and
+    the potentials in single precision, halving memory. precision='mixed'
+    (sparse backend only) refines single precision solves against the double
+    precision Laplacian, see getGroundedLaplacianFactorization.
+    If nCheckEdges > 0, the betweenness of that many randomly chosen edges is
+    recomputed from a double precision sparse factorization and compared to
+    the result (see getPrecisionCheck), for any backend. If
+    returnPrecisionInfo is set, the dictionary of getPrecisionCheck is
+    returned as an additional last element, (btwMat,precisionInfo) or
+    (btwMat,resistanceData,precisionInfo).
+    
+    If splitComponents is set (default) and the network is disconnected (e.g.
+    after filtering weak interactions), the connected components are found
+    first and only the components containing both sources and targets are
+    solved, each on its own (smaller) Laplacian. Edges in all other components
+    get exactly zero. Source / target pairs lying in different components carry
+    no current; their number is reported with a warning. Results are still
+    averaged over all s*t pairs. For the 'circulant' backend the block
+    circulant structure is checked on the whole network before splitting (the
+    components alone are not block circulant, e.g. the chains of a hexamer
+    without inter chain contacts); its pseudo inverse is then computed once
+    and each component uses its diagonal block.
+    
+    If cacheDir is given, the pseudo inverse computed by the 'pinv' and
+    'circulant' backends is stored there (keyed by a hash of mat and the solver
+    settings, see getCachedArray) and reused, memory mapped, by later calls on
+    the same network, e.g. with other sources and targets. maxCacheMB bounds
+    the cache size (least recently used entries are evicted first).
+    
+    If returnResistanceData is set, (btwMat,resistanceData) is returned, where
+    resistanceData holds the effective resistance of each (source,target) pair
+    and the current flow closeness of each node, derived from the same pseudo
+    inverse or factorization (see getResistanceDataFromLinv and
+    getResistanceDataFromFactorization). On the 'pinv' / 'circulant' path this
+    is nearly free; the 'sparse' backend needs n additional solves for the
+    closeness.
+    
+    If reductionNodes is given, the network is first Kron reduced onto these
+    nodes (see getKronReducedMat), which must include all sources and targets,
+    and the betweenness is computed on the (much smaller) equivalent reduced
+    network. The result keeps the shape of mat, with the reduced network edge
+    betweenness between kept nodes and zeros elsewhere. Reduced edges combine
+    direct contacts and paths through the eliminated nodes. Pair resistances
+    are exact; closeness is that of the reduced network (np.nan for
+    eliminated nodes). All solver options are applied to the reduced network;
+    spectrumData must then be the spectrum of the reduced network, indexed in
+    the order of np.unique(reductionNodes).
     """
-    if verbose:
-        print("computing matrix Laplacian")
-    Lmat=matLap(copy.deepcopy(mat))
+    #options passed on unchanged when the betweenness is computed on the Kron
+    #reduced network or ahead of the precision check
+    solverOptions=dict(verbose=verbose,verboseLevel=verboseLevel,
+                       useProgressBar=useProgressBar,useLegacyAlgorithm=useLegacyAlgorithm,
+                       solverBackend=solverBackend,useUnionColumns=useUnionColumns,
+                       pairBlockSize=pairBlockSize,memoryBudgetMB=memoryBudgetMB,
+                       precision=precision,splitComponents=splitComponents,
+                       nSymmetryBlocks=nSymmetryBlocks,symmetryTolerance=symmetryTolerance,
+                       cacheDir=cacheDir,maxCacheMB=maxCacheMB,
+                       returnResistanceData=returnResistanceData,
+                       nSpectralModes=nSpectralModes,spectrumData=spectrumData,
+                       maxSpectralResidual=maxSpectralResidual)
+    if not (reductionNodes is None):
+        keepNodes=np.unique(reductionNodes)
+        if not np.all(np.isin(np.concatenate([sources,targets]),keepNodes)):
+            raise ValueError("reductionNodes must include all sources and targets")
+        if not (spectrumData is None) and spectrumData['Lmat'].shape[0]!=len(keepNodes):
+            raise ValueError("with reductionNodes, spectrumData must be that of the reduced network")
+        redMat=getKronReducedMat(mat,keepNodes,verbose=verbose)
+        redBtw=getBtwMat(redMat,np.searchsorted(keepNodes,sources),
+                         np.searchsorted(keepNodes,targets),
+                         nCheckEdges=nCheckEdges,randomSeed=randomSeed,
+                         returnPrecisionInfo=returnPrecisionInfo,**solverOptions)
+        if returnPrecisionInfo:
+            precisionInfo=redBtw[-1]
+            redBtw=redBtw[0] if len(redBtw)==2 else redBtw[:-1]
+        if returnResistanceData:
+            redBtw,resistanceData=redBtw
+            resistanceData['pairSources']=keepNodes[resistanceData['pairSources']]
+            resistanceData['pairTargets']=keepNodes[resistanceData['pairTargets']]
+            closeness=np.full(mat.shape[0],np.nan)
+            closeness[keepNodes]=resistanceData['closeness']
+            resistanceData['closeness']=closeness
+        if sp.sparse.issparse(redBtw):
+            redBtw=sp.sparse.coo_matrix(redBtw)
+            btwMat=sp.sparse.coo_matrix(
+                (redBtw.data,(keepNodes[redBtw.row],keepNodes[redBtw.col])),
+                shape=mat.shape).tocsr()
+        else:
+            btwMat=np.zeros(mat.shape)
+            btwMat[np.ix_(keepNodes,keepNodes)]=np.asarray(redBtw)
+        btwResult=(btwMat,resistanceData) if returnResistanceData else (btwMat,)
+        if returnPrecisionInfo:
+            btwResult=btwResult+(precisionInfo,)
+        return btwResult if len(btwResult)>1 else btwMat
+    if (nCheckEdges>0) or returnPrecisionInfo:
+        btwResult=getBtwMat(mat,sources,targets,**solverOptions)
+        btwMat=btwResult[0] if returnResistanceData else btwResult
+        Ei,Ej,edgeWeights=getEdgeArrays(matAdjSparse(mat))
+        edgeBtw=np.asarray(btwMat[Ei,Ej]).ravel()
+        precisionInfo=getPrecisionCheck(Ei,Ej,edgeWeights,edgeBtw,sources,targets,nNodes=mat.shape[0],
+                                        precision=precision,nCheckEdges=nCheckEdges,
+                                        randomSeed=randomSeed,verbose=verbose)
+        if not returnPrecisionInfo:
+            return btwResult
+        if returnResistanceData:
+            return btwResult+(precisionInfo,)
+        return btwMat,precisionInfo
+    if solverBackend=='spectral':
+        if returnResistanceData:
+            raise ValueError("returnResistanceData is not available for the spectral backend")
+        Ei,Ej,edgeWeights=getEdgeArrays(matAdjSparse(mat))
+        edgeBtw,spectralInfo=getSpectralBtwEdges(Ei,Ej,edgeWeights,sources,targets,
+                                                 nNodes=mat.shape[0],nModes=nSpectralModes,
+                                                 spectrumData=spectrumData,
+                                                 maxResidual=maxSpectralResidual,verbose=verbose)
+        btwMat=sp.sparse.coo_matrix((edgeBtw,(Ei,Ej)),shape=mat.shape).tocsr()
+        if sp.sparse.issparse(mat):
+            return btwMat
+        return np.array(btwMat.todense())
+    if splitComponents:
+        nComponents,nodeLabels=sp.sparse.csgraph.connected_components(
+            matAdjSparse(mat),directed=False)
+        if nComponents>1:
+            Linv=None
+            compBackend=solverBackend
+            if solverBackend=='circulant':
+                #the components are not block circulant themselves, so the
+                #structure is checked, and used, on the whole network
+                if not (precision in ['float64','float32']):
+                    raise ValueError("the circulant backend supports precision 'float64' or 'float32' only")
+                if getBlockCirculantBlocks(matLap(copy.deepcopy(mat)),nSymmetryBlocks,
+                                           tolerance=symmetryTolerance) is None:
+                    print("WARNING! matrix Laplacian is not block circulant over %g blocks,"%nSymmetryBlocks,
+                          "falling back to pinv")
+                    compBackend='pinv'
+                else:
+                    Linv=getLaplacianPinv(mat,solverBackend=solverBackend,precision=precision,
+                                          nSymmetryBlocks=nSymmetryBlocks,
+                                          symmetryTolerance=symmetryTolerance,
+                                          cacheDir=cacheDir,maxCacheMB=maxCacheMB,verbose=verbose)
+            return(getBtwMat_by_component(
+                mat,sources,targets,nodeLabels,Linv=Linv,
+                verbose=verbose,verboseLevel=verboseLevel,
+                useProgressBar=useProgressBar,useLegacyAlgorithm=useLegacyAlgorithm,
+                solverBackend=compBackend,useUnionColumns=useUnionColumns,
+                pairBlockSize=pairBlockSize,memoryBudgetMB=memoryBudgetMB,
+                precision=precision,nSymmetryBlocks=nSymmetryBlocks,
+                symmetryTolerance=symmetryTolerance,
+                cacheDir=cacheDir,maxCacheMB=maxCacheMB,
+                returnResistanceData=returnResistanceData))
+    if solverBackend=='sparse':
+        if verbose:
+            print("computing sparse matrix Laplacian")
+        Amat=matAdjSparse(mat)
+        Lmat=matLapSparse(Amat)
+        if verbose:
+            print("factorizing grounded matrix Laplacian")
+        factorData=getGroundedLaplacianFactorization(Lmat,verbose=verbose,
+                                                     precision=precision)
+        if verbose:
+            print("generating flow betweenness scores")
+        btwMat=e_btw_from_factorization(factorData,Amat,sources,targets,
+                                        verbose=verbose,
+                                        useUnionColumns=useUnionColumns,
+                                        pairBlockSize=pairBlockSize,
+                                        memoryBudgetMB=memoryBudgetMB)
+        if returnResistanceData:
+            if verbose:
+                print("computing effective resistances and current flow closeness")
+            return btwMat,getResistanceDataFromFactorization(
+                factorData,sources,targets,verbose=verbose)
+        return btwMat
+    elif not (solverBackend in ['pinv','circulant']):
+        raise ValueError(("unknown solverBackend '%s', expected 'pinv', 'sparse', 'circulant'"+
+                          " or 'spectral'")%solverBackend)
+    if not (precision in ['float64','float32']):
+        raise ValueError("the %s backend supports precision 'float64' or 'float32' only"%solverBackend)
+    Linv=getLaplacianPinv(mat,solverBackend=solverBackend,precision=precision,
+                          nSymmetryBlocks=nSymmetryBlocks,symmetryTolerance=symmetryTolerance,
+                          cacheDir=cacheDir,maxCacheMB=maxCacheMB,verbose=verbose)
     if verbose:
         print("extracting weighted adjacency matrix")
     Amat=matAdj(copy.deepcopy(mat))
-    if verbose:
-        print("computing moore-penrose inverse of matrix Laplacian")
-    Linv=np.linalg.pinv(Lmat)
     if verbose:
         print("generating flow betweenness scores")
-    return(e_btw_from_Linv(Linv,Amat,sources,targets,
+    btwMat=e_btw_from_Linv(Linv,Amat,sources,targets,
                            verbose=verbose,verboseLevel=verboseLevel,
-                           useLegacyAlgorithm=useLegacyAlgorithm,useProgressBar=useProgressBar))
+                           useLegacyAlgorithm=useLegacyAlgorithm,useProgressBar=useProgressBar,
+                           useUnionColumns=useUnionColumns,
+                           pairBlockSize=pairBlockSize,memoryBudgetMB=memoryBudgetMB)
+    if returnResistanceData:
+        if verbose:
+            print("computing effective resistances and current flow closeness")
+        nComponents,nodeLabels=sp.sparse.csgraph.connected_components(
+            matAdjSparse(mat),directed=False)
+        return btwMat,getResistanceDataFromLinv(Linv,sources,targets,nodeLabels=nodeLabels)
+    return btwMat
+
+def getEdgeWeightGradientEdges(Ei,Ej,weights,sources,targets,nNodes=None,
+                               quantity='current',verbose=False,solveData=None):
+    """
+    Sensitivity of the source to target signal to every edge weight at once,
+    via the adjoint method. For each (source,target) pair, with p the grounded
+    potentials of a unit injection (L p = e_s - e_t) and lambda the adjoint
+    potentials (L^T lambda = e_s - e_t), the effective resistance R=p_s-p_t
+    changes with the weight of contact (i,j) (both directed entries A_ij and
+    A_ji increased together) as
+        dR/dw_ij = -(lambda_i-lambda_j)*(p_i-p_j)
+    which is -(p_i-p_j)^2 for symmetric networks. This needs the s+t forward
+    solves of the betweenness, which are reused from solveData (see
+    getBtwSolveData, or returnSolveData of getBtwEdges) if it is given for the
+    same network, sources and targets. For symmetric networks lambda=p, for
+    non symmetric ones lambda takes one extra batch of s+t transposed solves
+    against the same factorization, and the pseudo inverse also moves with the
+    left null vector v of L, which adds
+        (v_s-v_t)/|v|^2*(v_i-v_j)*(mu_i-mu_j)
+    (|v|^2 over the connected component, mu=L^+ lambda), one more batch of
+    s+t forward solves.
+    quantity selects what is differentiated, averaged over the pairs whose
+    source and target are connected:
+       'current': (default) mean source to target current at unit potential
+               difference, 1/R, so dI/dw=-dR/dw/R^2 (>=0 for symmetric
+               networks: strengthening any contact can only help)
+       'resistance': mean effective resistance R
+    Returns an array of length m (aligned with the input edges, self edges get
+    zero) with the derivative with respect to each edge weight.
+    """
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    weights=np.asarray(weights,dtype=float)
+    sources=np.asarray(sources)
+    targets=np.asarray(targets)
+    if not (quantity in ['current','resistance']):
+        raise ValueError("unknown gradient quantity '%s', expected 'current' or 'resistance'"%quantity)
+    if nNodes is None:
+        nNodes=int(np.max([np.max(Ei),np.max(Ej)]))+1
+    if verbose:
+        t1=time.time()
+    offDiag=Ei!=Ej
+    if solveData is None:
+        solveData=getBtwSolveData(Ei,Ej,weights,sources,targets,nNodes=nNodes,verbose=verbose)
+    factorData=getSolveDataFactorization(solveData,verbose=verbose)
+    nodeLabels=solveData['nodeLabels']
+    colNodes=solveData['colNodes']
+    potMat=solveData['colMat']
+    nullVec=factorData['leftNullVector']
+    if nullVec is None:
+        #symmetric network, the adjoint potentials are the forward ones
+        adjMat=potMat
+    else:
+        adjMat=solveGroundedLaplacian(factorData,getUnitRhsMat(nNodes,colNodes),transpose=True)
+    sCols=np.searchsorted(colNodes,sources)
+    tCols=np.searchsorted(colNodes,targets)
+    dPotMat=potMat[Ei]-potMat[Ej]
+    dAdjMat=adjMat[Ei]-adjMat[Ej]
+    if not (nullVec is None):
+        nullNorms=getNullSpaceMat(nullVec,nodeLabels)[1]
+        dNullVec=nullVec[Ei]-nullVec[Ej]
+        muMat=solveGroundedLaplacian(factorData,adjMat)
+        dMuMat=muMat[Ei]-muMat[Ej]
+    edgeGrad=np.zeros(len(Ei))
+    nConnected=0
+    for iSource,sCol in enumerate(sCols):
+        sameComp=nodeLabels[targets]==nodeLabels[sources[iSource]]
+        compCols=tCols[sameComp]
+        nConnected+=len(compCols)
+        if len(compCols)==0:
+            continue
+        pairGrad=-(dAdjMat[:,[sCol]]-dAdjMat[:,compCols])*(dPotMat[:,[sCol]]-dPotMat[:,compCols])
+        if not (nullVec is None):
+            pairGrad+=((nullVec[sources[iSource]]-nullVec[colNodes[compCols]])/
+                       nullNorms[nodeLabels[sources[iSource]]])*\
+                dNullVec[:,None]*(dMuMat[:,[sCol]]-dMuMat[:,compCols])
+        if quantity=='current':
+            pairRes=potMat[colNodes[sCol],sCol]-potMat[colNodes[compCols],sCol]-\
+                potMat[colNodes[sCol],compCols]+potMat[colNodes[compCols],compCols]
+            pairGrad=-pairGrad/pairRes**2
+        edgeGrad+=np.sum(pairGrad,axis=1)
+    nCrossPairs=len(sources)*len(targets)-nConnected
+    if nCrossPairs>0:
+        print("WARNING! %g of %g source / target pairs lie in different connected components"%(
+            nCrossPairs,len(sources)*len(targets)),"and are left out")
+    if nConnected>0:
+        edgeGrad=edgeGrad/nConnected
+    edgeGrad[~offDiag]=0
+    if verbose:
+        print("edge weight gradient time:",time.time()-t1)
+    return edgeGrad
 
+def getEdgeWeightGradientMat(mat,sources,targets,quantity='current',verbose=False):
+    """
+    Matrix version of getEdgeWeightGradientEdges, analogous to getBtwMat.
+    Returns the derivative with respect to each non zero entry of mat as a
+    dense matrix for dense input and a scipy.sparse.csr_matrix for
+    scipy.sparse input.
+    """
+    Amat=matAdjSparse(mat)
+    Ei,Ej,edgeWeights=getEdgeArrays(Amat)
+    edgeGrad=getEdgeWeightGradientEdges(Ei,Ej,edgeWeights,sources,targets,
+                                        nNodes=Amat.shape[0],quantity=quantity,
+                                        verbose=verbose)
+    gradMat=sp.sparse.coo_matrix((edgeGrad,(Ei,Ej)),shape=Amat.shape).tocsr()
+    if sp.sparse.issparse(mat):
+        return gradMat
+    return np.array(gradMat.todense())
+
+def getBtwSpecList(btwSpecs):
+    """
+    Normalize a set of named source / target specifications, given either as a
+    dictionary {name:(sources,targets)} or as a list of (name,sources,targets)
+    tuples, to a list of (name,sources,targets) tuples with array valued
+    sources and targets.
+    """
+    if isinstance(btwSpecs,dict):
+        btwSpecs=[(specName,)+tuple(btwSpecs[specName]) for specName in btwSpecs]
+    specList=[(specName,np.asarray(sources),np.asarray(targets)) \
+              for specName,sources,targets in btwSpecs]
+    if len(specList)==0:
+        raise ValueError("at least one source / target specification is needed")
+    specNames=[spec[0] for spec in specList]
+    if len(set(specNames))<len(specNames):
+        raise ValueError("source / target specification names must be unique")
+    return specList
+
+def getBtwMatMulti(mat,btwSpecs,verbose=False,solverBackend='pinv',precision='float64',
+                   nSymmetryBlocks=6,symmetryTolerance=1e-6,cacheDir=None,maxCacheMB=None,
+                   nSpectralModes=50,spectrumData=None,maxSpectralResidual=None):
+    """
+    Flow betweenness for several named source / target specifications
+    (btwSpecs, see getBtwSpecList) on the same network, e.g. to compare
+    alternative allosteric pathways. The Laplacian is inverted ('pinv',
+    'circulant') or factorized ('sparse') once and potentials are computed once
+    for the union of all source and target nodes; each specification then only
+    costs the betweenness accumulation. The options are as for getBtwMat.
+    Returns an OrderedDict mapping each specification name to its betweenness
+    matrix (dense for 'pinv' / 'circulant', scipy.sparse.csr_matrix for 'sparse',
+    the type of mat for 'spectral'), identical to what getBtwMat returns for that
+    specification. For 'spectral' the eigenpairs are computed once (unless
+    spectrumData is given) and shared by all specifications; if
+    maxSpectralResidual is given and the largest column residual is above it a
+    warning is printed and the columns are recomputed exactly as for 'sparse'.
+    """
+    specList=getBtwSpecList(btwSpecs)
+    colNodes=np.unique(np.concatenate([
+        getUnionNodes(sources,targets) for specName,sources,targets in specList]))
+    nComponents,nodeLabels=sp.sparse.csgraph.connected_components(
+        matAdjSparse(mat),directed=False)
+    if solverBackend=='sparse':
+        Amat=matAdjSparse(mat)
+        factorData=getGroundedLaplacianFactorization(matLapSparse(Amat),verbose=verbose,
+                                                     precision=precision)
+        colMat=solveGroundedLaplacian(factorData,getUnitRhsMat(Amat.shape[0],colNodes))
+    elif solverBackend in ['pinv','circulant']:
+        if not (precision in ['float64','float32']):
+            raise ValueError("the %s backend supports precision 'float64' or 'float32' only"%solverBackend)
+        Linv=getLaplacianPinv(mat,solverBackend=solverBackend,precision=precision,
+                              nSymmetryBlocks=nSymmetryBlocks,symmetryTolerance=symmetryTolerance,
+                              cacheDir=cacheDir,maxCacheMB=maxCacheMB,verbose=verbose)
+        Amat=matAdj(copy.deepcopy(mat))
+        colMat=np.array(Linv[:,colNodes])
+    elif solverBackend=='spectral':
+        Amat=matAdjSparse(mat)
+        if spectrumData is None:
+            spectrumData=getLaplacianSpectrum(Amat,nModes=nSpectralModes,verbose=verbose)
+        nodeLabels=spectrumData['componentLabels']
+        colMat=getSpectralLinvColumns(spectrumData,colNodes,nSmoothingSteps=2)
+        maxResidual=np.max(getSpectralResiduals(spectrumData,colNodes,colMat))
+        if verbose:
+            print("spectral approximation max relative column residual %.3e"%maxResidual)
+        if (not (maxSpectralResidual is None)) and (maxResidual>maxSpectralResidual):
+            print("WARNING! spectral column residual %.3e above maxSpectralResidual %.3e,"%(
+                maxResidual,maxSpectralResidual),"recomputing the columns exactly")
+            factorData=getGroundedLaplacianFactorization(matLapSparse(Amat),verbose=verbose)
+            colMat=solveGroundedLaplacian(factorData,getUnitRhsMat(Amat.shape[0],colNodes))
+    else:
+        raise ValueError(("unknown solverBackend '%s', expected 'pinv', 'sparse', 'circulant'"+
+                          " or 'spectral'")%solverBackend)
+    if verbose:
+        print("computed %g potential columns for %g source / target specifications"%(
+            len(colNodes),len(specList)))
+    btwMats=collections.OrderedDict()
+    for specName,sources,targets in specList:
+        nCrossPairs=countCrossComponentPairs(nodeLabels,sources,targets)
+        if nCrossPairs>0:
+            print("WARNING! %s: %g of %g source / target pairs lie in different connected components"%(
+                specName,nCrossPairs,len(sources)*len(targets)),"and carry no current")
+        btwMat=e_btw_from_nodeColumns(colMat,colNodes,Amat,sources,targets,
+                                      nodeLabels=nodeLabels)
+        if (solverBackend=='sparse') or \
+           ((solverBackend=='spectral') and sp.sparse.issparse(mat)):
+            btwMats[specName]=btwMat.tocsr()
+        else:
+            btwMats[specName]=np.array(btwMat.todense())
+    return btwMats
 
+
+def getBtwFrameIncremental(Ei,Ej,weights,sources,targets,nNodes=None,
+                           prevState=None,changeTolerance=1e-3,maxUpdateRank=200,
+                           maxReconstructionError=1e-8,verbose=False):
+    """
+    Flow betweenness of one frame, reusing the grounded Laplacian
+    factorization of an earlier (base) frame whenever possible.
+    Ei,Ej,weights: edge list of the frame (same edge list for every frame)
+    prevState: the state returned by the call for the previous frame (None
+       for the first frame of a trajectory)
+    Edges whose weight differs from the base frame by more than
+    changeTolerance are applied as a low rank Woodbury correction to the base
+    frame potentials:
+       (L0+U*C*V^T)^-1 B = X0 - Z*(I+C*V^T*Z)^-1*C*V^T*X0,  Z=L0^-1 U
+    where each changed edge (i,j) contributes the rank one term
+    dw*e_i*(e_i-e_j)^T. Changes below changeTolerance are ignored. When more
+    than maxUpdateRank edges have changed relative to the base frame (or the
+    update is singular, e.g. the network split) the Laplacian is refactorized
+    and the current frame becomes the new base. The same happens when the
+    relative residual of the Woodbury potentials exceeds maxReconstructionError
+    (None disables the check), e.g. for an ill conditioned update.
+    For non symmetric networks the potentials are those of the unit
+    injections projected onto the range of the frame Laplacian (see
+    solveGroundedLaplacian). The left null vector of the frame needed for that
+    follows from the transposed update,
+       (L0^T+V*C*U^T)^-1 r = X0^T r - Z'*(I+C*U^T*Z')^-1*C*U^T*X0^T r,  Z'=L0^-T V
+    so a non symmetric update costs another rank+1 transposed solves and one
+    solve per connected component.
+    Returns (edgeBtw,state). edgeBtw is aligned with the input edges. state
+    should be passed to the next call and reports:
+       path: 'full' (refactorized), 'woodbury' (low rank update) or
+             'reuse' (no edge changed beyond changeTolerance)
+       updateRank: number of rank one corrections applied
+       reconstructionError: relative residual ||L*X-B||/||B|| of the
+             potentials against the exact Laplacian of this frame (for the
+             'full' path after a rejected update, that of the new potentials)
+    """
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    weights=np.asarray(weights,dtype=float)
+    if nNodes is None:
+        nNodes=int(np.max([np.max(Ei),np.max(Ej)]))+1
+    colNodes=getUnionNodes(sources,targets)
+    offDiag=Ei!=Ej
+    Lmat=matLapSparse(sp.sparse.coo_matrix(
+        (weights[offDiag],(Ei[offDiag],Ej[offDiag])),shape=(nNodes,nNodes)))
+    bMat=getUnitRhsMat(nNodes,colNodes)
+    
+    def getReconstructionError(colMat,factorData,nullVec):
+        rhsMat=projectRange(bMat,nullVec,factorData['componentLabels'])
+        resid=np.asarray(Lmat.dot(colMat)-rhsMat)[factorData['freeNodes']]
+        return np.linalg.norm(resid)/np.linalg.norm(rhsMat[factorData['freeNodes']])
+    
+    path='full'
+    updateRank=0
+    if (prevState is not None) and \
+       (prevState['nNodes']==nNodes) and \
+       np.array_equal(prevState['colNodes'],colNodes) and \
+       (len(prevState['baseWeights'])==len(weights)):
+        dWeights=np.where(offDiag,weights-prevState['baseWeights'],0)
+        changed=np.nonzero(np.abs(dWeights)>changeTolerance)[0]
+        updateRank=len(changed)
+        if updateRank==0:
+            path='reuse'
+            colMat=prevState['baseColMat']
+            nullVec=prevState['factorData']['leftNullVector']
+        elif updateRank<=maxUpdateRank:
+            factorData=prevState['factorData']
+            dw=dWeights[changed]
+            Ec=Ei[changed]
+            Fc=Ej[changed]
+            Zmat=solveGroundedLaplacian(factorData,getUnitRhsMat(nNodes,Ec),project=False)
+            try:
+                capMat=np.eye(updateRank)+dw[:,None]*(Zmat[Ec,:]-Zmat[Fc,:])
+                def woodburySolve(rawMat):
+                    #grounded inverse of this frame, given rawMat=X0*B
+                    corr=np.linalg.solve(capMat,dw[:,None]*(rawMat[Ec,:]-rawMat[Fc,:]))
+                    return rawMat-np.matmul(Zmat,corr)
+                colMat=woodburySolve(prevState['baseRawColMat'])
+                nullVec=None
+                if not isSymmetricLaplacian(Lmat):
+                    groundNodes=factorData['groundNodes']
+                    freeNodes=factorData['freeNodes']
+                    rhsMat=np.zeros((nNodes,updateRank+1))
+                    rhsMat[:,:-1]=getUnitRhsMat(nNodes,Ec)-getUnitRhsMat(nNodes,Fc)
+                    rhsMat[freeNodes,-1]=-np.asarray(Lmat[groundNodes,:][:,freeNodes].sum(axis=0)).ravel()
+                    ZtMat=solveGroundedLaplacian(factorData,rhsMat,transpose=True,project=False)
+                    nullVec=ZtMat[:,-1]-ZtMat[:,:-1].dot(np.linalg.solve(
+                        np.eye(updateRank)+dw[:,None]*ZtMat[Ec,:-1],dw*ZtMat[Ec,-1]))
+                    nullVec[groundNodes]=1.
+                    nullMat,nullNorms=getNullSpaceMat(nullVec,factorData['componentLabels'])
+                    colMat=colMat-woodburySolve(solveGroundedLaplacian(
+                        factorData,nullMat.toarray(),project=False)).dot(nullMat.T.dot(bMat)/nullNorms[:,None])
+                path='woodbury'
+            except np.linalg.LinAlgError:
+                if verbose:
+                    print("singular Woodbury update, refactorizing")
+            if path=='woodbury' and not (maxReconstructionError is None):
+                reconstructionError=getReconstructionError(colMat,factorData,nullVec)
+                if not (reconstructionError<=maxReconstructionError):
+                    if verbose:
+                        print("Woodbury reconstruction error %.3e above %.3e, refactorizing"%(
+                            reconstructionError,maxReconstructionError))
+                    path='full'
+    if path=='full':
+        factorData=getGroundedLaplacianFactorization(Lmat)
+        colMat=solveGroundedLaplacian(factorData,bMat)
+        nullVec=factorData['leftNullVector']
+        state=collections.OrderedDict({
+            'nNodes':nNodes,
+            'colNodes':colNodes,
+            'baseWeights':np.where(offDiag,weights,0),
+            'factorData':factorData,
+            'baseColMat':colMat,
+            'baseRawColMat':colMat if nullVec is None else \
+                solveGroundedLaplacian(factorData,bMat,project=False)})
+    else:
+        state=collections.OrderedDict(prevState)
+    state['path']=path
+    state['updateRank']=updateRank
+    state['reconstructionError']=getReconstructionError(colMat,state['factorData'],nullVec)
+    if verbose:
+        print("frame solved via %s path (rank %g), reconstruction error %.3e"%(
+            path,updateRank,state['reconstructionError']))
+    edgeBtw=weights*pairAbsPotDiffSum(
+        colMat,colNodes,Ei,Ej,sources,targets,
+        nodeLabels=state['factorData']['componentLabels'])/(len(sources)*len(targets))
+    edgeBtw[~offDiag]=0
+    return edgeBtw,state
+
+def getBtwFrames(Ei,Ej,weightMat,sources,targets,nNodes=None,
+                 solverBackend='dense',frameBlockSize=8,
+                 changeTolerance=1e-3,maxUpdateRank=200,maxReconstructionError=1e-8,
+                 returnSolverInfo=False,precision='float64',
+                 preconditioner='jacobi',iterTolerance=1e-8,preconditionerInterval=10,
+                 weightTransforms=None,kT=0.593,orderingCache=None,
+                 nCheckEdges=0,randomSeed=None,verbose=False):
+    """
+    Batched flow betweenness for many frames sharing the same node indexing
+    and edge list (e.g. every frame of one replica).
+    Ei,Ej: node indices of each edge (length m)
+    weightMat: (frames x m) array of edge weights, one row per frame
+       (a single 1D weight vector is treated as one frame)
+    Returns a (frames x m) array with the betweenness of each edge, aligned
+    row-for-row with the input edges. Self edges always get zero.
+    
+    Only the s+t unit injection potentials are computed (see
+    e_btw_from_nodeColumns). solverBackend selects how:
+       'dense': (default) the grounded Laplacians of frameBlockSize frames are
+               stacked and solved with a single batched LAPACK call
+               (np.linalg.solve), so BLAS threads are used across the whole
+               block without per-frame python overhead. Memory use is about
+               frameBlockSize*n^2*8 bytes.
+       'sparse': one sparse LU factorization per frame on the shared edge
+               pattern. Preferable for very large networks.
+       'incremental': frames are processed in order and each reuses the
+               factorization of an earlier frame through low rank Woodbury
+               updates (see getBtwFrameIncremental, changeTolerance,
+               maxUpdateRank and maxReconstructionError are passed through).
+       'iterative': preconditioned conjugate gradients (see
+               getGroundedLaplacianSystem / solveGroundedLaplacianIterative)
+               to relative tolerance iterTolerance. Frames are processed in
+               order and each starts from the previous frame's potentials,
+               so adjacent MD frames converge in a few iterations and the
+               cost per frame stays close to O(m). The preconditioner
+               ('jacobi', 'ilu', 'amg' or 'none') is rebuilt every
+               preconditionerInterval frames and reused in between. Frames
+               that fail to converge are solved with a sparse factorization.
+    If returnSolverInfo is set, (btwFrames,solverInfo) is returned where
+    solverInfo is a pandas.DataFrame with the Frame, Path, UpdateRank,
+    ReconstructionError, Iterations and PrecisionMaxRelDeviation of each frame
+    (UpdateRank and ReconstructionError are only meaningful for 'incremental',
+    Iterations for 'iterative'; other backends report Path=solverBackend).
+    For the 'sparse' backend the fill reducing ordering of the edge pattern is
+    computed once (getLaplacianOrdering) and stored in the dict orderingCache,
+    keyed by a hash of the pattern, so the frames skip the ordering step
+    (each frame is still factorized, including SuperLU's symbolic analysis,
+    see getGroundedLaplacianFactorization). Pass the same dict to later calls
+    (e.g. other replicas with the same contacts) to reuse it across calls.
+    
+    If weightTransforms is given, weightMat holds raw interaction energies and
+    betweenness is computed for each of several conductance transforms, with
+    one getBtwFrames call per transform that all share orderingCache (so the
+    ordering is computed once for all transforms). weightTransforms is a dictionary
+    {name:transform} or a list of (name,transform) tuples, where transform is a
+    function of the energy array or one of the names accepted by
+    getConductanceTransform ('abs', 'boltzmann' with kT, 'reciprocal').
+    An OrderedDict {name:btwFrames} is returned in that case (with
+    returnSolverInfo, {name:(btwFrames,solverInfo)}).
+    
+    Grounding for the dense, sparse and iterative backends uses the connected
+    components of the union of all frames. If a frame splits further (e.g.
+    zero weights) the dense backend falls back to per-frame sparse solves for
+    that block, the sparse and iterative backends for that frame.
+    precision ('float64', 'float32' or 'mixed', see
+    getGroundedLaplacianFactorization) applies to the 'sparse' and 'dense'
+    backends. The 'dense' backend solves stacked systems directly, so it
+    supports 'float64' and 'float32' only. If nCheckEdges > 0, every frame is
+    checked against a double precision factorization on that many randomly
+    chosen edges (see getPrecisionCheck, one extra factorization per frame)
+    and the max relative deviation is reported as PrecisionMaxRelDeviation in
+    solverInfo (np.nan otherwise).
+    """
+    if orderingCache is None:
+        orderingCache={}
+    if not (weightTransforms is None):
+        if isinstance(weightTransforms,dict):
+            weightTransforms=list(weightTransforms.items())
+        transformResults=collections.OrderedDict()
+        for transformName,transform in weightTransforms:
+            if verbose:
+                print("conductance transform '%s'"%transformName)
+            transformResults[transformName]=getBtwFrames(
+                Ei,Ej,getConductanceTransform(transform,kT=kT)(np.asarray(weightMat,dtype=float)),
+                sources,targets,nNodes=nNodes,
+                solverBackend=solverBackend,frameBlockSize=frameBlockSize,
+                changeTolerance=changeTolerance,maxUpdateRank=maxUpdateRank,
+                maxReconstructionError=maxReconstructionError,
+                returnSolverInfo=returnSolverInfo,precision=precision,
+                preconditioner=preconditioner,iterTolerance=iterTolerance,
+                preconditionerInterval=preconditionerInterval,
+                orderingCache=orderingCache,nCheckEdges=nCheckEdges,
+                randomSeed=randomSeed,verbose=verbose)
+        return transformResults
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    weightMat=np.atleast_2d(np.asarray(weightMat,dtype=float))
+    nFrames=weightMat.shape[0]
+    if weightMat.shape[1]!=len(Ei):
+        raise ValueError("weightMat must have one column per edge")
+    if nNodes is None:
+        nNodes=int(np.max([np.max(Ei),np.max(Ej)]))+1
+    colNodes=getUnionNodes(sources,targets)
+    nPairs=len(sources)*len(targets)
+    offDiag=Ei!=Ej
+    btwFrames=np.zeros(weightMat.shape)
+    solverInfo=pd.DataFrame({
+        'Frame':np.arange(nFrames),
+        'Path':solverBackend,
+        'UpdateRank':0,
+        'ReconstructionError':np.nan,
+        'Iterations':0,
+        'PrecisionMaxRelDeviation':np.nan})
+    if verbose:
+        t1=time.time()
+        print("computing betweenness for %g frames of %g edges"%(nFrames,len(Ei)))
+    
+    def btwFrameSparse(iFrame):
+        Amat=sp.sparse.coo_matrix(
+            (weightMat[iFrame,offDiag],(Ei[offDiag],Ej[offDiag])),
+            shape=(nNodes,nNodes)).tocsr()
+        factorData=getGroundedLaplacianFactorization(matLapSparse(Amat),
+                                                     precision=precision)
+        colMat=solveGroundedLaplacian(factorData,getUnitRhsMat(nNodes,colNodes))
+        return weightMat[iFrame]*pairAbsPotDiffSum(
+            colMat,colNodes,Ei,Ej,sources,targets,
+            nodeLabels=factorData['componentLabels'])/nPairs
+    
+    if solverBackend=='incremental':
+        state=None
+        for iFrame in np.arange(nFrames):
+            btwFrames[iFrame],state=getBtwFrameIncremental(
+                Ei,Ej,weightMat[iFrame],sources,targets,nNodes=nNodes,
+                prevState=state,changeTolerance=changeTolerance,
+                maxUpdateRank=maxUpdateRank,maxReconstructionError=maxReconstructionError,
+                verbose=verbose)
+            solverInfo.loc[iFrame,['Path','UpdateRank','ReconstructionError']]=[
+                state['path'],state['updateRank'],state['reconstructionError']]
+    elif solverBackend=='sparse':
+        unionLap=matLapSparse(sp.sparse.coo_matrix(
+            (np.abs(weightMat[:,offDiag]).sum(axis=0),(Ei[offDiag],Ej[offDiag])),
+            shape=(nNodes,nNodes)))
+        groundNodes,freeNodes=getLaplacianGrounding(unionLap)[2:]
+        patternKey=getBtwCacheKey(Ei[offDiag],Ej[offDiag],np.array([nNodes]))
+        if not (patternKey in orderingCache):
+            if verbose:
+                print("computing fill reducing ordering for the edge pattern")
+            #order all nodes using a non-singular matrix with the same pattern,
+            #so the ordering is independent of weights and grounding
+            patternMat=sp.sparse.coo_matrix(
+                (np.ones(np.sum(offDiag)),(Ei[offDiag],Ej[offDiag])),shape=(nNodes,nNodes))
+            orderingCache[patternKey]=getLaplacianOrdering(
+                matLapSparse(patternMat)+sp.sparse.identity(nNodes))
+        #drop the grounded nodes from the elimination order
+        freeInds=-np.ones(nNodes,dtype=int)
+        freeInds[freeNodes]=np.arange(len(freeNodes))
+        ordering=freeInds[orderingCache[patternKey]]
+        ordering=ordering[ordering>=0]
+        bMat=getUnitRhsMat(nNodes,colNodes)
+        for iFrame in np.arange(nFrames):
+            frameLap=matLapSparse(sp.sparse.coo_matrix(
+                (weightMat[iFrame,offDiag],(Ei[offDiag],Ej[offDiag])),
+                shape=(nNodes,nNodes)))
+            try:
+                factorData=getGroundedLaplacianFactorization(
+                    frameLap,precision=precision,groundNodes=groundNodes,ordering=ordering)
+            except (ValueError,RuntimeError):
+                #the frame splits further than the union network (or is singular
+                #without pivoting), factorize it from scratch
+                if verbose:
+                    print("refactorizing frame %g from scratch"%iFrame)
+                btwFrames[iFrame]=btwFrameSparse(iFrame)
+                continue
+            colMat=solveGroundedLaplacian(factorData,bMat)
+            btwFrames[iFrame]=weightMat[iFrame]*pairAbsPotDiffSum(
+                colMat,colNodes,Ei,Ej,sources,targets,
+                nodeLabels=factorData['componentLabels'])/nPairs
+    elif solverBackend=='iterative':
+        unionLap=matLapSparse(sp.sparse.coo_matrix(
+            (np.abs(weightMat[:,offDiag]).sum(axis=0),(Ei[offDiag],Ej[offDiag])),
+            shape=(nNodes,nNodes)))
+        groundNodes=getLaplacianGrounding(unionLap)[2]
+        bMat=getUnitRhsMat(nNodes,colNodes)
+        colMat=None
+        preconditionerOp=None
+        for iFrame in np.arange(nFrames):
+            frameLap=matLapSparse(sp.sparse.coo_matrix(
+                (weightMat[iFrame,offDiag],(Ei[offDiag],Ej[offDiag])),
+                shape=(nNodes,nNodes)))
+            rebuild=(preconditionerOp is None) or (iFrame%preconditionerInterval==0)
+            try:
+                systemData=getGroundedLaplacianSystem(
+                    frameLap,preconditioner=preconditioner if rebuild else 'none',
+                    groundNodes=groundNodes)
+            except ValueError:
+                #the frame splits into more components than the union network
+                systemData=None
+            converged=False
+            if not (systemData is None):
+                if rebuild:
+                    preconditionerOp=systemData['preconditionerOp']
+                else:
+                    systemData['preconditionerOp']=preconditionerOp
+                frameColMat,nIterations,converged=solveGroundedLaplacianIterative(
+                    systemData,bMat,x0=colMat,rtol=iterTolerance)
+                solverInfo.loc[iFrame,'Iterations']=nIterations
+            if converged:
+                colMat=frameColMat
+                btwFrames[iFrame]=weightMat[iFrame]*pairAbsPotDiffSum(
+                    colMat,colNodes,Ei,Ej,sources,targets,
+                    nodeLabels=systemData['componentLabels'])/nPairs
+            else:
+                if verbose:
+                    print("iterative solve failed for frame %g, using a sparse factorization"%iFrame)
+                solverInfo.loc[iFrame,'Path']='sparse'
+                btwFrames[iFrame]=btwFrameSparse(iFrame)
+                preconditionerOp=None
+    elif solverBackend=='dense':
+        if not (precision in ['float64','float32']):
+            raise ValueError("the dense backend supports precision 'float64' or 'float32' only")
+        unionLap=matLapSparse(sp.sparse.coo_matrix(
+            (np.abs(weightMat[:,offDiag]).sum(axis=0),(Ei[offDiag],Ej[offDiag])),
+            shape=(nNodes,nNodes)))
+        nComponents,nodeLabels,groundNodes,freeNodes=getLaplacianGrounding(unionLap)
+        freeInds=-np.ones(nNodes,dtype=int)
+        freeInds[freeNodes]=np.arange(len(freeNodes))
+        nFree=len(freeNodes)
+        bMat=getUnitRhsMat(nNodes,colNodes)
+        for iStart in np.arange(0,nFrames,frameBlockSize):
+            frameInds=np.arange(iStart,min(iStart+frameBlockSize,nFrames))
+            LBlock=np.zeros((len(frameInds),nFree,nFree),
+                            dtype=np.float32 if precision=='float32' else float)
+            #right hand sides of the left null vectors (see getLeftNullVector),
+            #None for symmetric frames
+            nullRhs=[None]*len(frameInds)
+            for bInd,iFrame in enumerate(frameInds):
+                Lmat=matLapSparse(sp.sparse.coo_matrix(
+                    (weightMat[iFrame,offDiag],(Ei[offDiag],Ej[offDiag])),
+                    shape=(nNodes,nNodes)))
+                if not isSymmetricLaplacian(Lmat):
+                    nullRhs[bInd]=-np.asarray(Lmat[groundNodes,:][:,freeNodes].sum(axis=0)).ravel()
+                Lmat=Lmat.tocoo()
+                keep=(freeInds[Lmat.row]>=0)&(freeInds[Lmat.col]>=0)
+                np.add.at(LBlock[bInd],
+                          (freeInds[Lmat.row[keep]],freeInds[Lmat.col[keep]]),
+                          Lmat.data[keep])
+            colMat=np.zeros((len(frameInds),nNodes,len(colNodes)))
+            try:
+                bBlock=np.zeros((len(frameInds),nFree,len(colNodes)),dtype=LBlock.dtype)
+                bBlock[:]=bMat[freeNodes]
+                if any([not (rhsVec is None) for rhsVec in nullRhs]):
+                    #project the unit injections onto the range of each non
+                    #symmetric Laplacian, as in solveGroundedLaplacian
+                    nullBlock=np.linalg.solve(
+                        np.transpose(LBlock,(0,2,1)),
+                        np.array([np.zeros(nFree) if rhsVec is None else rhsVec
+                                  for rhsVec in nullRhs],dtype=LBlock.dtype)[:,:,None])[:,:,0]
+                    for bInd,rhsVec in enumerate(nullRhs):
+                        if rhsVec is None:
+                            continue
+                        nullVec=np.ones(nNodes)
+                        nullVec[freeNodes]=nullBlock[bInd]
+                        bBlock[bInd]=projectRange(bMat,nullVec,nodeLabels)[freeNodes]
+                colMat[:,freeNodes,:]=np.linalg.solve(LBlock,bBlock)
+                btwFrames[frameInds]=weightMat[frameInds]*pairAbsPotDiffSum(
+                    colMat,colNodes,Ei,Ej,sources,targets,
+                    nodeLabels=nodeLabels)/nPairs
+            except np.linalg.LinAlgError:
+                if verbose:
+                    print("singular grounded Laplacian in frame block starting at %g,"%iStart,
+                          "falling back to per frame sparse solves")
+                for iFrame in frameInds:
+                    btwFrames[iFrame]=btwFrameSparse(iFrame)
+            LBlock=[]
+            if verbose:
+                print("finished frame %g of %g"%(frameInds[-1]+1,nFrames))
+    else:
+        raise ValueError(("unknown solverBackend '%s', expected 'dense', 'sparse', 'incremental'"+
+                          " or 'iterative'")%solverBackend)
+    btwFrames[:,~offDiag]=0
+    if nCheckEdges>0:
+        #one random stream, so frames check different edges
+        rng=np.random.default_rng(randomSeed)
+        for iFrame in np.arange(nFrames):
+            solverInfo.loc[iFrame,'PrecisionMaxRelDeviation']=getPrecisionCheck(
+                Ei,Ej,weightMat[iFrame],btwFrames[iFrame],sources,targets,nNodes=nNodes,
+                precision=precision,nCheckEdges=nCheckEdges,randomSeed=rng,
+                verbose=verbose)['maxRelDeviation']
+    if verbose:
+        t2=time.time()
+        print('total betweenness calculation time:',t2-t1)
+    if returnSolverInfo:
+        return btwFrames,solverInfo
+    return btwFrames
+
+def getConductanceTransform(transform,kT=0.593):
+    """
+    Return a function mapping interaction energies to edge conductances
+    (betweenness weights). transform may be a function (returned unchanged)
+    or one of:
+       'abs': |E| (as used by betweenness)
+       'boltzmann': exp(-|E|/kT), kT in the energy units (default 0.593
+           kcal/mol, i.e. 298 K)
+       'reciprocal': 1/|E| (zero energies give zero conductance; near zero
+           energies give huge conductances and ill conditioned Laplacians)
+    """
+    if callable(transform):
+        return transform
+    if transform=='abs':
+        return np.abs
+    elif transform=='boltzmann':
+        return lambda energies: np.exp(-np.abs(energies)/kT)
+    elif transform=='reciprocal':
+        def reciprocal(energies):
+            absEnergies=np.abs(energies)
+            conductances=np.zeros(absEnergies.shape)
+            nonZero=absEnergies>0
+            conductances[nonZero]=1./absEnergies[nonZero]
+            return conductances
+        return reciprocal
+    else:
+        raise ValueError("unknown conductance transform '%s', expected 'abs', 'boltzmann' or 'reciprocal'"%transform)
+
+def initBtwStats(nValues,quantiles=[0.05,0.25,0.5,0.75,0.95]):
+    """
+    Set up an online (streaming) aggregator for nValues per frame quantities,
+    e.g. the betweenness of every edge or node, see updateBtwStats.
+    Mean and variance are accumulated with Welford's algorithm. Each requested
+    quantile is tracked with the P^2 sketch of Jain and Chlamtac (five markers
+    per value and quantile, adjusted by piecewise parabolic interpolation), so
+    memory does not grow with the number of frames.
+    Returns the aggregator state as a dictionary with entries:
+       count: number of frames seen
+       mean, M2, min, max: running moments / extrema of each value
+       quantiles: the tracked quantiles
+       markerHeights, markerPositions: (quantiles x nValues x 5) P^2 markers
+       desiredPositions, desiredIncrements: (quantiles x 5) P^2 marker targets
+    """
+    quantiles=np.asarray(quantiles,dtype=float)
+    nQuantiles=len(quantiles)
+    return(collections.OrderedDict({
+        'count':0,
+        'mean':np.zeros(nValues),
+        'M2':np.zeros(nValues),
+        'min':np.full(nValues,np.inf),
+        'max':np.full(nValues,-np.inf),
+        'quantiles':quantiles,
+        'markerHeights':np.zeros((nQuantiles,nValues,5)),
+        'markerPositions':np.tile(np.arange(1.,6.),(nQuantiles,nValues,1)),
+        'desiredPositions':np.stack([
+            np.ones(nQuantiles),1+2*quantiles,1+4*quantiles,3+2*quantiles,5*np.ones(nQuantiles)],axis=1),
+        'desiredIncrements':np.stack([
+            np.zeros(nQuantiles),quantiles/2.,quantiles,(1+quantiles)/2.,np.ones(nQuantiles)],axis=1)}))
+
+def updateBtwStats(statsData,valueMat):
+    """
+    Feed one frame (1D array of nValues) or several frames (frames x nValues
+    array, processed in row order) into an aggregator from initBtwStats.
+    The state is updated in place and also returned.
+    """
+    valueMat=np.atleast_2d(np.asarray(valueMat,dtype=float))
+    valueInds=np.arange(valueMat.shape[1])
+    for values in valueMat:
+        statsData['count']+=1
+        count=statsData['count']
+        delta=values-statsData['mean']
+        statsData['mean']+=delta/count
+        statsData['M2']+=delta*(values-statsData['mean'])
+        statsData['min']=np.minimum(statsData['min'],values)
+        statsData['max']=np.maximum(statsData['max'],values)
+        if count<=5:
+            #the first five observations initialize the P^2 markers
+            statsData['markerHeights'][:,:,count-1]=values
+            if count==5:
+                statsData['markerHeights'].sort(axis=2)
+            continue
+        for iQuant in np.arange(len(statsData['quantiles'])):
+            heights=statsData['markerHeights'][iQuant]
+            positions=statsData['markerPositions'][iQuant]
+            heights[:,0]=np.minimum(heights[:,0],values)
+            heights[:,4]=np.maximum(heights[:,4],values)
+            cellInds=np.sum(values[:,None]>=heights[:,1:4],axis=1)
+            positions+=np.arange(5)[None,:]>cellInds[:,None]
+            statsData['desiredPositions'][iQuant]+=statsData['desiredIncrements'][iQuant]
+            desired=statsData['desiredPositions'][iQuant]
+            with np.errstate(divide='ignore',invalid='ignore'):
+                for iMark in [1,2,3]:
+                    dPos=desired[iMark]-positions[:,iMark]
+                    move=((dPos>=1)&(positions[:,iMark+1]-positions[:,iMark]>1))| \
+                         ((dPos<=-1)&(positions[:,iMark-1]-positions[:,iMark]<-1))
+                    if not np.any(move):
+                        continue
+                    dSign=np.sign(dPos)
+                    parHeights=heights[:,iMark]+dSign/(positions[:,iMark+1]-positions[:,iMark-1])*(
+                        (positions[:,iMark]-positions[:,iMark-1]+dSign)*
+                        (heights[:,iMark+1]-heights[:,iMark])/(positions[:,iMark+1]-positions[:,iMark])+
+                        (positions[:,iMark+1]-positions[:,iMark]-dSign)*
+                        (heights[:,iMark]-heights[:,iMark-1])/(positions[:,iMark]-positions[:,iMark-1]))
+                    nbrInds=iMark+dSign.astype(int)
+                    linHeights=heights[:,iMark]+dSign*(
+                        heights[valueInds,nbrInds]-heights[:,iMark])/(
+                        positions[valueInds,nbrInds]-positions[:,iMark])
+                    isParabolic=(heights[:,iMark-1]<parHeights)&(parHeights<heights[:,iMark+1])
+                    newHeights=np.where(isParabolic,parHeights,linHeights)
+                    heights[move,iMark]=newHeights[move]
+                    positions[move,iMark]+=dSign[move]
+    return statsData
+
+def getBtwStatsQuantiles(statsData):
+    """
+    Current quantile estimates of an aggregator from initBtwStats as a
+    (quantiles x nValues) array (exact while fewer than six frames were seen).
+    Beyond that the P^2 markers are approximations, mostly for the tail
+    quantiles of short trajectories: relative errors of about 2.5% against
+    numpy.quantile have been seen for Q95. Store the frames and use
+    numpy.quantile where exact quantiles are needed.
+    """
+    count=statsData['count']
+    if count==0:
+        return np.full(statsData['markerHeights'].shape[:2],np.nan)
+    if count<=5:
+        return np.stack([
+            np.quantile(statsData['markerHeights'][iQuant,:,:count],quantile,axis=1) \
+            for iQuant,quantile in enumerate(statsData['quantiles'])])
+    return np.array(statsData['markerHeights'][:,:,2])
+
+def getBtwStatsTable(statsData):
+    """
+    Summary table of an aggregator from initBtwStats: one row per value with
+    the columns Count, Mean, Variance (sample variance), Std, Min, Max and one
+    column per quantile named by its percentage (e.g. Q50 for the median).
+    """
+    count=statsData['count']
+    variance=statsData['M2']/(count-1) if count>1 else np.full(len(statsData['mean']),np.nan)
+    statsTable=pd.DataFrame({
+        'Count':count,
+        'Mean':statsData['mean'],
+        'Variance':variance,
+        'Std':np.sqrt(variance),
+        'Min':statsData['min'],
+        'Max':statsData['max']})
+    quantileMat=getBtwStatsQuantiles(statsData)
+    for iQuant,quantile in enumerate(statsData['quantiles']):
+        statsTable['Q%g'%(100*quantile)]=quantileMat[iQuant]
+    return statsTable
+
+def getPrecisionCheck(Ei,Ej,weights,edgeBtw,sources,targets,nNodes=None,precision='float64',
+                      nCheckEdges=100,randomSeed=None,factorData=None,verbose=False):
+    """
+    Check a betweenness result against double precision on a random sample of
+    edges. edgeBtw is the result (aligned with the edges Ei,Ej,weights) of a
+    getBtwEdges, getBtwMat or getBtwFrames run at the given precision. The
+    betweenness of nCheckEdges randomly chosen edges is recomputed from double
+    precision potentials: solves against factorData refined to double
+    precision if it is given (the factorization the result came from), a new
+    double precision sparse factorization otherwise.
+    Returns an OrderedDict with entries:
+       precision: the precision of the checked result
+       nCheckEdges: number of edges checked (0 if nCheckEdges is 0, the
+           other entries are then np.nan)
+       maxAbsDeviation: largest absolute deviation on the checked edges
+       maxRelDeviation: maxAbsDeviation relative to the largest double
+           precision betweenness among the checked edges
+       referenceResidual: relative residual of the double precision reference
+           potentials (confirms the check itself is converged)
+    """
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    weights=np.asarray(weights,dtype=float)
+    if nNodes is None:
+        nNodes=int(np.max([np.max(Ei),np.max(Ej)]))+1
+    precisionInfo=collections.OrderedDict({
+        'precision':precision,'nCheckEdges':0,
+        'maxAbsDeviation':np.nan,'maxRelDeviation':np.nan,
+        'referenceResidual':np.nan})
+    offDiag=Ei!=Ej
+    if (nCheckEdges<=0) or (not np.any(offDiag)):
+        return precisionInfo
+    if factorData is None:
+        factorData=getGroundedLaplacianFactorization(matLapSparse(sp.sparse.coo_matrix(
+            (weights[offDiag],(Ei[offDiag],Ej[offDiag])),shape=(nNodes,nNodes))))
+    nodeLabels=factorData['componentLabels']
+    nPairs=len(sources)*len(targets)
+    rng=np.random.default_rng(randomSeed)
+    candidates=np.nonzero(offDiag)[0]
+    checkEdges=rng.choice(candidates,size=min(nCheckEdges,len(candidates)),
+                          replace=False)
+    colNodes=getUnionNodes(sources,targets)
+    bMat=getUnitRhsMat(nNodes,colNodes)
+    refColMat=solveGroundedLaplacian(factorData,bMat,
+                                     refinementSteps=0 if factorData['precision']=='float64' else 10)
+    freeNodes=factorData['freeNodes']
+    bMat=projectRange(bMat,factorData['leftNullVector'],nodeLabels)
+    refResid=factorData['Lred'].dot(refColMat[freeNodes])-bMat[freeNodes]
+    refBtw=weights[checkEdges]*pairAbsPotDiffSum(
+        refColMat,colNodes,Ei[checkEdges],Ej[checkEdges],sources,targets,
+        nodeLabels=nodeLabels)/nPairs
+    absDev=np.abs(np.asarray(edgeBtw)[checkEdges]-refBtw)
+    precisionInfo['nCheckEdges']=len(checkEdges)
+    precisionInfo['maxAbsDeviation']=np.max(absDev)
+    precisionInfo['maxRelDeviation']=np.max(absDev)/max(np.max(np.abs(refBtw)),
+                                                       np.finfo(float).tiny)
+    precisionInfo['referenceResidual']=np.linalg.norm(refResid)/np.linalg.norm(bMat[freeNodes])
+    if verbose:
+        print("%s precision check on %g edges: max relative deviation %.3e"%(
+            precision,len(checkEdges),precisionInfo['maxRelDeviation']))
+    return precisionInfo
+
+def getBtwSolveData(Ei,Ej,weights,sources,targets,nNodes=None,verbose=False):
+    """
+    Factorize the grounded Laplacian of the network given by Ei, Ej and
+    weights (as in getBtwEdges) and solve for the s+t unit injection
+    potentials of the unique source and target nodes, so that the outputs
+    derived from them (betweenness, pair resistances, pair flows, edge weight
+    gradients, deletion scans) share one factorization and one column block.
+    Returns an OrderedDict with entries:
+       Lmat: the sparse Laplacian (csc format)
+       factorData: the grounded factorization (see
+           getGroundedLaplacianFactorization), None if not made yet (see
+           getSolveDataFactorization)
+       colNodes: getUnionNodes(sources,targets)
+       colMat: n x len(colNodes) unit injection potentials
+       nodeLabels: connected component label of each node
+    """
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    weights=np.asarray(weights,dtype=float)
+    if nNodes is None:
+        nNodes=int(np.max([np.max(Ei),np.max(Ej)]))+1
+    offDiag=Ei!=Ej
+    Lmat=matLapSparse(sp.sparse.coo_matrix(
+        (weights[offDiag],(Ei[offDiag],Ej[offDiag])),shape=(nNodes,nNodes)))
+    factorData=getGroundedLaplacianFactorization(Lmat,verbose=verbose)
+    colNodes=getUnionNodes(sources,targets)
+    return(collections.OrderedDict([
+        ('Lmat',Lmat),
+        ('factorData',factorData),
+        ('colNodes',colNodes),
+        ('colMat',solveGroundedLaplacian(factorData,getUnitRhsMat(nNodes,colNodes))),
+        ('nodeLabels',factorData['componentLabels'])
+    ]))
+
+def getSolveDataFactorization(solveData,verbose=False):
+    """
+    The grounded factorization of solveData (see getBtwSolveData), made and
+    stored on first use if the columns came without one (e.g. all of them from
+    the on disk cache).
+    """
+    if solveData['factorData'] is None:
+        solveData['factorData']=getGroundedLaplacianFactorization(solveData['Lmat'],verbose=verbose)
+    return solveData['factorData']
+
+def getBtwEdges(Ei,Ej,weights,sources,targets,nNodes=None,verbose=False,
+                precision='float64',nCheckEdges=0,randomSeed=None,
+                returnPrecisionInfo=False,cacheDir=None,maxCacheMB=None,
+                returnSolveData=False):
+    """
+    Edge list version of getBtwMat that never builds a dense n x n matrix.
+    Ei,Ej,weights: node indices and weight of each network edge (length m).
+    Returns an array of length m with the flow betweenness of each edge,
+    aligned row-for-row with the input edges (self edges get zero).
+    The network is assembled directly in sparse format, one node per connected
+    component is grounded and only the s+t unit injection potentials are
+    solved for, so memory stays O(m) apart from the sparse factorization.
+    Like getBtwMat, duplicate edges are not supported.
+    
+    precision ('float64', 'float32' or 'mixed') selects the precision of the
+    factorization (see getGroundedLaplacianFactorization). If nCheckEdges > 0,
+    the betweenness of that many randomly chosen edges is recomputed from
+    potentials refined to double precision and compared to the result.
+    If returnPrecisionInfo is set, (edgeBtw,precisionInfo) is returned where
+    precisionInfo is the dictionary of getPrecisionCheck.
+    
+    If cacheDir is given, the unit injection potential columns are cached on
+    disk, keyed by a hash of the edge list, weights and precision (see
+    getCachedNodeColumns). Reruns on the same network with new sources or
+    targets only solve for the nodes not yet cached (no factorization at all if
+    every column is cached and nCheckEdges=0). maxCacheMB bounds the cache size
+    (least recently used entries are evicted first).
+    
+    If returnSolveData is set, the factorization and unit injection columns
+    are returned as well, as the last entry of the result (see
+    getBtwSolveData; factorData is None if every column came from the cache),
+    so further outputs for the same sources and targets need no new
+    factorization. Only 'float64' solve data should be reused that way.
+    """
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    weights=np.asarray(weights,dtype=float)
+    if nNodes is None:
+        nNodes=int(np.max([np.max(Ei),np.max(Ej)]))+1
+    if verbose:
+        t1=time.time()
+    offDiag=Ei!=Ej
+    nPairs=len(sources)*len(targets)
+    Amat=sp.sparse.coo_matrix(
+        (weights[offDiag],(Ei[offDiag],Ej[offDiag])),shape=(nNodes,nNodes)).tocsr()
+    Lmat=matLapSparse(Amat)
+    colNodes=getUnionNodes(sources,targets)
+    factorData=None
+    if (cacheDir is None) or (nCheckEdges>0):
+        factorData=getGroundedLaplacianFactorization(Lmat,verbose=verbose,precision=precision)
+    if cacheDir is None:
+        nodeLabels=factorData['componentLabels']
+        colMat=solveGroundedLaplacian(factorData,getUnitRhsMat(nNodes,colNodes))
+    else:
+        def solveColumns(missingNodes):
+            colFactorData=factorData
+            if colFactorData is None:
+                colFactorData=getGroundedLaplacianFactorization(
+                    Lmat,verbose=verbose,precision=precision)
+            return(solveGroundedLaplacian(colFactorData,getUnitRhsMat(nNodes,missingNodes)),
+                   colFactorData['componentLabels'])
+        cacheKey=getBtwCacheKey(Ei,Ej,weights,np.array([nNodes]),np.array([precision]))
+        colMat,nodeLabels=getCachedNodeColumns(cacheDir,cacheKey,colNodes,solveColumns,
+                                               maxCacheMB=maxCacheMB,verbose=verbose)
+    nCrossPairs=countCrossComponentPairs(nodeLabels,sources,targets)
+    if nCrossPairs>0:
+        print("WARNING! %g of %g source / target pairs lie in different connected components"%(
+            nCrossPairs,nPairs),"and carry no current")
+    edgeBtw=weights*pairAbsPotDiffSum(colMat,colNodes,Ei,Ej,sources,targets,
+                                      nodeLabels=nodeLabels)/nPairs
+    edgeBtw[~offDiag]=0
+    precisionInfo=getPrecisionCheck(Ei,Ej,weights,edgeBtw,sources,targets,nNodes=nNodes,
+                                    precision=precision,nCheckEdges=nCheckEdges,
+                                    randomSeed=randomSeed,factorData=factorData,verbose=verbose)
+    if verbose:
+        t2=time.time()
+        print('total betweenness calculation time:',t2-t1)
+    btwData=[edgeBtw]
+    if returnPrecisionInfo:
+        btwData.append(precisionInfo)
+    if returnSolveData:
+        btwData.append(collections.OrderedDict([
+            ('Lmat',Lmat),
+            ('factorData',factorData),
+            ('colNodes',colNodes),
+            ('colMat',colMat),
+            ('nodeLabels',nodeLabels)
+        ]))
+    if len(btwData)==1:
+        return edgeBtw
+    return tuple(btwData)
+
+def getBtwEdgesMulti(Ei,Ej,weights,btwSpecs,nNodes=None,verbose=False,
+                     precision='float64',cacheDir=None,maxCacheMB=None):
+    """
+    Edge list version of getBtwMatMulti: flow betweenness for several named
+    source / target specifications (btwSpecs, see getBtwSpecList) from a single
+    sparse factorization and one solve for the union of all source and target
+    nodes. precision, cacheDir and maxCacheMB are as for getBtwEdges.
+    Returns an OrderedDict mapping each specification name to an array of
+    length m aligned with the input edges.
+    """
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    weights=np.asarray(weights,dtype=float)
+    if nNodes is None:
+        nNodes=int(np.max([np.max(Ei),np.max(Ej)]))+1
+    if verbose:
+        t1=time.time()
+    specList=getBtwSpecList(btwSpecs)
+    colNodes=np.unique(np.concatenate([
+        getUnionNodes(sources,targets) for specName,sources,targets in specList]))
+    offDiag=Ei!=Ej
+    Amat=sp.sparse.coo_matrix(
+        (weights[offDiag],(Ei[offDiag],Ej[offDiag])),shape=(nNodes,nNodes)).tocsr()
+    def solveColumns(colNodes):
+        factorData=getGroundedLaplacianFactorization(matLapSparse(Amat),
+                                                     verbose=verbose,precision=precision)
+        return(solveGroundedLaplacian(factorData,getUnitRhsMat(nNodes,colNodes)),
+               factorData['componentLabels'])
+    if cacheDir is None:
+        colMat,nodeLabels=solveColumns(colNodes)
+    else:
+        cacheKey=getBtwCacheKey(Ei,Ej,weights,np.array([nNodes]),np.array([precision]))
+        colMat,nodeLabels=getCachedNodeColumns(cacheDir,cacheKey,colNodes,solveColumns,
+                                               maxCacheMB=maxCacheMB,verbose=verbose)
+    edgeBtws=collections.OrderedDict()
+    for specName,sources,targets in specList:
+        nPairs=len(sources)*len(targets)
+        nCrossPairs=countCrossComponentPairs(nodeLabels,sources,targets)
+        if nCrossPairs>0:
+            print("WARNING! %s: %g of %g source / target pairs lie in different connected components"%(
+                specName,nCrossPairs,nPairs),"and carry no current")
+        edgeBtw=weights*pairAbsPotDiffSum(colMat,colNodes,Ei,Ej,sources,targets,
+                                          nodeLabels=nodeLabels)/nPairs
+        edgeBtw[~offDiag]=0
+        edgeBtws[specName]=edgeBtw
+    if verbose:
+        t2=time.time()
+        print('total betweenness calculation time for %g specifications:'%len(specList),t2-t1)
+    return edgeBtws
+
+def getNodeBtwFromEdges(Ei,edgeBtw,nNodes=None):
+    """
+    Node betweenness from an edge betweenness array by scatter-adding each edge
+    onto its first node (Ei). Matches the row sum / 2 convention used for
+    betweenness matrices, i.e. np.sum(btwMat,axis=1)/2.
+    """
+    Ei=np.asarray(Ei)
+    if nNodes is None:
+        nNodes=int(np.max(Ei))+1
+    return np.bincount(Ei,weights=edgeBtw,minlength=nNodes)/2.
+
+def getAllPairsBtwEdges(Ei,Ej,weights,nNodes=None,edgeBlockSize=1024,verbose=False):
+    """
+    All pairs current flow betweenness (Newman / Brandes and Fleischer) for an
+    edge list network. Every unordered node pair (s,t) is used as a
+    source / target pair, so no source or target nodes need to be given.
+    Following Brandes and Fleischer, the columns of the grounded Laplacian
+    inverse C are computed once (one sparse factorization and n-1 solves,
+    i.e. O(I(n-1))). For an edge e=(v,w) with weight c the current carried for
+    the pair (s,t) is r[s]-r[t] with r=c*(C[v,:]-C[w,:]), so the sum over all
+    pairs is obtained by sorting r:
+       sum_{s<t} |r[s]-r[t]| = sum_i (2*i-n+1)*sort(r)[i]
+    giving O(m*n*log(n)) overall instead of evaluating all n^2 pair potentials.
+    Pairs in different connected components carry no current.
+    Edges are processed edgeBlockSize at a time to bound memory.
+    Returns an array of length m (aligned with the input edges, self edges get
+    zero) holding the average current over all n*(n-1)/2 pairs, i.e. the same
+    per pair normalization used by getBtwMat.
+    """
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    weights=np.asarray(weights,dtype=float)
+    if nNodes is None:
+        nNodes=int(np.max([np.max(Ei),np.max(Ej)]))+1
+    offDiag=Ei!=Ej
+    if verbose:
+        t1=time.time()
+        print("computing all pairs betweenness for %g nodes and %g edges"%(nNodes,len(Ei)))
+    Amat=sp.sparse.coo_matrix(
+        (weights[offDiag],(Ei[offDiag],Ej[offDiag])),shape=(nNodes,nNodes)).tocsr()
+    factorData=getGroundedLaplacianFactorization(matLapSparse(Amat),verbose=verbose)
+    Cmat=solveGroundedLaplacian(factorData,np.eye(nNodes))
+    edgeBtw=np.zeros(len(Ei))
+    labels=factorData['componentLabels']
+    for iComp in np.arange(factorData['nComponents']):
+        compNodes=np.nonzero(labels==iComp)[0]
+        compEdges=np.nonzero(offDiag&(labels[Ei]==iComp))[0]
+        nComp=len(compNodes)
+        pairCoefs=2*np.arange(nComp)-nComp+1
+        for iStart in np.arange(0,len(compEdges),edgeBlockSize):
+            blockEdges=compEdges[iStart:(iStart+edgeBlockSize)]
+            rMat=weights[blockEdges,None]*(
+                Cmat[Ei[blockEdges]][:,compNodes]-Cmat[Ej[blockEdges]][:,compNodes])
+            rMat.sort(axis=1)
+            edgeBtw[blockEdges]=np.matmul(rMat,pairCoefs)
+    edgeBtw=edgeBtw/(nNodes*(nNodes-1)/2.)
+    if verbose:
+        t2=time.time()
+        print('total betweenness calculation time:',t2-t1)
+    return edgeBtw
+
+def getAllPairsBtwMat(mat,verbose=False,edgeBlockSize=1024):
+    """
+    Matrix version of getAllPairsBtwEdges, analogous to getBtwMat but averaging
+    over all node pairs instead of given sources and targets.
+    Returns a dense matrix for dense input and a scipy.sparse.csr_matrix for
+    scipy.sparse input.
+    """
+    Amat=matAdjSparse(mat)
+    Ei,Ej,edgeWeights=getEdgeArrays(Amat)
+    edgeBtw=getAllPairsBtwEdges(Ei,Ej,edgeWeights,nNodes=Amat.shape[0],
+                                edgeBlockSize=edgeBlockSize,verbose=verbose)
+    btwMat=sp.sparse.coo_matrix((edgeBtw,(Ei,Ej)),shape=Amat.shape).tocsr()
+    if sp.sparse.issparse(mat):
+        return btwMat
+    return np.array(btwMat.todense())
+
+def getGroupFlowBtwEdges(Ei,Ej,weights,sources,targets,nNodes=None,verbose=False):
+    """
+    Group to group ("super-source / super-sink") current flow for an edge list
+    network. All source nodes are contracted into a single super-source and all
+    target nodes into a single super-sink (equivalent to joining each group by
+    infinite conductance links), and one unit of current is driven from the
+    super-source to the super-sink. This needs a single sparse solve instead of
+    one per (source,target) pair. Edges inside the source or target group carry
+    no current. Sources and targets may not overlap.
+    Returns an array of length m (aligned with the input edges, self edges get
+    zero) holding the current through each edge.
+    """
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    weights=np.asarray(weights,dtype=float)
+    sources=np.unique(sources)
+    targets=np.unique(targets)
+    if nNodes is None:
+        nNodes=int(np.max([np.max(Ei),np.max(Ej)]))+1
+    if len(np.intersect1d(sources,targets))>0:
+        raise ValueError("source and target groups may not share nodes in group flow mode")
+    if verbose:
+        t1=time.time()
+        print("computing group flow betweenness for %g sources and %g targets"%(
+            len(sources),len(targets)))
+    #contract each group onto its first node
+    nodeMap=np.arange(nNodes)
+    nodeMap[sources]=sources[0]
+    nodeMap[targets]=targets[0]
+    offDiag=nodeMap[Ei]!=nodeMap[Ej]
+    Amat=sp.sparse.coo_matrix(
+        (weights[offDiag],(nodeMap[Ei[offDiag]],nodeMap[Ej[offDiag]])),
+        shape=(nNodes,nNodes)).tocsr()
+    factorData=getGroundedLaplacianFactorization(matLapSparse(Amat),verbose=verbose)
+    edgeBtw=np.zeros(len(Ei))
+    labels=factorData['componentLabels']
+    if labels[sources[0]]!=labels[targets[0]]:
+        print("WARNING! source and target groups lie in different connected components",
+              "and carry no current")
+        return edgeBtw
+    potVec=solveGroundedLaplacian(
+        factorData,getPairRhsMat(nNodes,[sources[0]],[targets[0]]))[:,0]
+    potVec=potVec[nodeMap]
+    edgeBtw[offDiag]=weights[offDiag]*np.abs(potVec[Ei[offDiag]]-potVec[Ej[offDiag]])
+    if verbose:
+        t2=time.time()
+        print('total betweenness calculation time:',t2-t1)
+    return edgeBtw
+
+def getGroupFlowBtwMat(mat,sources,targets,verbose=False):
+    """
+    Matrix version of getGroupFlowBtwEdges, analogous to getBtwMat.
+    Returns a dense matrix for dense input and a scipy.sparse.csr_matrix for
+    scipy.sparse input.
+    """
+    Amat=matAdjSparse(mat)
+    Ei,Ej,edgeWeights=getEdgeArrays(Amat)
+    edgeBtw=getGroupFlowBtwEdges(Ei,Ej,edgeWeights,sources,targets,
+                                 nNodes=Amat.shape[0],verbose=verbose)
+    btwMat=sp.sparse.coo_matrix((edgeBtw,(Ei,Ej)),shape=Amat.shape).tocsr()
+    if sp.sparse.issparse(mat):
+        return btwMat
+    return np.array(btwMat.todense())
+
+def getDeletionSensitivity(Ei,Ej,weights,sources,targets,nNodes=None,
+                           scanEdges=True,scanNodes=True,edgeBlockSize=1024,
+                           conditionLimit=1e10,verbose=False,solveData=None):
+    """
+    Scan how the source to target current changes when each contact (both
+    directions of an edge) or each node (all of its edges) is deleted, e.g. to
+    locate allosteric hot spots.
+    The grounded Laplacian is factorized once (or taken from solveData, see
+    getBtwSolveData, or returnSolveData of getBtwEdges, of a betweenness run on
+    the same network) and its inverse C is formed (n solves). A deletion
+    changes the Laplacian only on the node set N of the deleted contact
+    (N={i,j}) or node (N={k}+neighbors), L'=L+E_N D E_N^T, so
+    the new pair resistances follow from the Woodbury identity
+       C'=C-C E_N (I+D E_N^T C E_N)^-1 D E_N^T C
+    i.e. a rank 2 (Sherman-Morrison like) update per contact and a rank
+    degree+1 update per node (the deleted node is kept, isolated, with a unit
+    conductance to itself). Contacts are processed edgeBlockSize at a time.
+    Deletions whose update matrix has a condition number above conditionLimit
+    (typically those that cut the network, or remove the grounded node) are
+    recomputed with a fresh sparse factorization instead.
+    For non symmetric networks the resistances are those of the pseudo
+    inverse, R=a^T C P a with a=e_s-e_t and P the projection onto the range of
+    L (see solveGroundedLaplacian), so each deletion also updates the left null
+    vector v of L by the transposed Woodbury identity,
+       R'=a^T C' a-(a^T C' v')*(v'_s-v'_t)/|v'|^2
+    at the cost of O(n) extra work per deletion.
+    
+    For every deletion the pair effective resistances R' are compared to the
+    original ones R. Returns an OrderedDict with entries:
+       baseResistance: mean effective resistance over the connected pairs
+       edgeTable: pandas.DataFrame, one row per contact with columns
+          Node_1,Node_2: node indices (Node_1<Node_2)
+          MeanResistance: mean R' over the pairs (np.inf if any pair is cut)
+          CurrentChange: mean over pairs of R/R'-1, the relative change of the
+              source to target current at fixed potential difference
+              (-1 means the contact carries all of the current)
+          Method: 'woodbury' or 'direct'
+       nodeTable: same for node deletions with column Node instead of
+          Node_1,Node_2. Pairs with the deleted node as source or target are
+          left out.
+    """
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    weights=np.asarray(weights,dtype=float)
+    sources=np.asarray(sources)
+    targets=np.asarray(targets)
+    if nNodes is None:
+        nNodes=int(np.max([np.max(Ei),np.max(Ej)]))+1
+    if verbose:
+        t1=time.time()
+    offDiag=Ei!=Ej
+    Amat=sp.sparse.coo_matrix(
+        (weights[offDiag],(Ei[offDiag],Ej[offDiag])),shape=(nNodes,nNodes)).tocsr()
+    if solveData is None:
+        Lmat=matLapSparse(Amat)
+        factorData=getGroundedLaplacianFactorization(Lmat,verbose=verbose)
+    else:
+        Lmat=solveData['Lmat']
+        factorData=getSolveDataFactorization(solveData,verbose=verbose)
+    #plain grounded inverse, the projection of non symmetric networks is applied per deletion
+    Cmat=solveGroundedLaplacian(factorData,np.eye(nNodes),project=False)
+    nodeLabels=factorData['componentLabels']
+    isGround=np.zeros(nNodes,dtype=bool)
+    isGround[factorData['groundNodes']]=True
+    pairSources=np.repeat(sources,len(targets))
+    pairTargets=np.tile(targets,len(sources))
+    baseRes=getPairResistances(Cmat,sources,targets,nodeLabels=nodeLabels)
+    nullVec=factorData['leftNullVector']
+    if not (nullVec is None):
+        #free part of the left null vector, y=C^T r with r=-L_gf^T
+        baseNullFree=np.where(isGround,0.,nullVec)
+        componentMat=getComponentIndicatorMat(nodeLabels)
+        pairCmat=(Cmat[pairSources]-Cmat[pairTargets]).T
+        
+        def nullVectorCorrection(yMat,aXyMat):
+            #(a^T C v)*(v_s-v_t)/|v|^2 for v=e_ground+y, one component per pair
+            dNull=isGround[pairSources].astype(float)-isGround[pairTargets]+\
+                yMat[...,pairSources]-yMat[...,pairTargets]
+            nullNorms=1+np.matmul(yMat**2,componentMat)
+            return aXyMat*dNull/nullNorms[...,nodeLabels[pairSources]]
+        
+        baseRes=baseRes-nullVectorCorrection(baseNullFree,baseNullFree.dot(pairCmat))
+    validPairs=np.isfinite(baseRes)&(pairSources!=pairTargets)
+    if not np.any(validPairs):
+        raise ValueError("no source / target pair is connected")
+    colNodes=getUnionNodes(sources,targets)
+    
+    def summarize(newRes,pairMask):
+        newRes=newRes[pairMask]
+        meanRes=np.inf if np.any(np.isinf(newRes)) else np.mean(newRes)
+        return meanRes,np.mean(baseRes[pairMask]/newRes-1)
+    
+    def directPairResistances(keepEdges):
+        #fresh factorization of the network without the deleted edges
+        keepMat=sp.sparse.coo_matrix(
+            (weights[keepEdges],(Ei[keepEdges],Ej[keepEdges])),shape=(nNodes,nNodes)).tocsr()
+        keepFactorData=getGroundedLaplacianFactorization(matLapSparse(keepMat))
+        keepColMat=solveGroundedLaplacian(keepFactorData,getUnitRhsMat(nNodes,colNodes))[colNodes]
+        return getPairResistances(keepColMat,np.searchsorted(colNodes,sources),
+                                  np.searchsorted(colNodes,targets),
+                                  nodeLabels=keepFactorData['componentLabels'][colNodes])
+    
+    def woodburyPairResistances(updNodes,Dmat):
+        #updNodes: (...,r) node sets, Dmat: (...,r,r) Laplacian changes on them
+        groundRows=isGround[updNodes].astype(float)
+        fullDmat=Dmat
+        Dmat=Dmat*(~isGround[updNodes])[...,:,None]*(~isGround[updNodes])[...,None,:]
+        Kmat=Cmat[updNodes[...,:,None],updNodes[...,None,:]]
+        capMat=np.eye(updNodes.shape[-1])+np.matmul(Dmat,Kmat)
+        Wmat=Cmat[updNodes][...,pairSources]-Cmat[updNodes][...,pairTargets]
+        Umat=Cmat.T[updNodes][...,pairSources]-Cmat.T[updNodes][...,pairTargets]
+        isStable=np.linalg.cond(capMat)<conditionLimit
+        capMat[~isStable]=np.eye(updNodes.shape[-1])
+        Zmat=np.linalg.solve(capMat,np.matmul(Dmat,Wmat))
+        newRes=getPairResistances(Cmat,sources,targets,nodeLabels=nodeLabels)-np.sum(Umat*Zmat,axis=-2)
+        if nullVec is None:
+            return newRes,isStable
+        #left null vector of the new Laplacian, the rows of grounded nodes enter through r
+        rowMat=Cmat[updNodes]
+        deltaRhs=-np.einsum('...kl,...k->...l',fullDmat,groundRows)*(1-groundRows)
+        qMat=baseNullFree+np.einsum('...l,...ln->...n',deltaRhs,rowMat)
+        qNodes=np.take_along_axis(qMat,updNodes,axis=-1) if qMat.ndim>1 else qMat[updNodes]
+        capSol=np.linalg.solve(np.swapaxes(capMat,-1,-2),qNodes[...,None])[...,0]
+        yMat=qMat-np.einsum('...l,...ln->...n',np.einsum('...kl,...k->...l',Dmat,capSol),rowMat)
+        aXyMat=np.matmul(yMat,pairCmat)-np.sum(Umat*np.linalg.solve(
+            capMat,np.matmul(Dmat,np.einsum('...kn,...n->...k',rowMat,yMat)[...,None])),axis=-2)
+        return newRes-nullVectorCorrection(yMat,aXyMat),isStable
+    
+    sensData=collections.OrderedDict()
+    sensData['baseResistance']=np.mean(baseRes[validPairs])
+    if scanEdges:
+        contacts=np.unique(np.sort(np.stack([Ei[offDiag],Ej[offDiag]],axis=1),axis=1),axis=0)
+        if verbose:
+            print("scanning %g contact deletions"%len(contacts))
+        meanRes=np.zeros(len(contacts))
+        curChange=np.zeros(len(contacts))
+        methods=np.array(['woodbury']*len(contacts),dtype=object)
+        for iStart in np.arange(0,len(contacts),edgeBlockSize):
+            blockContacts=contacts[iStart:(iStart+edgeBlockSize)]
+            Aij=np.asarray(Amat[blockContacts[:,0],blockContacts[:,1]]).ravel()
+            Aji=np.asarray(Amat[blockContacts[:,1],blockContacts[:,0]]).ravel()
+            Dmat=np.zeros((len(blockContacts),2,2))
+            Dmat[:,0,0]=-Aij
+            Dmat[:,0,1]=Aij
+            Dmat[:,1,0]=Aji
+            Dmat[:,1,1]=-Aji
+            newRes,isStable=woodburyPairResistances(blockContacts,Dmat)
+            for bInd,iContact in enumerate(np.arange(iStart,iStart+len(blockContacts))):
+                if isStable[bInd]:
+                    contactRes=newRes[bInd]
+                else:
+                    methods[iContact]='direct'
+                    cutEdges=((Ei==contacts[iContact,0])&(Ej==contacts[iContact,1]))| \
+                             ((Ei==contacts[iContact,1])&(Ej==contacts[iContact,0]))
+                    contactRes=directPairResistances(offDiag&(~cutEdges))
+                meanRes[iContact],curChange[iContact]=summarize(contactRes,validPairs)
+        sensData['edgeTable']=pd.DataFrame({
+            'Node_1':contacts[:,0],'Node_2':contacts[:,1],
+            'MeanResistance':meanRes,'CurrentChange':curChange,'Method':methods})
+    if scanNodes:
+        if verbose:
+            print("scanning %g node deletions"%nNodes)
+        Asym=(Amat+Amat.T).tocsr()
+        meanRes=np.zeros(nNodes)
+        curChange=np.zeros(nNodes)
+        methods=np.array(['woodbury']*nNodes,dtype=object)
+        for iNode in np.arange(nNodes):
+            nbrNodes=Asym.indices[Asym.indptr[iNode]:Asym.indptr[iNode+1]]
+            nbrNodes=nbrNodes[nbrNodes!=iNode]
+            updNodes=np.concatenate([[iNode],nbrNodes])
+            Dmat=np.zeros((len(updNodes),len(updNodes)))
+            Dmat[0,:]=-Lmat[iNode,updNodes].toarray().ravel()
+            Dmat[0,0]+=1
+            Ajk=Amat[nbrNodes,iNode].toarray().ravel()
+            Dmat[1:,0]=Ajk
+            Dmat[np.arange(1,len(updNodes)),np.arange(1,len(updNodes))]=-Ajk
+            newRes,isStable=woodburyPairResistances(updNodes,Dmat)
+            if not isStable:
+                methods[iNode]='direct'
+                newRes=directPairResistances(offDiag&(Ei!=iNode)&(Ej!=iNode))
+            pairMask=validPairs&(pairSources!=iNode)&(pairTargets!=iNode)
+            if np.any(pairMask):
+                meanRes[iNode],curChange[iNode]=summarize(newRes,pairMask)
+            else:
+                meanRes[iNode],curChange[iNode]=np.nan,np.nan
+        sensData['nodeTable']=pd.DataFrame({
+            'Node':np.arange(nNodes),
+            'MeanResistance':meanRes,'CurrentChange':curChange,'Method':methods})
+    if verbose:
+        t2=time.time()
+        print('total deletion scan time:',t2-t1)
+    return sensData
+
+def getApproxBtwEdges(Ei,Ej,weights,sources=None,targets=None,nNodes=None,
+                      epsilon=0.01,delta=0.1,sampleBlockSize=64,maxSamples=None,
+                      randomSeed=None,verbose=False):
+    """
+    Approximate flow betweenness by sampling (source,target) pairs uniformly
+    at random (with replacement) from sources x targets, or from all node
+    pairs if sources and targets are None.
+    The edge betweenness is the mean over pairs of the current carried by the
+    edge, which for a unit current lies in [0,1]. Pairs are drawn
+    sampleBlockSize at a time until, with probability at least 1-delta and for
+    every edge simultaneously, the estimate is within epsilon of the exact
+    value. Since sampling stops at the first check that passes, the failure
+    probability is split over the checks: the bounds are only evaluated on the
+    geometric schedule k=sampleBlockSize*2^(j-1) (j=1,2,...) with
+    delta_j=delta/2^(j+1), and once more at maxSamples with delta_j=delta/2.
+    At each check the per edge bound is the smaller of two bounds, each given
+    half of delta_j (the minimum is only valid if both hold):
+       Hoeffding: sqrt(ln(4m/delta_j)/(2k)) after k samples (two sided,
+          union over the m edges at delta_j/2)
+       empirical Bernstein (Maurer and Pontil):
+          sqrt(2*V*ln(8m/delta_j)/k)+7*ln(8m/delta_j)/(3*(k-1)) with V the
+          observed per edge sample variance (the one sided bound at
+          delta_j/(4m), made two sided and united over the m edges at
+          delta_j/2), which usually allows stopping far earlier
+    The checks together fail with probability at most delta. The final check
+    alone reaches epsilon with the Hoeffding bound after
+    ceil(ln(8m/delta)/(2*epsilon^2)) samples (the default maxSamples).
+    If the number of distinct pairs is not larger than the required number of
+    samples, the exact betweenness is computed instead.
+    Returns (edgeBtw,errorInfo). edgeBtw is aligned with the input edges and
+    errorInfo is a dictionary with entries:
+       exact: True if the exact betweenness was computed
+       nSamples: number of sampled pairs
+       epsilon, delta: the requested accuracy target
+       errorBound: achieved bound on the maximum absolute error
+       edgeErrorBounds: per edge error bound (length m), all holding
+           simultaneously with probability at least 1-delta
+       converged: True if errorBound <= epsilon
+    """
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    weights=np.asarray(weights,dtype=float)
+    if nNodes is None:
+        nNodes=int(np.max([np.max(Ei),np.max(Ej)]))+1
+    allPairs=(sources is None) and (targets is None)
+    if allPairs:
+        nPairs=nNodes*(nNodes-1)//2
+    else:
+        sources=np.asarray(sources)
+        targets=np.asarray(targets)
+        nPairs=len(sources)*len(targets)
+    offDiag=Ei!=Ej
+    nEdges=int(np.sum(offDiag))
+    #delta/2 for the final check at maxSamples, the rest for the geometric
+    #checks; Hoeffding log term ln(4m/delta_j) of the final check
+    logTerm=np.log(8.*max(nEdges,1)/delta)
+    hoeffdingSamples=int(np.ceil(logTerm/(2.*epsilon**2)))
+    if maxSamples is None:
+        maxSamples=hoeffdingSamples
+    errorInfo=collections.OrderedDict({
+        'exact':False,'nSamples':0,'epsilon':epsilon,'delta':delta,
+        'errorBound':np.inf,'edgeErrorBounds':None,'converged':False})
+    if nPairs<=min(maxSamples,hoeffdingSamples):
+        if verbose:
+            print("%g pairs do not exceed the %g samples needed, computing exact betweenness"%(
+                nPairs,min(maxSamples,hoeffdingSamples)))
+        if allPairs:
+            edgeBtw=getAllPairsBtwEdges(Ei,Ej,weights,nNodes=nNodes,verbose=verbose)
+        else:
+            edgeBtw=getBtwEdges(Ei,Ej,weights,sources,targets,nNodes=nNodes,verbose=verbose)
+        errorInfo['exact']=True
+        errorInfo['errorBound']=0.
+        errorInfo['edgeErrorBounds']=np.zeros(len(Ei))
+        errorInfo['converged']=True
+        return edgeBtw,errorInfo
+    
+    if verbose:
+        t1=time.time()
+    rng=np.random.default_rng(randomSeed)
+    Amat=sp.sparse.coo_matrix(
+        (weights[offDiag],(Ei[offDiag],Ej[offDiag])),shape=(nNodes,nNodes)).tocsr()
+    factorData=getGroundedLaplacianFactorization(matLapSparse(Amat))
+    labels=factorData['componentLabels']
+    sumX=np.zeros(len(Ei))
+    sumX2=np.zeros(len(Ei))
+    nSamples=0
+    iCheck=0
+    nextCheck=sampleBlockSize
+    edgeBounds=np.full(len(Ei),np.inf)
+    while nSamples<maxSamples:
+        blockSize=int(min(sampleBlockSize,nextCheck-nSamples,maxSamples-nSamples))
+        if allPairs:
+            srcSample=rng.integers(0,nNodes,size=blockSize)
+            trgSample=(srcSample+rng.integers(1,nNodes,size=blockSize))%nNodes
+        else:
+            srcSample=sources[rng.integers(0,len(sources),size=blockSize)]
+            trgSample=targets[rng.integers(0,len(targets),size=blockSize)]
+        colNodes,colInds=np.unique(np.concatenate([srcSample,trgSample]),
+                                   return_inverse=True)
+        colMat=solveGroundedLaplacian(factorData,getUnitRhsMat(nNodes,colNodes))
+        dPotMat=colMat[Ej,:]-colMat[Ei,:]
+        xMat=np.abs(dPotMat[:,colInds[:blockSize]]-dPotMat[:,colInds[blockSize:]])*\
+            weights[:,None]
+        xMat[:,labels[srcSample]!=labels[trgSample]]=0
+        xMat[~offDiag,:]=0
+        sumX+=np.sum(xMat,axis=1)
+        sumX2+=np.sum(xMat**2,axis=1)
+        nSamples+=blockSize
+        if nSamples<min(nextCheck,maxSamples):
+            continue
+        if nSamples>=maxSamples:
+            checkLogTerm=logTerm
+        else:
+            iCheck+=1
+            checkLogTerm=np.log(4.*max(nEdges,1)*2.**(iCheck+1)/delta)
+            nextCheck*=2
+        if nSamples>1:
+            #delta_j is split evenly between the two bounds, the Bernstein
+            #log term is ln(8m/delta_j)=ln(4m/delta_j)+ln(2)
+            bernsteinLogTerm=checkLogTerm+np.log(2.)
+            varX=np.maximum(sumX2-sumX**2/nSamples,0)/(nSamples-1)
+            edgeBounds=np.minimum(
+                np.sqrt(2.*varX*bernsteinLogTerm/nSamples)+7.*bernsteinLogTerm/(3.*(nSamples-1)),
+                np.sqrt(checkLogTerm/(2.*nSamples)))
+            edgeBounds[~offDiag]=0
+            if verbose:
+                print("%g samples, current error bound %.3e"%(nSamples,np.max(edgeBounds)))
+            if np.max(edgeBounds)<=epsilon:
+                break
+    edgeBtw=sumX/nSamples
+    errorInfo['nSamples']=nSamples
+    errorInfo['edgeErrorBounds']=edgeBounds
+    errorInfo['errorBound']=np.max(edgeBounds)
+    errorInfo['converged']=bool(errorInfo['errorBound']<=epsilon)
+    if verbose:
+        t2=time.time()
+        print('approximate betweenness from %g sampled pairs, error bound %.3e (target %.3e), time %g'%(
+            nSamples,errorInfo['errorBound'],epsilon,t2-t1))
+    return edgeBtw,errorInfo
+
+def getSparsifiedEdges(Ei,Ej,weights,sources,targets,nNodes=None,method='weight',
+                       maxBtwError=0.01,scoreCutoff=None,nodeBlockSize=256,verbose=False):
+    """
+    Error controlled pruning of weak edges, e.g. the many weak long range
+    electrostatic contacts of GB networks, before the betweenness calculation.
+    Edges are ranked by a score and the lowest scoring ones are dropped:
+       'weight': (default) the edge weight, i.e. an energy cutoff
+       'resistance': the leverage weight*R(i,j) of the edge (R the effective
+               resistance, see getEdgeResistances), the quantity used by
+               effective resistance spectral sparsification. Low leverage
+               edges have a parallel path of much lower resistance and carry
+               little current even when strong.
+    If scoreCutoff is given, all edges scoring below it are dropped and only
+    the pruned network is solved (no full network solve, so btwError is nan).
+    Otherwise the largest number of edges is dropped such that the edge
+    betweenness for sources and targets changes by at most maxBtwError times
+    the largest edge betweenness of the full network. This search solves the
+    full network once and the pruned network about log2(m) times (bisection
+    over the number of dropped edges, never splitting edges of equal score), so it costs several betweenness runs
+    and is meant as a calibration step: run it on one frame and pass the
+    returned scoreCutoff to the other frames of a trajectory. The bisection
+    assumes the error grows with the number of dropped edges; the returned
+    pruning always has a realized error within maxBtwError, but if the error
+    is not monotonic it may not be the largest such pruning. Prunings that
+    disconnect a source from a target are rejected (or, with scoreCutoff,
+    reported with a warning). Self edges are always kept.
+    Returns an OrderedDict with entries:
+       keepEdges: boolean mask over the input edges
+       scoreCutoff: score of the weakest kept edge, dropping all edges scoring
+           below it reproduces the pruning
+       nDropped: number of dropped edges
+       btwError: realized max abs change of the edge betweenness, relative to
+           the largest full network edge betweenness (nan with scoreCutoff)
+       edgeBtw: edge betweenness of the pruned network (zero for dropped edges)
+    """
+    Ei=np.asarray(Ei)
+    Ej=np.asarray(Ej)
+    weights=np.asarray(weights,dtype=float)
+    sources=np.asarray(sources)
+    targets=np.asarray(targets)
+    if nNodes is None:
+        nNodes=int(np.max([np.max(Ei),np.max(Ej)]))+1
+    if verbose:
+        t1=time.time()
+    offDiag=Ei!=Ej
+    if method=='weight':
+        scores=weights.copy()
+    elif method=='resistance':
+        Amat=sp.sparse.coo_matrix(
+            (weights[offDiag],(Ei[offDiag],Ej[offDiag])),shape=(nNodes,nNodes)).tocsr()
+        factorData=getGroundedLaplacianFactorization(matLapSparse(Amat),verbose=verbose)
+        scores=weights*getEdgeResistances(factorData,Ei,Ej,nodeBlockSize=nodeBlockSize)
+    else:
+        raise ValueError("unknown sparsification method '%s', expected 'weight' or 'resistance'"%method)
+    candEdges=np.nonzero(offDiag)[0]
+    candEdges=candEdges[np.argsort(scores[candEdges],kind='stable')]
+    fullLabels=sp.sparse.csgraph.connected_components(
+        sp.sparse.coo_matrix((weights[offDiag],(Ei[offDiag],Ej[offDiag])),
+                             shape=(nNodes,nNodes)),directed=False)[1]
+    pairSources=np.repeat(sources,len(targets))
+    pairTargets=np.tile(targets,len(sources))
+    connectedPairs=fullLabels[pairSources]==fullLabels[pairTargets]
+    def getPrunedEdges(nDrop):
+        keepEdges=np.ones(len(Ei),dtype=bool)
+        keepEdges[candEdges[:nDrop]]=False
+        keepOffDiag=keepEdges&offDiag
+        prunedLabels=sp.sparse.csgraph.connected_components(
+            sp.sparse.coo_matrix((weights[keepOffDiag],(Ei[keepOffDiag],Ej[keepOffDiag])),
+                                 shape=(nNodes,nNodes)),directed=False)[1]
+        isConnected=not np.any(prunedLabels[pairSources[connectedPairs]]!=prunedLabels[pairTargets[connectedPairs]])
+        return keepEdges,isConnected
+    def getPrunedBtw(keepEdges):
+        prunedBtw=np.zeros(len(Ei))
+        prunedBtw[keepEdges]=getBtwEdges(Ei[keepEdges],Ej[keepEdges],weights[keepEdges],
+                                         sources,targets,nNodes=nNodes)
+        return prunedBtw
+    if not (scoreCutoff is None):
+        nDrop=int(np.sum(scores[candEdges]<scoreCutoff))
+        keepEdges,isConnected=getPrunedEdges(nDrop)
+        if not isConnected:
+            print("WARNING! pruning at scoreCutoff disconnects sources from targets")
+        prunedBtw=getPrunedBtw(keepEdges)
+        btwError=np.nan
+    else:
+        fullBtw=getBtwEdges(Ei,Ej,weights,sources,targets,nNodes=nNodes)
+        btwScale=np.max(fullBtw) if np.max(fullBtw)>0 else 1.
+        #only cut between distinct scores, so that dropping everything below
+        #the returned scoreCutoff reproduces the pruning
+        sortedScores=scores[candEdges]
+        cutPositions=np.concatenate([[0],np.nonzero(np.diff(sortedScores)>0)[0]+1,[len(candEdges)]])
+        cutPositions=np.unique(cutPositions)
+        #the accepted pruning with the most dropped edges so far, starting
+        #from the full network
+        iLow=0
+        keepEdges=np.ones(len(Ei),dtype=bool)
+        prunedBtw=fullBtw
+        btwError=0.
+        iHigh=len(cutPositions)
+        while iHigh-iLow>1:
+            iMid=(iLow+iHigh)//2
+            midKeepEdges,isConnected=getPrunedEdges(cutPositions[iMid])
+            if isConnected:
+                midBtw=getPrunedBtw(midKeepEdges)
+                midError=np.max(np.abs(midBtw-fullBtw))/btwScale
+            if isConnected and (midError<=maxBtwError):
+                iLow=iMid
+                keepEdges,prunedBtw,btwError=midKeepEdges,midBtw,midError
+            else:
+                iHigh=iMid
+        nDrop=int(cutPositions[iLow])
+    if verbose:
+        print("dropped %g of %g edges, realized relative betweenness error %g"%(
+            nDrop,len(candEdges),btwError))
+        print("sparsification time:",time.time()-t1)
+    return(collections.OrderedDict([
+        ('keepEdges',keepEdges),
+        ('scoreCutoff',scores[candEdges[nDrop]] if nDrop<len(candEdges) else np.inf),
+        ('nDropped',nDrop),
+        ('btwError',btwError),
+        ('edgeBtw',prunedBtw)
+    ]))
+
+def getSparsifiedMat(mat,sources,targets,method='weight',maxBtwError=0.01,
+                     scoreCutoff=None,verbose=False):
+    """
+    Matrix version of getSparsifiedEdges, meant as a preprocessing step before
+    getBtwMat. Returns the pruned network (scipy.sparse.csr_matrix for
+    scipy.sparse input, dense otherwise) and the sparsification data of
+    getSparsifiedEdges (with keepEdges / edgeBtw aligned to the nonzero entries
+    of mat, see getEdgeArrays).
+    """
+    Ei,Ej,edgeWeights=getEdgeArrays(matAdjSparse(mat))
+    sparsifyData=getSparsifiedEdges(Ei,Ej,edgeWeights,sources,targets,nNodes=mat.shape[0],
+                                    method=method,maxBtwError=maxBtwError,
+                                    scoreCutoff=scoreCutoff,verbose=verbose)
+    keepEdges=sparsifyData['keepEdges']
+    prunedMat=sp.sparse.coo_matrix(
+        (edgeWeights[keepEdges],(Ei[keepEdges],Ej[keepEdges])),shape=mat.shape).tocsr()
+    if sp.sparse.issparse(mat):
+        return prunedMat,sparsifyData
+    return np.array(prunedMat.todense()),sparsifyData
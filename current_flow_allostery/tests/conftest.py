@@ -0,0 +1,45 @@
+"""
+Shared fixtures for the betweenness tests.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from .utils import TEST_DATA_DIR, WT2_FRAME_BASE, load_frame_matrix, random_network
+
+
+@pytest.fixture
+def small_network():
+    return random_network()
+
+
+@pytest.fixture
+def test_data_dir():
+    if not os.path.isdir(TEST_DATA_DIR):
+        pytest.skip('Test_Data not available')
+    return TEST_DATA_DIR
+
+
+@pytest.fixture
+def wt2_network(test_data_dir):
+    """(mat, sources, targets) of the first wt2 frame, one source / target per chain."""
+    mat, nameToInd = load_frame_matrix(WT2_FRAME_BASE % 0)
+    sources = nameToInd.loc[[14, 240, 466, 692, 918, 1144]].values
+    targets = nameToInd.loc[[47, 273, 499, 725, 951, 1177]].values
+    return mat, sources, targets
+
+
+@pytest.fixture
+def wt2_frames(test_data_dir):
+    """(Ei, Ej, weightMat, nNodes, sources, targets) for the four wt2 frames on a shared edge list."""
+    mats = [load_frame_matrix(WT2_FRAME_BASE % iFrame)[0] for iFrame in range(4)]
+    nameToInd = load_frame_matrix(WT2_FRAME_BASE % 0)[1]
+    pattern = np.sum([mat != 0 for mat in mats], axis=0) > 0
+    np.fill_diagonal(pattern, False)
+    Ei, Ej = np.nonzero(pattern)
+    weightMat = np.stack([mat[Ei, Ej] for mat in mats])
+    sources = nameToInd.loc[[14, 240, 466]].values
+    targets = nameToInd.loc[[47, 273, 499]].values
+    return Ei, Ej, weightMat, mats[0].shape[0], sources, targets
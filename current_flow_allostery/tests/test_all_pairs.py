@@ -0,0 +1,43 @@
+"""
+All pairs current flow betweenness (Brandes-Fleischer sorting) against brute
+force summation over node pairs.
+"""
+
+import numpy as np
+import scipy as sp
+import scipy.sparse
+import scipy.sparse.csgraph
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import random_network, reference_btw
+
+
+def brute_force_all_pairs(mat):
+    nNodes = mat.shape[0]
+    labels = sp.sparse.csgraph.connected_components(sp.sparse.csr_matrix(mat), directed=False)[1]
+    btwMat = np.zeros(mat.shape)
+    for source in range(nNodes):
+        for target in range(source + 1, nNodes):
+            if labels[source] == labels[target]:
+                compNodes = np.nonzero(labels == labels[source])[0]
+                compMat = mat[np.ix_(compNodes, compNodes)]
+                btwMat[np.ix_(compNodes, compNodes)] += reference_btw(
+                    compMat, [np.searchsorted(compNodes, source)], [np.searchsorted(compNodes, target)])
+    return btwMat / (nNodes * (nNodes - 1) / 2.)
+
+
+def test_all_pairs_brute_force():
+    mat = random_network(nNodes=12, seed=3)
+    refBtw = brute_force_all_pairs(mat)
+    btwMat = bt_calc.getAllPairsBtwMat(mat, edgeBlockSize=7)
+    np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-12 * refBtw.max())
+
+
+def test_all_pairs_two_components():
+    mat = np.zeros((14, 14))
+    mat[:8, :8] = random_network(nNodes=8, seed=4)
+    mat[8:, 8:] = random_network(nNodes=6, seed=5)
+    refBtw = brute_force_all_pairs(mat)
+    btwMat = bt_calc.getAllPairsBtwMat(sp.sparse.csr_matrix(mat)).toarray()
+    np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-12 * refBtw.max())
@@ -0,0 +1,59 @@
+"""
+Sampled approximate betweenness (getApproxBtwEdges): the reported error
+bounds must hold against the exact betweenness.
+"""
+
+import numpy as np
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import random_network
+
+
+@pytest.fixture
+def approx_network():
+    mat = random_network(nNodes=50, density=0.08, seed=6)
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(mat))
+    return Ei, Ej, weights
+
+
+@pytest.mark.parametrize('randomSeed', range(8))
+def test_approx_bound_holds_sources_targets(approx_network, randomSeed):
+    Ei, Ej, weights = approx_network
+    sources, targets = np.arange(0, 30), np.arange(20, 50)
+    exactBtw = bt_calc.getBtwEdges(Ei, Ej, weights, sources, targets, nNodes=50)
+    edgeBtw, errorInfo = bt_calc.getApproxBtwEdges(Ei, Ej, weights, sources, targets, nNodes=50,
+                                                   epsilon=0.1, delta=0.1, sampleBlockSize=16,
+                                                   randomSeed=randomSeed)
+    assert not errorInfo['exact']
+    assert errorInfo['nSamples'] < len(sources) * len(targets)
+    assert np.all(np.abs(edgeBtw - exactBtw) <= errorInfo['edgeErrorBounds'])
+    assert np.abs(edgeBtw - exactBtw).max() <= errorInfo['errorBound']
+
+
+@pytest.mark.parametrize('randomSeed', range(4))
+def test_approx_bound_holds_all_pairs(approx_network, randomSeed):
+    Ei, Ej, weights = approx_network
+    exactBtw = bt_calc.getAllPairsBtwEdges(Ei, Ej, weights, nNodes=50)
+    edgeBtw, errorInfo = bt_calc.getApproxBtwEdges(Ei, Ej, weights, nNodes=50, epsilon=0.1,
+                                                   delta=0.1, randomSeed=randomSeed)
+    assert not errorInfo['exact']
+    assert errorInfo['converged']
+    assert np.abs(edgeBtw - exactBtw).max() <= errorInfo['errorBound'] <= 0.1
+
+
+def test_approx_max_samples_caps_sampling(approx_network):
+    Ei, Ej, weights = approx_network
+    edgeBtw, errorInfo = bt_calc.getApproxBtwEdges(Ei, Ej, weights, nNodes=50, epsilon=1e-3,
+                                                   maxSamples=100, randomSeed=0)
+    assert errorInfo['nSamples'] == 100
+    assert not errorInfo['converged']
+
+
+def test_approx_falls_back_to_exact(approx_network):
+    Ei, Ej, weights = approx_network
+    sources, targets = [0, 1], [40, 41]
+    edgeBtw, errorInfo = bt_calc.getApproxBtwEdges(Ei, Ej, weights, sources, targets, nNodes=50)
+    assert errorInfo['exact']
+    np.testing.assert_allclose(edgeBtw, bt_calc.getBtwEdges(Ei, Ej, weights, sources, targets, nNodes=50))
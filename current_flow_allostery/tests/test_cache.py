@@ -0,0 +1,105 @@
+"""
+On disk cache of Laplacian pseudo inverses and potential columns.
+"""
+
+import os
+import time
+
+import numpy as np
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import random_network, reference_btw
+
+
+def test_cache_key_depends_on_content():
+    arr = np.arange(6.)
+    assert bt_calc.getBtwCacheKey(arr) == bt_calc.getBtwCacheKey(arr.copy())
+    assert bt_calc.getBtwCacheKey(arr) != bt_calc.getBtwCacheKey(arr.reshape(2, 3))
+    assert bt_calc.getBtwCacheKey(arr) != bt_calc.getBtwCacheKey(arr.astype(np.float32))
+
+
+def test_pinv_cache_reuses_inverse(small_network, tmp_path):
+    sources, targets = [0, 3], [11, 17]
+    btwMat = bt_calc.getBtwMat(small_network, sources, targets, cacheDir=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 1
+    cacheKey = os.listdir(tmp_path)[0]
+    #a second call with other nodes loads the stored inverse instead of recomputing it
+    np.save(os.path.join(tmp_path, cacheKey, 'Linv.npy'), np.zeros(small_network.shape))
+    cachedBtw = bt_calc.getBtwMat(small_network, [1], [12], cacheDir=str(tmp_path))
+    assert np.all(cachedBtw == 0)
+    refBtw = reference_btw(small_network, sources, targets)
+    np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-12 * refBtw.max())
+
+
+def test_column_cache_only_solves_missing_nodes(small_network, tmp_path):
+    solvedNodes = []
+    factorData = bt_calc.getGroundedLaplacianFactorization(bt_calc.matLapSparse(small_network))
+
+    def solve_columns(missingNodes):
+        solvedNodes.append(list(missingNodes))
+        return (bt_calc.solveGroundedLaplacian(factorData, bt_calc.getUnitRhsMat(20, missingNodes)),
+                factorData['componentLabels'])
+
+    bt_calc.getCachedNodeColumns(str(tmp_path), 'net', [0, 3, 11], solve_columns)
+    colMat = bt_calc.getCachedNodeColumns(str(tmp_path), 'net', [3, 11, 17], solve_columns)[0]
+    assert solvedNodes == [[0, 3, 11], [17]]
+    np.testing.assert_allclose(colMat, bt_calc.solveGroundedLaplacian(
+        factorData, bt_calc.getUnitRhsMat(20, [3, 11, 17])), rtol=1e-12, atol=1e-14)
+
+
+def test_column_cache_rebuilds_interrupted_entry(small_network, tmp_path):
+    factorData = bt_calc.getGroundedLaplacianFactorization(bt_calc.matLapSparse(small_network))
+
+    def solve_columns(missingNodes):
+        return (bt_calc.solveGroundedLaplacian(factorData, bt_calc.getUnitRhsMat(20, missingNodes)),
+                factorData['componentLabels'])
+
+    bt_calc.getCachedNodeColumns(str(tmp_path), 'net', [0, 3], solve_columns)
+    #columns of an update that was interrupted before nodes.npy was written
+    np.save(os.path.join(tmp_path, 'net', 'columns.npy'), np.zeros((20, 3)))
+    colMat = bt_calc.getCachedNodeColumns(str(tmp_path), 'net', [0, 3], solve_columns)[0]
+    np.testing.assert_allclose(colMat, bt_calc.solveGroundedLaplacian(
+        factorData, bt_calc.getUnitRhsMat(20, [0, 3])), rtol=1e-12, atol=1e-14)
+    assert np.load(os.path.join(tmp_path, 'net', 'columns.npy')).shape == (20, 2)
+
+
+def test_sparse_cache_matches_uncached(small_network, tmp_path):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    for sources, targets in [([0, 3], [11]), ([0], [11, 17])]:
+        cachedBtw = bt_calc.getBtwEdges(Ei, Ej, weights, sources, targets, nNodes=20, cacheDir=str(tmp_path))
+        np.testing.assert_allclose(cachedBtw, bt_calc.getBtwEdges(Ei, Ej, weights, sources, targets, nNodes=20),
+                                   rtol=1e-12, atol=0)
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_prune_evicts_least_recently_used(tmp_path):
+    for iNet, cacheKey in enumerate(['old', 'new']):
+        bt_calc.getCachedArray(str(tmp_path), cacheKey, 'Linv.npy', lambda: np.zeros((256, 256)))
+        os.utime(os.path.join(tmp_path, cacheKey), (time.time() - 100 + iNet, time.time() - 100 + iNet))
+    evicted = bt_calc.pruneBtwCache(str(tmp_path), 0.6)
+    assert evicted == ['old']
+    assert os.listdir(tmp_path) == ['new']
+
+
+def test_prune_leaves_foreign_directories(tmp_path):
+    #a foreign directory is left alone even if its name looks like a cache key
+    foreignDir = os.path.join(tmp_path, bt_calc.getBtwCacheKey(np.arange(3)))
+    os.makedirs(foreignDir)
+    np.save(os.path.join(foreignDir, 'frames.npy'), np.zeros((256, 256)))
+    os.utime(foreignDir, (time.time() - 100, time.time() - 100))
+    bt_calc.getCachedArray(str(tmp_path), 'net', 'Linv.npy', lambda: np.zeros((256, 256)))
+    #the foreign directory is neither counted nor evicted
+    assert bt_calc.pruneBtwCache(str(tmp_path), 0.6) == []
+    assert bt_calc.pruneBtwCache(str(tmp_path), 0.) == ['net']
+    assert os.listdir(tmp_path) == [os.path.basename(foreignDir)]
+    assert os.path.exists(os.path.join(foreignDir, 'frames.npy'))
+
+
+def test_cache_distinguishes_networks(tmp_path):
+    for seed in range(2):
+        mat = random_network(seed=seed)
+        btwMat = bt_calc.getBtwMat(mat, [0], [11], cacheDir=str(tmp_path))
+        refBtw = reference_btw(mat, [0], [11])
+        np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-12 * refBtw.max())
+    assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,75 @@
+"""
+Block circulant pseudo inverse for symmetric homo-oligomers against the dense
+pseudo inverse.
+"""
+
+import numpy as np
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import random_network, reference_btw, reference_pinv
+
+
+def circulant_network(nBlocks=4, blockSize=5, seed=9):
+    """Symmetric network of nBlocks identical chains numbered chain by chain."""
+    rng = np.random.default_rng(seed)
+    couplings = [random_network(nNodes=blockSize, asymmetry=0, seed=seed)]
+    for iDist in range(1, nBlocks):
+        couplings.append(rng.random((blockSize, blockSize)) * (rng.random((blockSize, blockSize)) < 0.3))
+    #coupling to the chain at distance -d is the transpose of distance d
+    for iDist in range(1, nBlocks):
+        if iDist < nBlocks - iDist:
+            couplings[nBlocks - iDist] = couplings[iDist].T
+        elif iDist == nBlocks - iDist:
+            couplings[iDist] = (couplings[iDist] + couplings[iDist].T) / 2.
+    mat = np.zeros((nBlocks * blockSize, nBlocks * blockSize))
+    for iBlock in range(nBlocks):
+        for jBlock in range(nBlocks):
+            mat[iBlock * blockSize:(iBlock + 1) * blockSize, jBlock * blockSize:(jBlock + 1) * blockSize] = \
+                couplings[(jBlock - iBlock) % nBlocks]
+    return mat
+
+
+def test_circulant_network_is_symmetric():
+    mat = circulant_network()
+    np.testing.assert_array_equal(mat, mat.T)
+    assert not (bt_calc.getBlockCirculantBlocks(mat, 4) is None)
+    assert bt_calc.getBlockCirculantBlocks(mat, 3) is None
+
+
+def test_circulant_pinv_matches_pinv():
+    mat = circulant_network()
+    Lmat = bt_calc.matLapSparse(mat).toarray()
+    Linv = bt_calc.getBlockCirculantPinv(Lmat, 4)
+    np.testing.assert_allclose(Linv, reference_pinv(mat), rtol=0, atol=1e-12)
+
+
+def test_circulant_backend_matches_pinv():
+    mat = circulant_network()
+    sources, targets = [0, 5, 10, 15], [3, 8, 13, 18]
+    refBtw = reference_btw(mat, sources, targets)
+    btwMat = bt_calc.getBtwMat(mat, sources, targets, solverBackend='circulant', nSymmetryBlocks=4)
+    np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-12 * refBtw.max())
+
+
+def test_circulant_falls_back_to_pinv(small_network, capsys):
+    sources, targets = [0, 3], [11, 17]
+    btwMat = bt_calc.getBtwMat(small_network, sources, targets, solverBackend='circulant', nSymmetryBlocks=4)
+    assert 'falling back to pinv' in capsys.readouterr().out
+    refBtw = reference_btw(small_network, sources, targets)
+    np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-12 * refBtw.max())
+
+
+def test_circulant_backend_on_disconnected_network(capsys):
+    #without inter chain contacts every chain is its own component
+    mat = circulant_network()
+    for iBlock in range(4):
+        for jBlock in range(4):
+            if iBlock != jBlock:
+                mat[iBlock * 5:(iBlock + 1) * 5, jBlock * 5:(jBlock + 1) * 5] = 0
+    sources, targets = [0, 5, 10], [3, 8]
+    btwMat = bt_calc.getBtwMat(mat, sources, targets, solverBackend='circulant', nSymmetryBlocks=4)
+    assert 'falling back to pinv' not in capsys.readouterr().out
+    refBtw = bt_calc.getBtwMat(mat, sources, targets, solverBackend='pinv')
+    assert refBtw.max() > 0
+    np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-12 * refBtw.max())
@@ -0,0 +1,55 @@
+"""
+Betweenness on disconnected networks, solved one connected component at a
+time.
+"""
+
+import numpy as np
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import random_network, reference_btw
+
+
+@pytest.fixture
+def split_network():
+    """Three components: nodes 0-9, 10-17 and the isolated pair 18-19."""
+    mat = np.zeros((20, 20))
+    mat[:10, :10] = random_network(nNodes=10, seed=7)
+    mat[10:18, 10:18] = random_network(nNodes=8, seed=8)
+    mat[18, 19] = mat[19, 18] = 1.
+    return mat
+
+
+def reference_split_btw(mat, sources, targets):
+    """Same component pairs only, normalized by all s*t pairs."""
+    btwMat = np.zeros(mat.shape)
+    for compNodes in [np.arange(0, 10), np.arange(10, 18)]:
+        compSources = [source for source in sources if source in compNodes]
+        compTargets = [target for target in targets if target in compNodes]
+        if len(compSources) and len(compTargets):
+            compBtw = reference_btw(mat[np.ix_(compNodes, compNodes)], np.searchsorted(compNodes, compSources),
+                                    np.searchsorted(compNodes, compTargets))
+            btwMat[np.ix_(compNodes, compNodes)] = compBtw * len(compSources) * len(compTargets)
+    return btwMat / (len(sources) * len(targets))
+
+
+#the grounded (sparse) factorization handles components without splitting,
+#the pseudo inverse only after splitting
+@pytest.mark.parametrize('solverBackend,splitComponents', [('pinv', True), ('sparse', True), ('sparse', False)])
+def test_disconnected_matches_reference(split_network, solverBackend, splitComponents):
+    sources, targets = [0, 2, 11], [7, 15, 16]
+    refBtw = reference_split_btw(split_network, sources, targets)
+    btwMat = bt_calc.getBtwMat(split_network, sources, targets, solverBackend=solverBackend,
+                               splitComponents=splitComponents, useUnionColumns=True)
+    btwMat = btwMat.toarray() if solverBackend == 'sparse' else np.asarray(btwMat)
+    np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-12 * refBtw.max())
+    assert np.all(btwMat[18:, 18:] == 0)
+
+
+def test_disconnected_edges(split_network):
+    sources, targets = [0, 2, 11], [7, 15, 16]
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(split_network))
+    edgeBtw = bt_calc.getBtwEdges(Ei, Ej, weights, sources, targets, nNodes=20)
+    refBtw = reference_split_btw(split_network, sources, targets)
+    np.testing.assert_allclose(edgeBtw, refBtw[Ei, Ej], rtol=0, atol=1e-12 * refBtw.max())
@@ -0,0 +1,83 @@
+"""
+Contact and node deletion scan (getDeletionSensitivity) against recomputing
+the effective resistances without the deleted contact / node.
+"""
+
+import numpy as np
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import random_network, reference_pinv
+
+SOURCES = [0, 2]
+TARGETS = [12, 17]
+
+
+def mean_resistance(mat, sources, targets):
+    Linv = reference_pinv(mat)
+    return np.mean([Linv[s, s] + Linv[t, t] - Linv[s, t] - Linv[t, s] for s in sources for t in targets])
+
+
+@pytest.mark.parametrize('asymmetry', [0, 0.2])
+def test_contact_deletions_match_recompute(asymmetry):
+    small_network = random_network(asymmetry=asymmetry)
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    sensData = bt_calc.getDeletionSensitivity(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, scanNodes=False)
+    baseRes = mean_resistance(small_network, SOURCES, TARGETS)
+    assert np.isclose(sensData['baseResistance'], baseRes, rtol=1e-12)
+    edgeTable = sensData['edgeTable']
+    assert len(edgeTable) == len(np.unique(np.sort(np.stack([Ei, Ej], axis=1), axis=1), axis=0))
+    for node_1, node_2, meanRes in edgeTable[['Node_1', 'Node_2', 'MeanResistance']].values:
+        delMat = small_network.copy()
+        delMat[int(node_1), int(node_2)] = delMat[int(node_2), int(node_1)] = 0
+        #contacts that cut the network are covered by test_cutting_deletion_is_direct
+        if np.isfinite(meanRes):
+            assert np.isclose(meanRes, mean_resistance(delMat, SOURCES, TARGETS), rtol=1e-10)
+
+
+@pytest.mark.parametrize('asymmetry', [0, 0.2])
+def test_node_deletions_match_recompute(asymmetry):
+    small_network = random_network(asymmetry=asymmetry)
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    nodeTable = bt_calc.getDeletionSensitivity(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20,
+                                               scanEdges=False)['nodeTable']
+    for node, meanRes in nodeTable[['Node', 'MeanResistance']].values:
+        node = int(node)
+        if node in SOURCES + TARGETS:
+            continue
+        keepNodes = np.array([iNode for iNode in range(20) if iNode != node])
+        delMat = small_network[np.ix_(keepNodes, keepNodes)]
+        refRes = mean_resistance(delMat, np.searchsorted(keepNodes, SOURCES), np.searchsorted(keepNodes, TARGETS))
+        assert np.isclose(meanRes, refRes, rtol=1e-10)
+
+
+def test_cutting_deletion_is_direct():
+    """Deleting the only link between two halves cuts every pair."""
+    mat = np.zeros((12, 12))
+    mat[:6, :6] = random_network(nNodes=6, seed=10)
+    mat[6:, 6:] = random_network(nNodes=6, seed=11)
+    mat[5, 6] = mat[6, 5] = 1.
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(mat))
+    edgeTable = bt_calc.getDeletionSensitivity(Ei, Ej, weights, [0], [11], nNodes=12,
+                                               scanNodes=False)['edgeTable'].set_index(['Node_1', 'Node_2'])
+    assert np.isinf(edgeTable.loc[(5, 6), 'MeanResistance'])
+    assert np.isclose(edgeTable.loc[(5, 6), 'CurrentChange'], -1)
+    assert edgeTable.loc[(5, 6), 'Method'] == 'direct'
+
+
+def test_deletion_scan_reuses_betweenness_factorization(small_network, monkeypatch):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    refData = bt_calc.getDeletionSensitivity(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20)
+    solveData = bt_calc.getBtwEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, returnSolveData=True)[1]
+    nFactorizations = []
+    getFactorization = bt_calc.getGroundedLaplacianFactorization
+    monkeypatch.setattr(bt_calc, 'getGroundedLaplacianFactorization',
+                        lambda *args, **kwargs: nFactorizations.append(1) or getFactorization(*args, **kwargs))
+    sensData = bt_calc.getDeletionSensitivity(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, solveData=solveData)
+    #only deletions recomputed directly factorize again
+    nDirect = np.sum(sensData['edgeTable']['Method'] == 'direct') + np.sum(sensData['nodeTable']['Method'] == 'direct')
+    assert len(nFactorizations) == nDirect
+    for tableName in ['edgeTable', 'nodeTable']:
+        np.testing.assert_allclose(sensData[tableName]['MeanResistance'], refData[tableName]['MeanResistance'],
+                                   rtol=1e-12)
@@ -0,0 +1,49 @@
+"""
+Edge list betweenness API (getBtwEdges, getNodeBtwFromEdges) against the
+dense matrix path.
+"""
+
+import numpy as np
+import scipy as sp
+import scipy.sparse
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import reference_btw
+
+
+def test_edges_match_matrix(small_network):
+    sources, targets = [0, 3], [11, 17]
+    Ei, Ej = np.nonzero(small_network)
+    refBtw = reference_btw(small_network, sources, targets)
+    edgeBtw = bt_calc.getBtwEdges(Ei, Ej, small_network[Ei, Ej], sources, targets, nNodes=20)
+    np.testing.assert_allclose(edgeBtw, refBtw[Ei, Ej], rtol=0, atol=1e-12 * refBtw.max())
+    assert np.all(edgeBtw[Ei == Ej] == 0)
+
+
+def test_edges_order_independent(small_network):
+    sources, targets = [0], [17]
+    Ei, Ej = np.nonzero(small_network)
+    perm = np.random.default_rng(0).permutation(len(Ei))
+    edgeBtw = bt_calc.getBtwEdges(Ei, Ej, small_network[Ei, Ej], sources, targets, nNodes=20)
+    permBtw = bt_calc.getBtwEdges(Ei[perm], Ej[perm], small_network[Ei, Ej][perm], sources, targets,
+                                  nNodes=20)
+    np.testing.assert_allclose(permBtw, edgeBtw[perm], rtol=1e-12, atol=0)
+
+
+def test_node_btw_from_edges(small_network):
+    sources, targets = [0, 3], [11, 17]
+    Amat = bt_calc.matAdjSparse(small_network)
+    Ei, Ej, weights = bt_calc.getEdgeArrays(Amat)
+    edgeBtw = bt_calc.getBtwEdges(Ei, Ej, weights, sources, targets, nNodes=20)
+    btwMat = sp.sparse.coo_matrix((edgeBtw, (Ei, Ej)), shape=(20, 20)).toarray()
+    np.testing.assert_allclose(bt_calc.getNodeBtwFromEdges(Ei, edgeBtw, nNodes=20),
+                               np.sum(btwMat, axis=1) / 2., rtol=1e-12, atol=0)
+
+
+def test_edges_test_data(wt2_network):
+    mat, sources, targets = wt2_network
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(mat))
+    edgeBtw = bt_calc.getBtwEdges(Ei, Ej, weights, sources, targets, nNodes=mat.shape[0])
+    refBtw = bt_calc.getBtwMat(mat, sources, targets, solverBackend='pinv')[Ei, Ej]
+    assert np.abs(edgeBtw - refBtw).max() <= 1e-10 * refBtw.max()
@@ -0,0 +1,107 @@
+"""
+Streaming ensemble statistics: online moments and P^2 quantiles against numpy,
+and betweennessEnsemble grouping of the Test_Data frames by system / replica.
+"""
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import WT2_FRAME_BASE
+
+SOURCE_NAMES = ['14', '240', '466']
+TARGET_NAMES = ['47', '273', '499']
+
+
+def test_online_stats_match_numpy():
+    rng = np.random.default_rng(3)
+    valueMat = rng.gamma(2., size=(2000, 6))
+    statsData = bt_calc.initBtwStats(6, quantiles=[0.5, 0.95])
+    for iStart in range(0, len(valueMat), 7):
+        bt_calc.updateBtwStats(statsData, valueMat[iStart:iStart + 7])
+    statsTable = bt_calc.getBtwStatsTable(statsData)
+    assert np.all(statsTable['Count'] == 2000)
+    np.testing.assert_allclose(statsTable['Mean'], valueMat.mean(axis=0), rtol=1e-12)
+    np.testing.assert_allclose(statsTable['Std'], valueMat.std(axis=0, ddof=1), rtol=1e-10)
+    np.testing.assert_array_equal(statsTable['Min'], valueMat.min(axis=0))
+    np.testing.assert_array_equal(statsTable['Max'], valueMat.max(axis=0))
+    #P^2 quantiles are approximate
+    np.testing.assert_allclose(statsTable['Q50'], np.quantile(valueMat, 0.5, axis=0), rtol=0.05)
+    np.testing.assert_allclose(statsTable['Q95'], np.quantile(valueMat, 0.95, axis=0), rtol=0.05)
+
+
+def test_few_frames_quantiles_are_exact():
+    valueMat = np.random.default_rng(4).random((4, 5))
+    statsData = bt_calc.initBtwStats(5)
+    bt_calc.updateBtwStats(statsData, valueMat)
+    np.testing.assert_allclose(bt_calc.getBtwStatsQuantiles(statsData),
+                               np.quantile(valueMat, statsData['quantiles'], axis=0), rtol=1e-12)
+
+
+def reference_frames(inDir, fileNames):
+    """Edge names and per frame betweenness of a group of frames, solved together."""
+    frameTables = [pd.read_csv(os.path.join(inDir, fileName)).astype({'Resid_1': str, 'Resid_2': str})
+                   for fileName in fileNames]
+    edgeIndex = pd.MultiIndex.from_frame(pd.concat(
+        [frameTable[['Resid_1', 'Resid_2']] for frameTable in frameTables]).drop_duplicates())
+    nodeNames = np.unique(np.concatenate([edgeIndex.get_level_values(0), edgeIndex.get_level_values(1)]))
+    nameToInd = pd.Series(np.arange(len(nodeNames)), index=nodeNames)
+    weightMat = np.stack([frameTable.set_index(['Resid_1', 'Resid_2'])['TOTAL'].abs().reindex(edgeIndex).fillna(0)
+                          for frameTable in frameTables])
+    btwFrames = bt_calc.getBtwFrames(
+        nameToInd.loc[edgeIndex.get_level_values(0)].values, nameToInd.loc[edgeIndex.get_level_values(1)].values,
+        weightMat, nameToInd.loc[SOURCE_NAMES].values, nameToInd.loc[TARGET_NAMES].values,
+        nNodes=len(nodeNames), solverBackend='dense')
+    return edgeIndex, btwFrames
+
+
+def test_ensemble_groups_and_moments(test_data_dir, tmp_path):
+    from current_flow_allostery.betweenness import betweennessEnsemble
+    inDir = tmp_path / 'frames'
+    inDir.mkdir()
+    #the wt2 frames as two replicas, the second in a different frame order
+    fileNames = []
+    for iFrame in range(4):
+        fileNames.append(WT2_FRAME_BASE % iFrame + '.csv')
+        shutil.copy(os.path.join(test_data_dir, fileNames[-1]), inDir / fileNames[-1])
+        fileNames.append((WT2_FRAME_BASE % (3 - iFrame)).replace('rep1', 'rep2') + '.csv')
+        shutil.copy(os.path.join(test_data_dir, WT2_FRAME_BASE % iFrame + '.csv'), inDir / fileNames[-1])
+    for iFrame in range(2):
+        fileNames.append(WT2_FRAME_BASE.replace('wt2_standard', 'n14y2_acetyl') % iFrame + '.csv')
+        shutil.copy(os.path.join(test_data_dir, fileNames[-1]), inDir / fileNames[-1])
+    betweennessEnsemble(str(inDir), str(tmp_path), fileNames, 'ens', sourceNodeNames=SOURCE_NAMES,
+                        targetNodeNames=TARGET_NAMES, frameBlockSize=3, verbose=False)
+    statsTable = pd.read_csv(tmp_path / 'ens.EdgeBetweennessStats.csv', dtype={'Resid_1': str, 'Resid_2': str})
+    groupCounts = statsTable.groupby(['system', 'rep'])['Count'].unique()
+    assert sorted(groupCounts.index) == [('n14y2_acetyl', 'rep1'), ('wt2_standard', 'rep1'), ('wt2_standard', 'rep2')]
+    assert list(groupCounts.loc[[('n14y2_acetyl', 'rep1'), ('wt2_standard', 'rep1'), ('wt2_standard', 'rep2')]]) == [
+        [2], [4], [4]]
+    edgeIndex, btwFrames = reference_frames(str(inDir), [WT2_FRAME_BASE % iFrame + '.csv' for iFrame in range(4)])
+    tolerance = 1e-10 * btwFrames.max()
+    for rep in ['rep1', 'rep2']:
+        repTable = statsTable[(statsTable['system'] == 'wt2_standard') & (statsTable['rep'] == rep)]
+        repTable = repTable.set_index(['Resid_1', 'Resid_2']).loc[edgeIndex]
+        np.testing.assert_allclose(repTable['Mean'], btwFrames.mean(axis=0), rtol=0, atol=tolerance)
+        np.testing.assert_allclose(repTable['Std'], btwFrames.std(axis=0, ddof=1), rtol=0, atol=tolerance)
+        np.testing.assert_allclose(repTable['Max'], btwFrames.max(axis=0), rtol=0, atol=tolerance)
+        #four frames per group, so the quantiles are exact
+        np.testing.assert_allclose(repTable['Q50'], np.median(btwFrames, axis=0), rtol=0, atol=tolerance)
+    nodeTable = pd.read_csv(tmp_path / 'ens.NodeBetweennessStats.csv')
+    assert len(nodeTable.groupby(['system', 'rep'])) == 3
+
+
+def test_ensemble_unmatched_names_share_one_group(test_data_dir, tmp_path):
+    from current_flow_allostery.betweenness import betweennessEnsemble
+    for iFrame in range(2):
+        shutil.copy(os.path.join(test_data_dir, WT2_FRAME_BASE % iFrame + '.csv'), tmp_path / ('frame%g.csv' % iFrame))
+    betweennessEnsemble(str(tmp_path), str(tmp_path), ['frame0.csv', 'frame1.csv'], 'plain',
+                        sourceNodeNames=SOURCE_NAMES, targetNodeNames=TARGET_NAMES,
+                        writeNodeStats=False, verbose=False)
+    statsTable = pd.read_csv(tmp_path / 'plain.EdgeBetweennessStats.csv')
+    assert set(zip(statsTable['system'], statsTable['rep'])) == {('NONE', 'NONE')}
+    assert np.all(statsTable['Count'] == 2)
+    assert not os.path.exists(tmp_path / 'plain.NodeBetweennessStats.csv')
@@ -0,0 +1,53 @@
+"""
+Batched multi-frame betweenness (getBtwFrames) against one getBtwMat call per
+frame.
+"""
+
+import numpy as np
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import random_network, reference_btw
+
+
+def get_frame_references(Ei, Ej, weightMat, nNodes, sources, targets):
+    refFrames = np.zeros(weightMat.shape)
+    for iFrame, weights in enumerate(weightMat):
+        mat = np.zeros((nNodes, nNodes))
+        mat[Ei, Ej] = weights
+        refFrames[iFrame] = reference_btw(mat, sources, targets)[Ei, Ej]
+    return refFrames
+
+
+@pytest.mark.parametrize('solverBackend', ['dense', 'sparse'])
+@pytest.mark.parametrize('asymmetry', [0, 0.2])
+def test_frames_small(solverBackend, asymmetry):
+    mats = [random_network(asymmetry=asymmetry, seed=seed) for seed in range(5)]
+    pattern = np.sum([mat != 0 for mat in mats], axis=0) > 0
+    Ei, Ej = np.nonzero(pattern)
+    weightMat = np.stack([mat[Ei, Ej] for mat in mats])
+    sources, targets = [0, 3], [11, 17]
+    refFrames = get_frame_references(Ei, Ej, weightMat, 20, sources, targets)
+    btwFrames = bt_calc.getBtwFrames(Ei, Ej, weightMat, sources, targets, nNodes=20,
+                                     solverBackend=solverBackend, frameBlockSize=2)
+    np.testing.assert_allclose(btwFrames, refFrames, rtol=0, atol=1e-12 * refFrames.max())
+    assert np.all(btwFrames[:, Ei == Ej] == 0)
+
+
+@pytest.mark.parametrize('solverBackend', ['dense', 'sparse'])
+def test_frames_test_data(wt2_frames, solverBackend):
+    Ei, Ej, weightMat, nNodes, sources, targets = wt2_frames
+    btwFrames = bt_calc.getBtwFrames(Ei, Ej, weightMat, sources, targets, nNodes=nNodes,
+                                     solverBackend=solverBackend)
+    for iFrame in [0, 3]:
+        mat = np.zeros((nNodes, nNodes))
+        mat[Ei, Ej] = weightMat[iFrame]
+        refBtw = bt_calc.getBtwMat(mat, sources, targets, solverBackend='pinv')[Ei, Ej]
+        assert np.abs(btwFrames[iFrame] - refBtw).max() <= 1e-10 * refBtw.max()
+
+
+def test_frames_single_weight_vector(small_network):
+    Ei, Ej = np.nonzero(small_network)
+    btwFrames = bt_calc.getBtwFrames(Ei, Ej, small_network[Ei, Ej], [0], [11], nNodes=20)
+    assert btwFrames.shape == (1, len(Ei))
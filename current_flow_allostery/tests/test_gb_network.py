@@ -7,9 +7,9 @@ import sys
 
 import pytest
 
-import current-flow-allostery
+import current_flow_allostery
 
 
-def test_current-flow-allostery_imported():
+def test_current_flow_allostery_imported():
     """Sample test, will always pass so long as import statement worked."""
-    assert "current-flow-allostery" in sys.modules
+    assert "current_flow_allostery" in sys.modules
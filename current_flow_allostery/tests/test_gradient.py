@@ -0,0 +1,85 @@
+"""
+Adjoint edge weight gradient against central finite differences of the dense
+effective resistances.
+"""
+
+import numpy as np
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import random_network, reference_pinv
+
+SOURCES = [0, 3]
+TARGETS = [11, 17]
+
+
+def mean_quantity(mat, quantity, sources=SOURCES, targets=TARGETS):
+    Linv = reference_pinv(mat)
+    pairRes = np.array([Linv[s, s] + Linv[t, t] - Linv[s, t] - Linv[t, s] for s in sources for t in targets])
+    if quantity == 'current':
+        return np.mean(1. / pairRes)
+    return np.mean(pairRes)
+
+
+@pytest.mark.parametrize('quantity', ['current', 'resistance'])
+def test_gradient_matches_finite_differences(small_network, quantity):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    edgeGrad = bt_calc.getEdgeWeightGradientEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, quantity=quantity)
+    step = 1e-5
+    for iEdge in range(len(Ei)):
+        #a contact change moves both directed entries
+        perturbMat = np.zeros((20, 20))
+        perturbMat[Ei[iEdge], Ej[iEdge]] = perturbMat[Ej[iEdge], Ei[iEdge]] = step
+        fdGrad = (mean_quantity(small_network + perturbMat, quantity) -
+                  mean_quantity(small_network - perturbMat, quantity)) / (2 * step)
+        assert np.isclose(edgeGrad[iEdge], fdGrad, rtol=1e-5, atol=1e-9 * np.abs(edgeGrad).max())
+    if quantity == 'current':
+        assert np.all(edgeGrad >= 0)
+    else:
+        assert np.all(edgeGrad <= 0)
+
+
+def test_gradient_mat_matches_edges(small_network):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    edgeGrad = bt_calc.getEdgeWeightGradientEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20)
+    gradMat = bt_calc.getEdgeWeightGradientMat(small_network, SOURCES, TARGETS)
+    np.testing.assert_allclose(gradMat[Ei, Ej], edgeGrad, rtol=1e-12)
+    assert np.all(np.diag(gradMat) == 0)
+    with pytest.raises(ValueError):
+        bt_calc.getEdgeWeightGradientMat(small_network, SOURCES, TARGETS, quantity='betweenness')
+
+
+@pytest.mark.parametrize('quantity', ['current', 'resistance'])
+def test_gradient_non_symmetric_matches_finite_differences(quantity):
+    mat = random_network(asymmetry=0.2, seed=3)
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(mat))
+    edgeGrad = bt_calc.getEdgeWeightGradientEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, quantity=quantity)
+    step = 1e-5
+    for iEdge in range(len(Ei)):
+        perturbMat = np.zeros((20, 20))
+        perturbMat[Ei[iEdge], Ej[iEdge]] = perturbMat[Ej[iEdge], Ei[iEdge]] = step
+        fdGrad = (mean_quantity(mat + perturbMat, quantity) - mean_quantity(mat - perturbMat, quantity)) / (2 * step)
+        assert np.isclose(edgeGrad[iEdge], fdGrad, rtol=1e-5, atol=1e-9 * np.abs(edgeGrad).max())
+
+
+def test_gradient_skips_cross_component_pairs(capsys):
+    mat = np.zeros((14, 14))
+    mat[:8, :8] = random_network(nNodes=8, seed=5)
+    mat[8:, 8:] = random_network(nNodes=6, seed=6)
+    gradMat = bt_calc.getEdgeWeightGradientMat(mat, [0], [5, 10], quantity='resistance')
+    assert 'WARNING!' in capsys.readouterr().out
+    refGrad = bt_calc.getEdgeWeightGradientMat(mat[:8, :8], [0], [5], quantity='resistance')
+    np.testing.assert_allclose(gradMat[:8, :8], refGrad, rtol=1e-12)
+    assert np.all(gradMat[8:, 8:] == 0)
+
+
+def test_gradient_reuses_betweenness_solve(small_network, monkeypatch):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    refGrad = bt_calc.getEdgeWeightGradientEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20)
+    solveData = bt_calc.getBtwEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, returnSolveData=True)[1]
+    #symmetric network: the adjoint potentials are the betweenness potentials, no solve is needed
+    monkeypatch.setattr(bt_calc, 'solveGroundedLaplacian', None)
+    edgeGrad = bt_calc.getEdgeWeightGradientEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20,
+                                                  solveData=solveData)
+    np.testing.assert_allclose(edgeGrad, refGrad, rtol=1e-10, atol=1e-14)
@@ -0,0 +1,55 @@
+"""
+Group to group (super-source / super-sink) current flow against a network
+whose groups are joined by very strong links.
+"""
+
+import numpy as np
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import reference_pinv
+
+
+def strong_link_reference(mat, sources, targets, linkWeight=1e7):
+    """Current through each edge with the sources and targets tied to two extra nodes."""
+    nNodes = mat.shape[0]
+    extMat = np.zeros((nNodes + 2, nNodes + 2))
+    extMat[:nNodes, :nNodes] = mat
+    extMat[nNodes, sources] = extMat[sources, nNodes] = linkWeight
+    extMat[nNodes + 1, targets] = extMat[targets, nNodes + 1] = linkWeight
+    pot = reference_pinv(extMat)[:nNodes, nNodes] - reference_pinv(extMat)[:nNodes, nNodes + 1]
+    Amat = np.array(mat, dtype=float)
+    np.fill_diagonal(Amat, 0)
+    return Amat * np.abs(pot[:, None] - pot[None, :])
+
+
+def test_group_flow_matches_strong_links(small_network):
+    sources, targets = [0, 3, 5], [11, 17]
+    refBtw = strong_link_reference(small_network, sources, targets)
+    btwMat = bt_calc.getGroupFlowBtwMat(small_network, sources, targets)
+    np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-5 * refBtw.max())
+    #edges inside a group carry no current
+    assert btwMat[0, 3] == 0 and btwMat[11, 17] == 0
+
+
+def test_group_flow_unit_current(small_network):
+    sources, targets = [0, 3, 5], [11, 17]
+    symMat = (small_network + small_network.T) / 2.
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(symMat))
+    edgeBtw = bt_calc.getGroupFlowBtwEdges(Ei, Ej, weights, sources, targets, nNodes=20)
+    #one unit of current leaves the source group and enters the target group
+    leaving = np.isin(Ei, sources) & ~np.isin(Ej, sources)
+    entering = np.isin(Ej, targets) & ~np.isin(Ei, targets)
+    assert np.isclose(np.sum(edgeBtw[leaving]), 1., rtol=1e-10)
+    assert np.isclose(np.sum(edgeBtw[entering]), 1., rtol=1e-10)
+
+
+def test_group_flow_single_pair_matches_btw(small_network):
+    btwMat = bt_calc.getGroupFlowBtwMat(small_network, [0], [11])
+    np.testing.assert_allclose(btwMat, bt_calc.getBtwMat(small_network, [0], [11]), rtol=1e-10, atol=1e-14)
+
+
+def test_group_flow_overlap_raises(small_network):
+    with pytest.raises(ValueError):
+        bt_calc.getGroupFlowBtwMat(small_network, [0, 3], [3, 11])
@@ -0,0 +1,64 @@
+"""
+Woodbury updated frames (getBtwFrameIncremental) against fresh
+factorizations.
+"""
+
+import numpy as np
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import random_network
+
+
+def get_trajectory(nFrames=6, seed=1, asymmetry=0):
+    mat = random_network(nNodes=30, asymmetry=asymmetry, seed=seed)
+    Ei, Ej = np.nonzero(mat)
+    rng = np.random.default_rng(seed)
+    weightMat = [mat[Ei, Ej]]
+    for iFrame in range(1, nFrames):
+        changed = rng.random(len(Ei)) < 0.05
+        weightMat.append(weightMat[-1] * np.where(changed, rng.uniform(0.5, 1.5, len(Ei)), 1.))
+    return Ei, Ej, np.stack(weightMat)
+
+
+@pytest.mark.parametrize('asymmetry', [0, 0.2])
+def test_incremental_matches_sparse(asymmetry):
+    Ei, Ej, weightMat = get_trajectory(asymmetry=asymmetry)
+    sources, targets = [0, 1], [20, 25]
+    refFrames = bt_calc.getBtwFrames(Ei, Ej, weightMat, sources, targets, nNodes=30,
+                                     solverBackend='sparse')
+    btwFrames, solverInfo = bt_calc.getBtwFrames(Ei, Ej, weightMat, sources, targets, nNodes=30,
+                                                 solverBackend='incremental', returnSolverInfo=True)
+    np.testing.assert_allclose(btwFrames, refFrames, rtol=0, atol=1e-12 * refFrames.max())
+    assert list(solverInfo['Path']) == ['full'] + ['woodbury'] * 5
+    assert np.all(solverInfo['ReconstructionError'] < 1e-10)
+
+
+def test_incremental_rank_cap_refactorizes():
+    Ei, Ej, weightMat = get_trajectory()
+    solverInfo = bt_calc.getBtwFrames(Ei, Ej, weightMat, [0], [20], nNodes=30,
+                                      solverBackend='incremental', maxUpdateRank=1,
+                                      returnSolverInfo=True)[1]
+    assert set(solverInfo['Path']) == {'full'}
+
+
+def test_incremental_reconstruction_error_refactorizes():
+    Ei, Ej, weightMat = get_trajectory()
+    sources, targets = [0, 1], [20, 25]
+    btwFrames, solverInfo = bt_calc.getBtwFrames(Ei, Ej, weightMat, sources, targets, nNodes=30,
+                                                 solverBackend='incremental', maxReconstructionError=0.,
+                                                 returnSolverInfo=True)
+    assert set(solverInfo['Path']) == {'full'}
+    solverInfo = bt_calc.getBtwFrames(Ei, Ej, weightMat, sources, targets, nNodes=30,
+                                      solverBackend='incremental', maxReconstructionError=None,
+                                      returnSolverInfo=True)[1]
+    assert list(solverInfo['Path'][1:]) == ['woodbury'] * 5
+
+
+def test_incremental_reuse_below_tolerance():
+    Ei, Ej, weightMat = get_trajectory(nFrames=1)
+    weightMat = np.stack([weightMat[0], weightMat[0] + 1e-5])
+    solverInfo = bt_calc.getBtwFrames(Ei, Ej, weightMat, [0], [20], nNodes=30,
+                                      solverBackend='incremental', returnSolverInfo=True)[1]
+    assert list(solverInfo['Path']) == ['full', 'reuse']
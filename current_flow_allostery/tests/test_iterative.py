@@ -0,0 +1,52 @@
+"""
+Preconditioned iterative frame solver with warm starts against sparse
+factorizations.
+"""
+
+import numpy as np
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import random_network
+
+
+@pytest.mark.parametrize('preconditioner,asymmetry', [('jacobi', 0), ('ilu', 0), ('none', 0), ('amg', 0),
+                                                      ('jacobi', 0.2), ('ilu', 0.2)])
+def test_iterative_matches_sparse(preconditioner, asymmetry):
+    if preconditioner == 'amg':
+        pytest.importorskip('pyamg')
+    mats = [random_network(nNodes=40, density=0.15, asymmetry=asymmetry, seed=12)]
+    for seed in range(3):
+        mats.append(mats[-1] * np.random.default_rng(seed).uniform(0.9, 1.1, mats[-1].shape))
+    Ei, Ej = np.nonzero(mats[0])
+    weightMat = np.stack([mat[Ei, Ej] for mat in mats])
+    sources, targets = [0, 1], [30, 35]
+    refFrames = bt_calc.getBtwFrames(Ei, Ej, weightMat, sources, targets, nNodes=40, solverBackend='sparse')
+    btwFrames, solverInfo = bt_calc.getBtwFrames(Ei, Ej, weightMat, sources, targets, nNodes=40,
+                                                 solverBackend='iterative', preconditioner=preconditioner,
+                                                 iterTolerance=1e-12, preconditionerInterval=2,
+                                                 returnSolverInfo=True)
+    np.testing.assert_allclose(btwFrames, refFrames, rtol=0, atol=1e-8 * refFrames.max())
+    assert set(solverInfo['Path']) == {'iterative'}
+    assert np.all(solverInfo['Iterations'] > 0)
+    assert len(solverInfo) == len(mats)
+
+
+def test_grounded_system_is_symmetric(small_network):
+    systemData = bt_calc.getGroundedLaplacianSystem(bt_calc.matLapSparse(small_network))
+    assert systemData['isSymmetric']
+    colMat, nIterations, converged = bt_calc.solveGroundedLaplacianIterative(
+        systemData, bt_calc.getUnitRhsMat(20, [0, 11]), rtol=1e-12)
+    factorData = bt_calc.getGroundedLaplacianFactorization(bt_calc.matLapSparse(small_network))
+    assert converged
+    np.testing.assert_allclose(colMat, bt_calc.solveGroundedLaplacian(factorData, bt_calc.getUnitRhsMat(20, [0, 11])),
+                               rtol=0, atol=1e-9)
+
+
+def test_iterative_test_data(wt2_frames):
+    Ei, Ej, weightMat, nNodes, sources, targets = wt2_frames
+    refFrames = bt_calc.getBtwFrames(Ei, Ej, weightMat, sources, targets, nNodes=nNodes, solverBackend='sparse')
+    btwFrames = bt_calc.getBtwFrames(Ei, Ej, weightMat, sources, targets, nNodes=nNodes,
+                                     solverBackend='iterative', iterTolerance=1e-10)
+    assert np.abs(btwFrames - refFrames).max() <= 1e-6 * refFrames.max()
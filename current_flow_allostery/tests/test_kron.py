@@ -0,0 +1,76 @@
+"""
+Kron reduction onto a region of interest against potentials of the full
+network.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import WT2_FRAME_BASE, reference_pinv
+
+SOURCES = [0, 3]
+TARGETS = [11, 17]
+KEEP_NODES = [0, 3, 5, 8, 11, 14, 17]
+
+
+def test_reduced_laplacian_is_schur_complement(small_network):
+    Ared = bt_calc.getKronReducedMat(small_network, KEEP_NODES, nodeBlockSize=3)
+    Lmat = bt_calc.matLapSparse(small_network).toarray()
+    elimNodes = np.setdiff1d(np.arange(20), KEEP_NODES)
+    Lschur = Lmat[np.ix_(KEEP_NODES, KEEP_NODES)] - Lmat[np.ix_(KEEP_NODES, elimNodes)].dot(
+        np.linalg.solve(Lmat[np.ix_(elimNodes, elimNodes)], Lmat[np.ix_(elimNodes, KEEP_NODES)]))
+    np.testing.assert_allclose(bt_calc.matLapSparse(Ared).toarray(), Lschur, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(Ared, Ared.T, rtol=0, atol=1e-14)
+
+
+@pytest.mark.parametrize('solverBackend', ['pinv', 'sparse'])
+def test_reduced_btw_matches_full_potentials(small_network, solverBackend):
+    Ared = bt_calc.getKronReducedMat(small_network, KEEP_NODES)
+    Linv = reference_pinv(small_network)
+    refBtw = np.zeros((20, 20))
+    for source in SOURCES:
+        for target in TARGETS:
+            #kept node potentials of the full network drive the reduced edges
+            pot = (Linv[:, source] - Linv[:, target])[KEEP_NODES]
+            refBtw[np.ix_(KEEP_NODES, KEEP_NODES)] += Ared * np.abs(pot[:, None] - pot[None, :])
+    refBtw /= len(SOURCES) * len(TARGETS)
+    btwMat, resistanceData = bt_calc.getBtwMat(small_network, SOURCES, TARGETS, solverBackend=solverBackend,
+                                               reductionNodes=KEEP_NODES, returnResistanceData=True)
+    if solverBackend == 'sparse':
+        btwMat = btwMat.toarray()
+    np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-12 * refBtw.max())
+    refRes = np.diag(Linv)[SOURCES][:, None] + np.diag(Linv)[TARGETS][None, :] - 2 * Linv[np.ix_(SOURCES, TARGETS)]
+    np.testing.assert_allclose(resistanceData['pairResistances'], refRes.flatten(), rtol=1e-10)
+    assert np.all(np.isnan(np.delete(resistanceData['closeness'], KEEP_NODES)))
+
+
+def test_reduction_forwards_solver_options(small_network):
+    Ared = bt_calc.getKronReducedMat(small_network, KEEP_NODES)
+    redSources, redTargets = np.searchsorted(KEEP_NODES, SOURCES), np.searchsorted(KEEP_NODES, TARGETS)
+    spectrumData = bt_calc.getLaplacianSpectrum(Ared, nModes=3)
+    refBtw = bt_calc.getBtwMat(Ared, redSources, redTargets, solverBackend='spectral', spectrumData=spectrumData)
+    btwMat = bt_calc.getBtwMat(small_network, SOURCES, TARGETS, solverBackend='spectral',
+                               reductionNodes=KEEP_NODES, spectrumData=spectrumData)
+    np.testing.assert_allclose(btwMat[np.ix_(KEEP_NODES, KEEP_NODES)], refBtw, rtol=1e-12, atol=1e-14)
+    with pytest.raises(ValueError):
+        bt_calc.getBtwMat(small_network, SOURCES, TARGETS, solverBackend='spectral', reductionNodes=KEEP_NODES,
+                          spectrumData=bt_calc.getLaplacianSpectrum(small_network, nModes=3))
+    with pytest.raises(ValueError):
+        bt_calc.getBtwMat(small_network, SOURCES, TARGETS, reductionNodes=[0, 3, 11])
+
+
+def test_reduced_index_map_is_written(test_data_dir, tmp_path):
+    from current_flow_allostery.betweenness import betweenness
+    sourceNames, targetNames = ['14', '240'], ['47', '273']
+    reductionNames = sourceNames + targetNames + [str(resid) for resid in range(15, 47)]
+    betweenness(test_data_dir, str(tmp_path), WT2_FRAME_BASE % 0 + '.csv', 'kron',
+                sourceNodeNames=sourceNames, targetNodeNames=targetNames, solverBackend='sparse',
+                reductionNodeNames=reductionNames, verbose=False)
+    indMap = pd.read_csv(tmp_path / 'kron.IndToNameMap.csv', dtype={'NodeNames': str})
+    np.testing.assert_array_equal(indMap['NodeInds'], np.arange(len(reductionNames)))
+    assert sorted(indMap['NodeNames']) == sorted(reductionNames)
+    reducedNet = pd.read_csv(tmp_path / 'kron.ReducedNetwork.csv', dtype={'Resid_1': str, 'Resid_2': str})
+    assert set(reducedNet['Resid_1']).union(reducedNet['Resid_2']) <= set(indMap['NodeNames'])
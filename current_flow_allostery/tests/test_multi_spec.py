@@ -0,0 +1,63 @@
+"""
+Several named source / target specifications from one inversion /
+factorization, and the command line entry point that exposes them.
+"""
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import WT2_FRAME_BASE, reference_btw
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'betweenness.py')
+BTW_SPECS = {'gate': ([0, 3], [11, 17]), 'pore': ([5], [11, 12, 19])}
+
+
+def test_spec_list_formats():
+    specList = bt_calc.getBtwSpecList(BTW_SPECS)
+    assert [specName for specName, sources, targets in specList] == ['gate', 'pore']
+    tupleList = bt_calc.getBtwSpecList([(specName,) + BTW_SPECS[specName] for specName in BTW_SPECS])
+    for (name_1, sources_1, targets_1), (name_2, sources_2, targets_2) in zip(specList, tupleList):
+        assert name_1 == name_2
+        np.testing.assert_array_equal(sources_1, sources_2)
+        np.testing.assert_array_equal(targets_1, targets_2)
+
+
+@pytest.mark.parametrize('solverBackend', ['pinv', 'sparse'])
+def test_multi_matches_single(small_network, solverBackend):
+    btwMats = bt_calc.getBtwMatMulti(small_network, BTW_SPECS, solverBackend=solverBackend)
+    assert list(btwMats.keys()) == ['gate', 'pore']
+    for specName, (sources, targets) in BTW_SPECS.items():
+        refBtw = reference_btw(small_network, sources, targets)
+        btwMat = btwMats[specName].toarray() if solverBackend == 'sparse' else btwMats[specName]
+        np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-12 * refBtw.max())
+
+
+def test_edges_multi_matches_single(small_network):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    edgeBtws = bt_calc.getBtwEdgesMulti(Ei, Ej, weights, BTW_SPECS, nNodes=20)
+    for specName, (sources, targets) in BTW_SPECS.items():
+        np.testing.assert_allclose(edgeBtws[specName],
+                                   bt_calc.getBtwEdges(Ei, Ej, weights, sources, targets, nNodes=20),
+                                   rtol=1e-12, atol=0)
+
+
+def test_command_line_matches_function(test_data_dir, tmp_path):
+    """Options given on the command line are passed straight through to betweenness."""
+    from current_flow_allostery.betweenness import betweenness
+    fileBase = WT2_FRAME_BASE % 0
+    betweenness(test_data_dir, str(tmp_path), fileBase + '.csv', 'function',
+                btwSpecs={'gate': (['14', '240'], ['47', '273'])}, solverBackend='sparse', verbose=False)
+    subprocess.run([sys.executable, SCRIPT_PATH, '-indir', test_data_dir, '-i', fileBase + '.csv',
+                    '-outdir', str(tmp_path), '-o', 'script', '-spec', 'gate', '14,240', '47,273',
+                    '-wnvec', '-sb', 'sparse'], check=True, capture_output=True)
+    for tableName in ['EdgeBetweenness', 'NodeBetweenness']:
+        functionTable = pd.read_csv(tmp_path / ('function.gate.%s.csv' % tableName))
+        scriptTable = pd.read_csv(tmp_path / ('script.gate.%s.csv' % tableName))
+        pd.testing.assert_frame_equal(functionTable, scriptTable)
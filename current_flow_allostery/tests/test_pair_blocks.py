@@ -0,0 +1,38 @@
+"""
+Memory bounded accumulation over blocks of (source,target) pairs.
+"""
+
+import numpy as np
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import reference_btw
+
+
+def test_pair_block_size():
+    assert bt_calc.getPairBlockSize(100, 1000, 50) == 50
+    assert bt_calc.getPairBlockSize(100, 1000, 50, pairBlockSize=7) == 7
+    assert bt_calc.getPairBlockSize(100, 1000, 50, pairBlockSize=70) == 50
+    #8*(3*100+2*1000) bytes per pair
+    budgetMB = 10 * 8 * (3 * 100 + 2 * 1000) / 2.**20
+    assert bt_calc.getPairBlockSize(100, 1000, 50, memoryBudgetMB=budgetMB) == 10
+    assert bt_calc.getPairBlockSize(100, 1000, 50, memoryBudgetMB=1e-9) == 1
+
+
+@pytest.mark.parametrize('solverBackend', ['pinv', 'sparse'])
+@pytest.mark.parametrize('pairBlockSize', [1, 4, 100])
+def test_pair_blocks_match_reference(small_network, solverBackend, pairBlockSize):
+    sources, targets = [0, 3, 5], [11, 17, 19]
+    refBtw = reference_btw(small_network, sources, targets)
+    btwMat = bt_calc.getBtwMat(small_network, sources, targets, solverBackend=solverBackend,
+                               pairBlockSize=pairBlockSize)
+    btwMat = btwMat.toarray() if solverBackend == 'sparse' else btwMat
+    np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-12 * refBtw.max())
+
+
+def test_memory_budget_matches_reference(small_network):
+    sources, targets = [0, 3, 5], [11, 17, 19]
+    refBtw = reference_btw(small_network, sources, targets)
+    btwMat = bt_calc.getBtwMat(small_network, sources, targets, memoryBudgetMB=1e-3)
+    np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-12 * refBtw.max())
@@ -0,0 +1,74 @@
+"""
+Pair resolved edge currents against dense potentials and the summed edge
+betweenness.
+"""
+
+import numpy as np
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import reference_pinv
+
+SOURCES = [0, 3]
+TARGETS = [11, 17, 19]
+
+
+def dense_pair_currents(mat, Ei, Ej, weights):
+    """(pairs x edges) signed currents, source major pair order."""
+    Linv = reference_pinv(mat)
+    currents = []
+    for source in SOURCES:
+        for target in TARGETS:
+            pot = Linv[:, source] - Linv[:, target]
+            currents.append(weights * (pot[Ei] - pot[Ej]))
+    return np.array(currents)
+
+
+def to_dense(pairFlows, nEdges):
+    currentMat = np.zeros((len(pairFlows['pairSources']), nEdges))
+    currentMat[pairFlows['pairIndex'], pairFlows['edgeIndex']] = pairFlows['current']
+    return currentMat
+
+
+def test_pair_flows_match_dense_currents(small_network):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    pairFlows = bt_calc.getPairFlowsEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20)
+    np.testing.assert_array_equal(pairFlows['pairSources'], np.repeat(SOURCES, 3))
+    np.testing.assert_array_equal(pairFlows['pairTargets'], np.tile(TARGETS, 2))
+    refCurrents = dense_pair_currents(small_network, Ei, Ej, weights)
+    currentMat = to_dense(pairFlows, len(Ei))
+    np.testing.assert_allclose(currentMat, refCurrents, rtol=0, atol=1e-6 * np.abs(refCurrents).max())
+    #summed absolute currents give the edge betweenness
+    edgeBtw = bt_calc.getBtwEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20)
+    np.testing.assert_allclose(np.abs(currentMat).sum(axis=0) / 6, edgeBtw, rtol=0, atol=1e-6 * edgeBtw.max())
+
+
+def test_pair_flows_top_k(small_network):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    pairFlows = bt_calc.getPairFlowsEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, topK=5)
+    refCurrents = np.abs(dense_pair_currents(small_network, Ei, Ej, weights))
+    for iPair in range(6):
+        keptEdges = pairFlows['edgeIndex'][pairFlows['pairIndex'] == iPair]
+        assert len(keptEdges) == 5
+        #both directions of a symmetric contact carry the same current, compare values not edge ids
+        np.testing.assert_allclose(np.sort(refCurrents[iPair, keptEdges]), np.sort(refCurrents[iPair])[-5:],
+                                   rtol=1e-6)
+
+
+def test_pair_flows_threshold(small_network):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    pairFlows = bt_calc.getPairFlowsEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, relThreshold=0.3)
+    refCurrents = np.abs(dense_pair_currents(small_network, Ei, Ej, weights))
+    for iPair in range(6):
+        keptEdges = pairFlows['edgeIndex'][pairFlows['pairIndex'] == iPair]
+        assert set(keptEdges) == set(np.nonzero(refCurrents[iPair] >= 0.3 * refCurrents[iPair].max())[0])
+
+
+def test_pair_flows_reuse_betweenness_solve(small_network, monkeypatch):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    edgeBtw, solveData = bt_calc.getBtwEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, returnSolveData=True)
+    #the pair flows are the unsummed betweenness columns, no further solve is made
+    monkeypatch.setattr(bt_calc, 'solveGroundedLaplacian', None)
+    pairFlows = bt_calc.getPairFlowsEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, solveData=solveData)
+    currentMat = to_dense(pairFlows, len(Ei))
+    np.testing.assert_allclose(np.abs(currentMat).sum(axis=0) / 6, edgeBtw, rtol=1e-6)
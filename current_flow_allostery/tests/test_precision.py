@@ -0,0 +1,92 @@
+"""
+Single and mixed precision betweenness against double precision, and the
+precision options of betweenness().
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import WT2_FRAME_BASE, random_network
+
+SOURCE_NAMES = ['14', '240', '466']
+TARGET_NAMES = ['47', '273', '499']
+
+
+@pytest.fixture
+def wt2_edges(wt2_network):
+    mat, sources, targets = wt2_network
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(mat))
+    refBtw = bt_calc.getBtwEdges(Ei, Ej, weights, sources, targets, nNodes=mat.shape[0])
+    return Ei, Ej, weights, mat.shape[0], sources, targets, refBtw
+
+
+@pytest.mark.parametrize('precision,tolerance', [('float32', 1e-3), ('mixed', 1e-10)])
+def test_edges_precision(wt2_edges, precision, tolerance):
+    Ei, Ej, weights, nNodes, sources, targets, refBtw = wt2_edges
+    edgeBtw, precisionInfo = bt_calc.getBtwEdges(Ei, Ej, weights, sources, targets, nNodes=nNodes,
+                                                 precision=precision, nCheckEdges=50, randomSeed=0,
+                                                 returnPrecisionInfo=True)
+    assert np.abs(edgeBtw - refBtw).max() <= tolerance * refBtw.max()
+    assert precisionInfo['precision'] == precision
+    assert precisionInfo['nCheckEdges'] == 50
+    assert precisionInfo['maxRelDeviation'] <= tolerance
+    assert precisionInfo['referenceResidual'] < 1e-10
+
+
+def test_pinv_float32(wt2_network):
+    mat, sources, targets = wt2_network
+    refBtw = bt_calc.getBtwMat(mat, sources, targets)
+    btwMat, precisionInfo = bt_calc.getBtwMat(mat, sources, targets, precision='float32', nCheckEdges=50,
+                                              randomSeed=0, returnPrecisionInfo=True)
+    assert np.abs(btwMat - refBtw).max() <= 1e-3 * refBtw.max()
+    assert precisionInfo['nCheckEdges'] == 50
+    assert 0 < precisionInfo['maxRelDeviation'] <= 1e-3
+    assert precisionInfo['referenceResidual'] < 1e-10
+    with pytest.raises(ValueError):
+        bt_calc.getBtwMat(mat, sources, targets, precision='mixed')
+
+
+def test_mixed_pinv_fails_before_writing(test_data_dir, tmp_path):
+    from current_flow_allostery.betweenness import betweenness
+    with pytest.raises(ValueError):
+        betweenness(test_data_dir, str(tmp_path), WT2_FRAME_BASE % 0 + '.csv', 'mixed',
+                    sourceNodeNames=SOURCE_NAMES, targetNodeNames=TARGET_NAMES,
+                    solverBackend='pinv', precision='mixed', verbose=False)
+    assert os.listdir(tmp_path) == []
+
+
+def test_frames_precision_check():
+    mats = [random_network(seed=seed) for seed in range(3)]
+    Ei, Ej = np.nonzero(np.sum([mat != 0 for mat in mats], axis=0) > 0)
+    weightMat = np.stack([mat[Ei, Ej] for mat in mats])
+    solverInfo = bt_calc.getBtwFrames(Ei, Ej, weightMat, [0, 3], [11, 17], nNodes=20, precision='float32',
+                                      nCheckEdges=20, randomSeed=0, returnSolverInfo=True)[1]
+    assert np.all((solverInfo['PrecisionMaxRelDeviation'] > 0) & (solverInfo['PrecisionMaxRelDeviation'] <= 1e-4))
+    solverInfo = bt_calc.getBtwFrames(Ei, Ej, weightMat, [0, 3], [11, 17], nNodes=20, returnSolverInfo=True)[1]
+    assert solverInfo['PrecisionMaxRelDeviation'].isna().all()
+
+
+@pytest.mark.parametrize('solverBackend', ['sparse', 'pinv'])
+def test_precision_deviation_column(test_data_dir, tmp_path, solverBackend):
+    from current_flow_allostery.betweenness import betweenness
+    betweenness(test_data_dir, str(tmp_path), WT2_FRAME_BASE % 0 + '.csv', 'single',
+                sourceNodeNames=SOURCE_NAMES, targetNodeNames=TARGET_NAMES,
+                solverBackend=solverBackend, precision='float32', precisionCheckEdges=20, verbose=False)
+    btwTable = pd.read_csv(tmp_path / 'single.EdgeBetweenness.csv')
+    assert (btwTable['Precision'] == 'float32').all()
+    assert btwTable['PrecisionMaxRelDeviation'].nunique() == 1
+    assert 0 <= btwTable['PrecisionMaxRelDeviation'].iloc[0] <= 1e-3
+
+
+def test_double_precision_column(test_data_dir, tmp_path):
+    from current_flow_allostery.betweenness import betweenness
+    betweenness(test_data_dir, str(tmp_path), WT2_FRAME_BASE % 0 + '.csv', 'double',
+                sourceNodeNames=SOURCE_NAMES, targetNodeNames=TARGET_NAMES, verbose=False)
+    btwTable = pd.read_csv(tmp_path / 'double.EdgeBetweenness.csv')
+    assert (btwTable['Precision'] == 'float64').all()
+    assert 'PrecisionMaxRelDeviation' not in btwTable.columns
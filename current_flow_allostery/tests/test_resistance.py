@@ -0,0 +1,115 @@
+"""
+Effective resistances and current flow closeness against the dense pseudo
+inverse.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import WT2_FRAME_BASE, random_network, reference_pinv
+
+SOURCES = [0, 3]
+TARGETS = [11, 17, 19]
+
+
+def reference_resistances(mat):
+    Linv = reference_pinv(mat)
+    return np.diag(Linv)[:, None] + np.diag(Linv)[None, :] - Linv - Linv.T
+
+
+def reference_closeness(resMat, nodeLabels):
+    closeness = np.zeros(len(nodeLabels))
+    for node in range(len(nodeLabels)):
+        sameComp = nodeLabels == nodeLabels[node]
+        if np.sum(sameComp) > 1:
+            closeness[node] = (np.sum(sameComp) - 1) / np.sum(resMat[node, sameComp])
+    return closeness
+
+
+@pytest.mark.parametrize('asymmetry', [0, 0.2])
+def test_resistance_data_edges_match_pinv(asymmetry):
+    small_network = random_network(asymmetry=asymmetry)
+    resMat = reference_resistances(small_network)
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    resistanceData = bt_calc.getResistanceDataEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, nodeBlockSize=7)
+    np.testing.assert_array_equal(resistanceData['pairSources'], np.repeat(SOURCES, 3))
+    np.testing.assert_array_equal(resistanceData['pairTargets'], np.tile(TARGETS, 2))
+    np.testing.assert_allclose(resistanceData['pairResistances'],
+                               resMat[resistanceData['pairSources'], resistanceData['pairTargets']], rtol=1e-10)
+    np.testing.assert_allclose(resistanceData['closeness'], reference_closeness(resMat, np.zeros(20, dtype=int)),
+                               rtol=1e-10)
+
+
+@pytest.mark.parametrize('method', ['linv', 'factorization'])
+def test_closeness_two_components(method):
+    mat = np.zeros((14, 14))
+    mat[:8, :8] = random_network(nNodes=8, seed=5)
+    mat[8:, 8:] = random_network(nNodes=6, seed=6)
+    nodeLabels = np.repeat([0, 1], [8, 6])
+    resMat = np.zeros((14, 14))
+    resMat[:8, :8] = reference_resistances(mat[:8, :8])
+    resMat[8:, 8:] = reference_resistances(mat[8:, 8:])
+    if method == 'linv':
+        Linv = np.zeros((14, 14))
+        Linv[:8, :8] = reference_pinv(mat[:8, :8])
+        Linv[8:, 8:] = reference_pinv(mat[8:, 8:])
+        closeness = bt_calc.getClosenessFromLinv(Linv, nodeLabels=nodeLabels)
+    else:
+        factorData = bt_calc.getGroundedLaplacianFactorization(bt_calc.matLapSparse(mat))
+        np.testing.assert_array_equal(factorData['componentLabels'], nodeLabels)
+        closeness = bt_calc.getClosenessFromFactorization(factorData, nodeBlockSize=5)
+    np.testing.assert_allclose(closeness, reference_closeness(resMat, nodeLabels), rtol=1e-10)
+
+
+def test_resistance_data_from_linv(small_network):
+    resMat = reference_resistances(small_network)
+    resistanceData = bt_calc.getResistanceDataFromLinv(reference_pinv(small_network), SOURCES, TARGETS)
+    np.testing.assert_allclose(resistanceData['pairResistances'],
+                               resMat[np.repeat(SOURCES, 3), np.tile(TARGETS, 2)], rtol=1e-10)
+
+
+@pytest.mark.parametrize('asymmetry', [0, 0.2])
+def test_edge_resistances(asymmetry):
+    small_network = random_network(asymmetry=asymmetry)
+    resMat = reference_resistances(small_network)
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    factorData = bt_calc.getGroundedLaplacianFactorization(bt_calc.matLapSparse(small_network))
+    edgeRes = bt_calc.getEdgeResistances(factorData, Ei, Ej, nodeBlockSize=6)
+    np.testing.assert_allclose(edgeRes, resMat[Ei, Ej], rtol=1e-10, atol=1e-14)
+
+
+def test_written_resistances_agree_across_backends(wt2_network, test_data_dir, tmp_path):
+    from current_flow_allostery.betweenness import betweenness
+    mat, sources, targets = wt2_network
+    sourceNames, targetNames = ['14', '240', '466'], ['47', '273', '499']
+    tables = {}
+    for backend in ['pinv', 'sparse']:
+        betweenness(test_data_dir, str(tmp_path), WT2_FRAME_BASE % 0 + '.csv', backend,
+                    sourceNodeNames=sourceNames, targetNodeNames=targetNames,
+                    solverBackend=backend, writeResistances=True, verbose=False)
+        tables[backend] = (pd.read_csv(tmp_path / (backend + '.EffectiveResistance.csv')),
+                           pd.read_csv(tmp_path / (backend + '.NodeCloseness.csv')))
+    pd.testing.assert_frame_equal(tables['pinv'][0], tables['sparse'][0], rtol=1e-8)
+    pd.testing.assert_frame_equal(tables['pinv'][1], tables['sparse'][1], rtol=1e-8)
+    resMat = reference_resistances(mat)
+    np.testing.assert_allclose(tables['sparse'][0]['EffectiveResistance'],
+                               resMat[np.repeat(sources[:3], 3), np.tile(targets[:3], 3)], rtol=1e-8)
+
+
+def test_resistance_data_reuses_betweenness_solve(small_network, monkeypatch):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    edgeBtw, solveData = bt_calc.getBtwEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, returnSolveData=True)
+    np.testing.assert_allclose(edgeBtw, bt_calc.getBtwEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20),
+                               rtol=1e-12, atol=0)
+    #no new factorization is made
+    monkeypatch.setattr(bt_calc, 'getGroundedLaplacianFactorization', None)
+    resistanceData = bt_calc.getResistanceDataEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20,
+                                                    solveData=solveData)
+    resMat = reference_resistances(small_network)
+    np.testing.assert_allclose(resistanceData['pairResistances'],
+                               resMat[resistanceData['pairSources'], resistanceData['pairTargets']], rtol=1e-10)
+    np.testing.assert_allclose(resistanceData['closeness'], reference_closeness(resMat, np.zeros(20, dtype=int)),
+                               rtol=1e-10)
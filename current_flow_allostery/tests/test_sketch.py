@@ -0,0 +1,60 @@
+"""
+Johnson-Lindenstrauss sketch of all pairs effective resistances against the
+dense pseudo inverse.
+"""
+
+import numpy as np
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import random_network, reference_pinv
+
+
+def reference_resistances(mat):
+    Linv = reference_pinv(mat)
+    return np.diag(Linv)[:, None] + np.diag(Linv)[None, :] - 2 * Linv
+
+
+def relative_errors(resMat, refRes):
+    offDiag = ~np.eye(len(refRes), dtype=bool)
+    return np.abs(resMat[offDiag] - refRes[offDiag]) / refRes[offDiag]
+
+
+def test_sketch_within_epsilon(small_network):
+    sketchData = bt_calc.getResistanceSketch(small_network, epsilon=0.3, randomSeed=1)
+    assert sketchData['nProjections'] == int(np.ceil(4 * np.log(20) / (0.3 ** 2 / 2 - 0.3 ** 3 / 3)))
+    relErrors = relative_errors(bt_calc.getSketchResistanceMat(sketchData), reference_resistances(small_network))
+    assert np.all(relErrors <= 0.3)
+    assert np.median(relErrors) < 0.1
+
+
+def test_sketch_converges_with_projections(small_network):
+    refRes = reference_resistances(small_network)
+    maxErrors = [relative_errors(bt_calc.getSketchResistanceMat(bt_calc.getResistanceSketch(
+        small_network, nProjections=nProjections, randomSeed=2)), refRes).max() for nProjections in [50, 20000]]
+    assert maxErrors[1] < 0.1
+    assert maxErrors[1] < maxErrors[0]
+
+
+def test_sketch_queries_agree(small_network):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    sketchData = bt_calc.getResistanceSketchEdges(Ei, Ej, weights, nNodes=20, nProjections=64, randomSeed=3)
+    #accumulating the projections in edge blocks draws the same random matrix
+    blockData = bt_calc.getResistanceSketchEdges(Ei, Ej, weights, nNodes=20, nProjections=64, randomSeed=3,
+                                                 edgeBlockSize=7)
+    resMat = bt_calc.getSketchResistanceMat(sketchData)
+    np.testing.assert_allclose(bt_calc.getSketchResistanceMat(blockData), resMat, rtol=1e-10, atol=1e-14)
+    nodes_1, nodes_2 = np.array([0, 3, 5, 19]), np.array([11, 17, 5, 0])
+    np.testing.assert_allclose(bt_calc.getSketchResistances(sketchData, nodes_1, nodes_2), resMat[nodes_1, nodes_2],
+                               rtol=1e-10, atol=1e-12)
+
+
+def test_sketch_disconnected_pairs_are_infinite():
+    mat = np.zeros((14, 14))
+    mat[:8, :8] = random_network(nNodes=8, seed=5)
+    mat[8:, 8:] = random_network(nNodes=6, seed=6)
+    sketchData = bt_calc.getResistanceSketch(mat, nProjections=32, randomSeed=4)
+    resMat = bt_calc.getSketchResistanceMat(sketchData)
+    assert np.all(np.isinf(resMat[:8, 8:]))
+    assert np.all(np.isfinite(resMat[:8, :8]))
+    assert np.isinf(bt_calc.getSketchResistances(sketchData, [0], [9])[0])
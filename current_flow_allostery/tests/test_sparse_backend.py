@@ -0,0 +1,50 @@
+"""
+The sparse (grounded factorization) backend of getBtwMat against the dense
+pseudo inverse.
+"""
+
+import numpy as np
+import pytest
+import scipy as sp
+import scipy.sparse
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import random_network, reference_btw
+
+
+@pytest.mark.parametrize('asymmetry', [0, 0.2])
+def test_sparse_matches_pinv_small(asymmetry):
+    small_network = random_network(asymmetry=asymmetry)
+    sources, targets = [0, 3], [11, 17]
+    pinvBtw = bt_calc.getBtwMat(small_network, sources, targets, solverBackend='pinv')
+    sparseBtw = bt_calc.getBtwMat(small_network, sources, targets, solverBackend='sparse').toarray()
+    refBtw = reference_btw(small_network, sources, targets)
+    np.testing.assert_allclose(pinvBtw, refBtw, rtol=0, atol=1e-12 * refBtw.max())
+    np.testing.assert_allclose(sparseBtw, refBtw, rtol=0, atol=1e-12 * refBtw.max())
+
+
+def test_sparse_accepts_sparse_input(small_network):
+    sources, targets = [0], [11]
+    denseBtw = bt_calc.getBtwMat(small_network, sources, targets, solverBackend='sparse')
+    sparseBtw = bt_calc.getBtwMat(sp.sparse.csr_matrix(small_network), sources, targets,
+                                  solverBackend='sparse')
+    assert sp.sparse.issparse(sparseBtw)
+    np.testing.assert_allclose(denseBtw.toarray(), sparseBtw.toarray(), rtol=1e-12, atol=0)
+
+
+def test_sparse_laplacian_matches_matlap():
+    mat = random_network(asymmetry=0.2)
+    Lmat = bt_calc.matLapSparse(mat).toarray()
+    np.testing.assert_allclose(Lmat, bt_calc.matLap(mat), rtol=1e-14, atol=1e-15)
+    np.testing.assert_allclose(Lmat.sum(axis=1), 0, atol=1e-12)
+    assert np.abs(Lmat - Lmat.T).max() > 1e-3
+
+
+def test_sparse_matches_pinv_test_data(wt2_network):
+    """GB networks are not exactly symmetric, the sparse backend must still reproduce the pseudo inverse."""
+    mat, sources, targets = wt2_network
+    assert np.abs(mat - mat.T).max() > 1e-3 * mat.max()
+    pinvBtw = bt_calc.getBtwMat(mat, sources, targets, solverBackend='pinv')
+    sparseBtw = bt_calc.getBtwMat(mat, sources, targets, solverBackend='sparse').toarray()
+    assert np.abs(pinvBtw - sparseBtw).max() <= 1e-10 * np.abs(pinvBtw).max()
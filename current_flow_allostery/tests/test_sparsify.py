@@ -0,0 +1,71 @@
+"""
+Error controlled pruning of weak edges against brute force betweenness of the
+pruned network.
+"""
+
+import numpy as np
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import reference_btw, reference_pinv
+
+SOURCES = [0, 3]
+TARGETS = [11, 17]
+
+
+@pytest.mark.parametrize('method', ['weight', 'resistance'])
+def test_sparsified_error_is_bounded(small_network, method):
+    prunedMat, sparsifyData = bt_calc.getSparsifiedMat(small_network, SOURCES, TARGETS, method=method,
+                                                       maxBtwError=0.05)
+    assert sparsifyData['nDropped'] > 0
+    assert sparsifyData['btwError'] <= 0.05
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    keepEdges = sparsifyData['keepEdges']
+    assert np.sum(~keepEdges) == sparsifyData['nDropped']
+    #the pruned matrix holds exactly the kept edges
+    np.testing.assert_array_equal(prunedMat[Ei, Ej] != 0, keepEdges)
+    np.testing.assert_array_equal(prunedMat[Ei[keepEdges], Ej[keepEdges]], weights[keepEdges])
+    fullBtw = reference_btw(small_network, SOURCES, TARGETS)
+    prunedBtw = reference_btw(prunedMat, SOURCES, TARGETS)
+    assert np.isclose(np.abs(prunedBtw - fullBtw).max() / fullBtw.max(), sparsifyData['btwError'], rtol=1e-8)
+    np.testing.assert_allclose(sparsifyData['edgeBtw'], prunedBtw[Ei, Ej], rtol=0, atol=1e-12 * fullBtw.max())
+
+
+@pytest.mark.parametrize('method', ['weight', 'resistance'])
+def test_sparsified_drops_lowest_scores(small_network, method):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    sparsifyData = bt_calc.getSparsifiedEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, method=method,
+                                              maxBtwError=0.05)
+    if method == 'weight':
+        scores = weights
+    else:
+        Linv = reference_pinv(small_network)
+        scores = weights * (Linv[Ei, Ei] + Linv[Ej, Ej] - 2 * Linv[Ei, Ej])
+    keepEdges = sparsifyData['keepEdges']
+    assert np.max(scores[~keepEdges]) <= sparsifyData['scoreCutoff'] + 1e-12
+    assert np.isclose(np.min(scores[keepEdges]), sparsifyData['scoreCutoff'], rtol=1e-10)
+
+
+def test_score_cutoff(small_network):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    sparsifyData = bt_calc.getSparsifiedEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, scoreCutoff=0.3)
+    np.testing.assert_array_equal(sparsifyData['keepEdges'], weights >= 0.3)
+    assert sparsifyData['nDropped'] == np.sum(weights < 0.3)
+    with pytest.raises(ValueError):
+        bt_calc.getSparsifiedEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, method='degree')
+
+
+def test_calibrated_cutoff_solves_pruned_network_only(small_network, monkeypatch):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    calibData = bt_calc.getSparsifiedEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, maxBtwError=0.05)
+    nSolves = []
+    getBtwEdges = bt_calc.getBtwEdges
+    monkeypatch.setattr(bt_calc, 'getBtwEdges',
+                        lambda *args, **kwargs: nSolves.append(1) or getBtwEdges(*args, **kwargs))
+    sparsifyData = bt_calc.getSparsifiedEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20,
+                                              scoreCutoff=calibData['scoreCutoff'])
+    assert len(nSolves) == 1
+    assert np.isnan(sparsifyData['btwError'])
+    np.testing.assert_array_equal(sparsifyData['keepEdges'], calibData['keepEdges'])
+    np.testing.assert_allclose(sparsifyData['edgeBtw'], calibData['edgeBtw'], rtol=1e-12, atol=0)
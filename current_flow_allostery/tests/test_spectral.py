@@ -0,0 +1,87 @@
+"""
+Truncated spectral approximation of the Laplacian pseudo inverse against the
+dense pseudo inverse.
+"""
+
+import numpy as np
+import pandas as pd
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import WT2_FRAME_BASE, random_network, reference_btw, reference_pinv
+
+SOURCES = [0, 3]
+TARGETS = [11, 17]
+
+
+def test_full_spectrum_is_exact(small_network):
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(small_network))
+    edgeBtw, spectralInfo = bt_calc.getSpectralBtwEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=20, nModes=19,
+                                                        nSmoothingSteps=0)
+    assert spectralInfo['nModes'] == 19
+    assert spectralInfo['maxResidual'] < 1e-10
+    np.testing.assert_allclose(spectralInfo['spectrumData']['diagCorrection'], 0, atol=1e-12)
+    refBtw = reference_btw(small_network, SOURCES, TARGETS)
+    np.testing.assert_allclose(edgeBtw, refBtw[Ei, Ej], rtol=0, atol=1e-10 * refBtw.max())
+    btwMat = bt_calc.getBtwMat(small_network, SOURCES, TARGETS, solverBackend='spectral', nSpectralModes=19)
+    np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-10 * refBtw.max())
+
+
+def test_truncated_spectrum_and_residuals():
+    mat = random_network(nNodes=60, density=0.1, asymmetry=0, seed=8)
+    spectrumData = bt_calc.getLaplacianSpectrum(mat, nModes=8)
+    Lmat = bt_calc.matLapSparse(mat).toarray()
+    #the shift invert eigensolver finds the smallest non trivial eigenvalues
+    np.testing.assert_allclose(spectrumData['eigenvalues'], np.linalg.eigvalsh(Lmat)[1:9], rtol=1e-8)
+    colNodes = bt_calc.getUnionNodes(SOURCES, TARGETS)
+    Linv = reference_pinv(mat)
+    errors = []
+    for nSmoothingSteps in [0, 2]:
+        colMat = bt_calc.getSpectralLinvColumns(spectrumData, colNodes, nSmoothingSteps=nSmoothingSteps)
+        rhsMat = np.eye(60)[:, colNodes] - 1. / 60
+        refResiduals = np.linalg.norm(Lmat.dot(colMat) - rhsMat, axis=0) / np.linalg.norm(rhsMat, axis=0)
+        np.testing.assert_allclose(bt_calc.getSpectralResiduals(spectrumData, colNodes, colMat), refResiduals,
+                                   rtol=1e-10)
+        errors.append(np.abs(colMat - Linv[:, colNodes]).max())
+    #smoothing recovers part of the truncated local response
+    assert errors[1] < errors[0]
+
+
+def test_reused_spectrum_with_scaled_conductances():
+    mat = random_network(nNodes=60, density=0.1, asymmetry=0, seed=8)
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(mat))
+    refBtw, spectralInfo = bt_calc.getSpectralBtwEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=60, nModes=8)
+    scaledBtw, scaledInfo = bt_calc.getSpectralBtwEdges(Ei, Ej, 3 * weights, SOURCES, TARGETS, nNodes=60,
+                                                        spectrumData=spectralInfo['spectrumData'],
+                                                        conductanceScale=3.)
+    np.testing.assert_allclose(scaledBtw, refBtw, rtol=1e-10, atol=1e-14)
+    np.testing.assert_allclose(scaledInfo['columnResiduals'], spectralInfo['columnResiduals'], rtol=1e-10)
+
+
+def test_residual_above_threshold_falls_back_to_exact(capsys):
+    mat = random_network(nNodes=60, density=0.1, asymmetry=0, seed=8)
+    Ei, Ej, weights = bt_calc.getEdgeArrays(bt_calc.matAdjSparse(mat))
+    approxBtw, spectralInfo = bt_calc.getSpectralBtwEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=60, nModes=8)
+    assert not spectralInfo['exactFallback']
+    assert 'WARNING!' not in capsys.readouterr().out
+    refBtw = reference_btw(mat, SOURCES, TARGETS)
+    assert np.abs(approxBtw - refBtw[Ei, Ej]).max() > 1e-3 * refBtw.max()
+    edgeBtw, fallbackInfo = bt_calc.getSpectralBtwEdges(Ei, Ej, weights, SOURCES, TARGETS, nNodes=60, nModes=8,
+                                                        maxResidual=0.5 * spectralInfo['maxResidual'])
+    assert 'WARNING!' in capsys.readouterr().out
+    assert fallbackInfo['exactFallback']
+    assert np.isclose(fallbackInfo['maxResidual'], spectralInfo['maxResidual'], rtol=1e-8)
+    np.testing.assert_allclose(edgeBtw, refBtw[Ei, Ej], rtol=0, atol=1e-10 * refBtw.max())
+    btwMats = bt_calc.getBtwMatMulti(mat, [('a', SOURCES, TARGETS)], solverBackend='spectral', nSpectralModes=8,
+                                     maxSpectralResidual=0.5 * spectralInfo['maxResidual'])
+    np.testing.assert_allclose(btwMats['a'], refBtw, rtol=0, atol=1e-10 * refBtw.max())
+
+
+def test_betweenness_keeps_spectral_approximation_by_default(test_data_dir, tmp_path):
+    from current_flow_allostery.betweenness import betweenness
+    betweenness(test_data_dir, str(tmp_path), WT2_FRAME_BASE % 0 + '.csv', 'spectral',
+                sourceNodeNames=['14', '240'], targetNodeNames=['47', '273'], solverBackend='spectral',
+                verbose=False)
+    btwTable = pd.read_csv(tmp_path / 'spectral.EdgeBetweenness.csv')
+    assert not btwTable['SpectralExactFallback'].any()
+    assert (btwTable['SpectralResidual'] > 0).all()
@@ -0,0 +1,65 @@
+"""
+Shared fill reducing ordering and several conductance transforms per call
+against separate single transform calls.
+"""
+
+import numpy as np
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import random_network
+
+SOURCES = [0, 3]
+TARGETS = [11, 17]
+
+
+def energy_frames(nFrames=3, seed=4):
+    """Shared edge list and signed interaction energies of a few perturbed frames."""
+    mat = random_network(seed=seed)
+    Ei, Ej = np.nonzero(mat)
+    rng = np.random.default_rng(seed)
+    energies = -np.stack([mat[Ei, Ej] * rng.uniform(0.8, 1.2, len(Ei)) for iFrame in range(nFrames)])
+    return Ei, Ej, energies
+
+
+def test_ordering_cache_is_reused():
+    Ei, Ej, energies = energy_frames()
+    weightMat = np.abs(energies)
+    orderingCache = {}
+    btwFrames = bt_calc.getBtwFrames(Ei, Ej, weightMat, SOURCES, TARGETS, nNodes=20, solverBackend='sparse',
+                                     orderingCache=orderingCache)
+    assert len(orderingCache) == 1
+    cachedOrdering = list(orderingCache.values())[0]
+    #a second call with the same pattern finds the ordering in the cache, scaling
+    #all weights leaves the betweenness unchanged
+    cachedFrames = bt_calc.getBtwFrames(Ei, Ej, weightMat * 2, SOURCES, TARGETS, nNodes=20, solverBackend='sparse',
+                                        orderingCache=orderingCache)
+    assert len(orderingCache) == 1
+    assert list(orderingCache.values())[0] is cachedOrdering
+    np.testing.assert_allclose(cachedFrames, btwFrames, rtol=1e-10, atol=0)
+    refFrames = bt_calc.getBtwFrames(Ei, Ej, weightMat, SOURCES, TARGETS, nNodes=20, solverBackend='dense')
+    np.testing.assert_allclose(btwFrames, refFrames, rtol=0, atol=1e-12 * refFrames.max())
+
+
+def test_weight_transforms_match_separate_calls():
+    Ei, Ej, energies = energy_frames()
+    transforms = {'abs': 'abs', 'boltzmann': 'boltzmann', 'reciprocal': 'reciprocal',
+                  'square': lambda energy: energy ** 2}
+    transformResults = bt_calc.getBtwFrames(Ei, Ej, energies, SOURCES, TARGETS, nNodes=20, solverBackend='sparse',
+                                            weightTransforms=transforms, kT=0.5)
+    assert list(transformResults.keys()) == list(transforms.keys())
+    for name, transform in transforms.items():
+        refFrames = bt_calc.getBtwFrames(Ei, Ej, bt_calc.getConductanceTransform(transform, kT=0.5)(energies),
+                                         SOURCES, TARGETS, nNodes=20, solverBackend='sparse')
+        np.testing.assert_allclose(transformResults[name], refFrames, rtol=1e-12, atol=0)
+
+
+def test_conductance_transforms():
+    energies = np.array([-2., 0., 0.5])
+    np.testing.assert_allclose(bt_calc.getConductanceTransform('abs')(energies), [2., 0., 0.5])
+    np.testing.assert_allclose(bt_calc.getConductanceTransform('boltzmann', kT=0.5)(energies),
+                               np.exp(-np.array([4., 0., 1.])))
+    np.testing.assert_allclose(bt_calc.getConductanceTransform('reciprocal')(energies), [0.5, 0., 2.])
+    with pytest.raises(ValueError):
+        bt_calc.getConductanceTransform('log')
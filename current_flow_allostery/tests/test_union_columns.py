@@ -0,0 +1,30 @@
+"""
+Potentials from s+t unit injection solves (useUnionColumns) against the s*t
+pair right hand side block.
+"""
+
+import numpy as np
+import pytest
+
+from current_flow_allostery.functions import betweenness_calc as bt_calc
+
+from .utils import reference_btw
+
+
+@pytest.mark.parametrize('solverBackend', ['pinv', 'sparse'])
+def test_union_columns_match_pair_block(small_network, solverBackend):
+    sources, targets = [0, 3, 5], [11, 17]
+    refBtw = reference_btw(small_network, sources, targets)
+    for useUnionColumns in [False, True]:
+        btwMat = bt_calc.getBtwMat(small_network, sources, targets, solverBackend=solverBackend,
+                                   useUnionColumns=useUnionColumns)
+        btwMat = btwMat.toarray() if solverBackend == 'sparse' else btwMat
+        np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-12 * refBtw.max())
+
+
+def test_union_columns_overlapping_sources_and_targets(small_network):
+    """A node that is both a source and a target only contributes the pairs with other nodes."""
+    sources, targets = [0, 3], [3, 17]
+    refBtw = reference_btw(small_network, sources, targets)
+    btwMat = bt_calc.getBtwMat(small_network, sources, targets, useUnionColumns=True)
+    np.testing.assert_allclose(btwMat, refBtw, rtol=0, atol=1e-12 * refBtw.max())
@@ -0,0 +1,60 @@
+"""
+Helpers shared by the betweenness tests: a small random network, dense
+references for effective resistances and flow
+betweenness, and a loader for the frames in Test_Data.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import scipy as sp
+import scipy.sparse
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Test_Data')
+WT2_FRAME_BASE = 'EnergyData_Network.System__wt2_standard.Replica__rep1.Frame__%03d'
+
+
+def random_network(nNodes=20, density=0.3, asymmetry=0, seed=0):
+    """Connected random weighted network, with small one sided deviations if asymmetry is set."""
+    rng = np.random.default_rng(seed)
+    upper = np.triu(rng.random((nNodes, nNodes)) * (rng.random((nNodes, nNodes)) < density), k=1)
+    #a chain keeps the network connected
+    upper[np.arange(nNodes - 1), np.arange(1, nNodes)] += 0.5
+    mat = upper + upper.T
+    mat = mat * (1 + asymmetry * rng.standard_normal((nNodes, nNodes)) * (mat > 0))
+    np.fill_diagonal(mat, rng.random(nNodes))
+    return mat
+
+
+def reference_pinv(mat):
+    """Dense pseudo inverse of the row sum Laplacian (the matLap convention)."""
+    Amat = np.array(mat, dtype=float)
+    np.fill_diagonal(Amat, 0)
+    return np.linalg.pinv(np.diag(Amat.sum(axis=1)) - Amat)
+
+
+def reference_btw(mat, sources, targets):
+    """Brute force flow betweenness, one unit current per source / target pair."""
+    Linv = reference_pinv(mat)
+    Amat = np.array(mat, dtype=float)
+    np.fill_diagonal(Amat, 0)
+    btwMat = np.zeros(Amat.shape)
+    for source in sources:
+        for target in targets:
+            pot = Linv[:, source] - Linv[:, target]
+            btwMat += Amat * np.abs(pot[:, None] - pot[None, :])
+    return btwMat / (len(sources) * len(targets))
+
+
+def load_frame_matrix(fileBase, energyColumn='TOTAL'):
+    """Dense network matrix and node names of a Test_Data frame."""
+    interactionData = pd.read_csv(os.path.join(TEST_DATA_DIR, fileBase + '.csv'))
+    nodeNames = np.unique(np.concatenate([interactionData['Resid_1'], interactionData['Resid_2']]))
+    nameToInd = pd.Series(np.arange(len(nodeNames)), index=nodeNames)
+    mat = np.array(sp.sparse.coo_matrix(
+        (interactionData[energyColumn].abs().values,
+         (nameToInd.loc[interactionData['Resid_1']].values,
+          nameToInd.loc[interactionData['Resid_2']].values)),
+        shape=(len(nodeNames), len(nodeNames))).todense())
+    return mat, nameToInd